@@ -1,364 +1,881 @@
 import os
+import io
+import functools
 import logging
 import json
 import uuid
-import requests
-import base64
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, url_for, redirect, abort
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, send_from_directory, session, url_for, redirect, abort
 from werkzeug.utils import secure_filename
 from datetime import datetime
-from PIL import Image
-import google.generativeai as genai
 from dotenv import load_dotenv
-from pdf_utils import create_cv_pdf
-from local_ocr.passport_ocr import extract_passport_data_local
 
-
-# Load environment variables from .env file
+# Load environment variables from .env file before the local modules read them
 load_dotenv()
 
+from extraction_providers import GeminiProvider, LocalProvider, OpenRouterProvider, ProviderRegistry
+from hedged_extraction import is_valid_extraction, parse_hedged_providers, run_hedged
+from extraction_cache import cached_extraction, get_extraction_cache
+from job_queue import DONE, FAILED, JobFailed, JobQueue, MemoryJobStore, SQLiteJobStore
+from candidate_store import CandidateStore
+from storage import PDF_STORAGE, StorageCleaner, create_pdf_storage
+from batch_utils import (
+    BATCH_MAX_UPLOAD_MB, IMAGE_ROLES, BatchError, extract_batch_zip, multipart_batch_candidates, parse_manifest,
+    write_batch_archive,
+)
+from image_context import image_context
+from image_pipeline import DERIVATIVE_FOLDER, IMAGE_LAYER_FOLDER
+from upload_stream import UploadError, stream_upload
+from metrics import REGISTRY, format_spans, request_spans, server_timing, stage_timer, start_spans, stop_spans
+
+
 # Configure Gemini API
 GEMINI_API_KEY_1 = os.getenv("GEMINI_API_KEY_1")
 GEMINI_API_KEY_2 = os.getenv("GEMINI_API_KEY_2")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Provider endpoints; override them to point at a proxy or a local stub server
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip('/')
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-flash-1.5")
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+
+# Hedged extraction: comma-separated provider:start-delay-in-seconds pairs, raced in order
+HEDGED_PROVIDERS = os.getenv("HEDGED_PROVIDERS", "gemini_1:0,gemini_2:3,openrouter:6,mrz_ocr:10")
+HEDGED_TIMEOUT = float(os.getenv("HEDGED_TIMEOUT", "60"))
+
+# Providers the 'auto' method routes between, in the order they are first tried
+AUTO_PROVIDERS = os.getenv("AUTO_PROVIDERS", "gemini_1,gemini_2,openrouter,mrz_ocr")
+
+# CV fields the edit form may change on a regeneration (besides the experiences); any
+# other form field is dropped, and the image paths always come from the stored candidate
+CV_TEXT_FIELDS = (
+    'firstName', 'fatherName', 'grandfatherName', 'passportNo', 'nationality', 'dob', 'age', 'sex',
+    'pob', 'livingTown', 'placeOfIssue', 'dateOfIssue', 'dateOfExpiry', 'contactPhone', 'religion',
+)
+
+# Batch generation settings
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_CANDIDATES = int(os.getenv("BATCH_MAX_CANDIDATES", "200"))
+# Processes of this server process's render pool, which renders every CV and image
+# layer; gunicorn.conf.py shares the CPUs out between its workers' pools
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(BATCH_WORKERS)))
+
+# Background job settings; JOB_STORE is 'sqlite' (survives restarts) or 'memory'
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_STORE = os.getenv("JOB_STORE", "sqlite")
+# 'on' builds a new candidate's image layer in the render pool while its passport is
+# still being extracted, as the embedded images do not depend on the extracted text
+PREBUILD_IMAGE_LAYER = os.getenv("PREBUILD_IMAGE_LAYER", "on")
+# Niceness added to the render pool's processes, so that extractions come first
+RENDER_POOL_NICE = int(os.getenv("RENDER_POOL_NICE", "10"))
+
+# 'on' resumes unfinished jobs and starts the storage cleanup when this module is
+# imported (python app.py, flask run); servers that fork workers set 'off' and call
+# start_background_tasks() themselves, see gunicorn.conf.py
+BACKGROUND_TASKS = os.getenv("BACKGROUND_TASKS", "on")
+
+# Log level of the whole app; DEBUG also logs the text stamped on CVs and read by OCR,
+# i.e. candidates' personal data
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=LOG_LEVEL)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.secret_key = os.urandom(24)
+# Server-side state (job queue, caches) lives outside the publicly served upload folder
+DATA_FOLDER = os.getenv("DATA_FOLDER", "data")
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Every server process must sign sessions with the same key; without SECRET_KEY a random
+# key is used, shared by the workers only when they are forked from a preloaded app
+app.secret_key = os.getenv("SECRET_KEY") or os.urandom(24)
+
+TEMPLATE_PDF_PATH = 'template.pdf'
+
+# Every generated candidate is kept server-side; the session only carries its id
+candidate_store = CandidateStore(os.path.join(DATA_FOLDER, 'candidates.sqlite3'))
+# Where generated CVs are kept, if anywhere; without a stored copy a CV is rendered
+# in memory whenever it is downloaded
+pdf_storage = create_pdf_storage(PDF_STORAGE, app.config['UPLOAD_FOLDER'])
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'Time spent handling HTTP requests.', ['endpoint', 'method', 'status']
+)
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.spans, g.spans_token = start_spans()
+
+@app.after_request
+def record_request_timing(response):
+    """Records the request's latency and reports its stage timings in a Server-Timing header."""
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code
+        )
+    if g.get('spans'):
+        response.headers['Server-Timing'] = server_timing(g.spans)
+    return response
+
+@app.teardown_request
+def stop_request_timing(exc):
+    if 'spans_token' in g:
+        stop_spans(g.pop('spans_token'))
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+def current_candidate():
+    """Returns the stored candidate the session refers to, or None."""
+    candidate_id = session.get('candidate_id')
+    return candidate_store.get(candidate_id) if candidate_id else None
 
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def candidate_download_url(candidate):
+    """Returns the URL a candidate's CV is downloaded from."""
+    return url_for('candidate_pdf', candidate_id=candidate['id'])
 
 @app.route('/clear_session')
 def clear_session():
-    session.pop('cv_data', None)
-    session.pop('output_pdf_path', None)
+    session.pop('candidate_id', None)
     return redirect(url_for('index'))
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    # Serve uploaded files from the UPLOAD_FOLDER
+    # Serve uploaded files from the UPLOAD_FOLDER; batch folders are not served, CVs are
+    # downloaded from /candidates/<id>/cv.pdf
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+def run_local_ocr(image_path):
+    # OpenCV and Tesseract are imported on first use, not by every process that imports the app
+    from local_ocr.passport_ocr import extract_passport_data_local
+    return extract_passport_data_local.__wrapped__(image_path)
+
+def run_mrz_ocr(image_path):
+    from local_ocr.passport_ocr import extract_passport_data_local_fast
+    return extract_passport_data_local_fast.__wrapped__(image_path)
+
+def run_mrz_multi(image_path):
+    from local_ocr.passport_ocr import extract_passport_data_local_multi
+    return extract_passport_data_local_multi.__wrapped__(image_path)
+
+# Every extraction provider, with its rolling latency and outcome metrics and circuit breaker
+provider_registry = ProviderRegistry(validate=is_valid_extraction)
+provider_registry.register(GeminiProvider('gemini_1', GEMINI_API_KEY_1, GEMINI_API_BASE, GEMINI_MODEL, PROVIDER_TIMEOUT))
+provider_registry.register(GeminiProvider('gemini_2', GEMINI_API_KEY_2, GEMINI_API_BASE, GEMINI_MODEL, PROVIDER_TIMEOUT))
+provider_registry.register(OpenRouterProvider(OPENROUTER_API_KEY, OPENROUTER_API_URL, OPENROUTER_MODEL, PROVIDER_TIMEOUT))
+provider_registry.register(LocalProvider('local_ocr', run_local_ocr))
+provider_registry.register(LocalProvider('mrz_ocr', run_mrz_ocr))
+provider_registry.register(LocalProvider('mrz_multi', run_mrz_multi))
+
+@cached_extraction('gemini')
 def extract_passport_data_with_gemini(image_path):
-    """
-    Extracts passport data from an image using the Gemini AI model.
-    The prompt guides the AI to extract specific fields and format them as a JSON object.
-    """
-    api_keys = [GEMINI_API_KEY_1, GEMINI_API_KEY_2]
-    
-    for i, api_key in enumerate(api_keys):
-        if not api_key:
-            app.logger.warning(f"API key {i+1} is not set. Skipping.")
-            continue
-
-        try:
-            app.logger.info(f"Attempting to use API key {i+1}")
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
-            img = Image.open(image_path)
-            prompt = '''You are an expert passport data extraction agent. I have provided you with an image of a passport.
-Your task is to accurately extract the required information and return it as a single, valid JSON object.
-
-For names, pay close attention to the Machine-Readable Zone (MRZ) format:
-  - The MRZ for Ethiopian passports is structured as SURNAME<<FIRSTNAME<FATHERNAME.
-  - The SURNAME is the grandfather's name.
-  - The FIRSTNAME is the person's first name.
-  - The FATHERNAME is the father's name.
-  - Example: If the MRZ is "ETHDOE<<JOHN<DOE", then:
-    - grandfatherName: "DOE"
-    - firstName: "JOHN"
-    - fatherName: "DOE"
-  - Extract the FIRST NAME, FATHER'S NAME, and GRANDFATHER'S NAME based on this structure.
-  - If any of these name components are not explicitly found in the MRZ, set their value to 'NOT_FOUND'.
-
-Prioritize the Machine-Readable Zone (MRZ) for the highest accuracy for fields like passport number, nationality, date of birth, sex, and expiry date.
-For fields not in the MRZ, like 'Place of Birth', 'Place of Issue' and 'Date of Issue', use the visually printed text.
-If the 'Place of Birth' is not explicitly found, set the value to 'NOT_FOUND'.
-The JSON object should have the following keys:
-firstName
-fatherName
-grandfatherName
-passportNo
-nationality
-dob (format as DD MMM YY, e.g., 23 OCT 91)
-sex (e.g., F or M)
-pob (Place of Birth)
-placeOfIssue
-dateOfIssue (format as DD MMM YY, e.g., 06 MAY 25)
-dateOfExpiry (format as DD MMM YY, e.g., 05 MAY 30)
-Respond ONLY with the single, valid JSON object.'''
-            
-            response = model.generate_content([prompt, img], request_options={'timeout': 60})
-            json_string = response.text.strip()
-
-            if json_string.startswith("```json"):
-                json_string = json_string.strip("```json").strip("```").strip()
-            
-            extracted_data = json.loads(json_string)
-            app.logger.info(f"Successfully extracted data with API key {i+1}")
-            return extracted_data
-
-        except Exception as e:
-            app.logger.error(f"Failed to use API key {i+1}: {e}")
-            continue
-
-    app.logger.error("All API keys failed. Could not extract passport data.")
-    return None
+    """Extracts passport data with Gemini, trying GEMINI_API_KEY_1 and then GEMINI_API_KEY_2."""
+    extracted_data = provider_registry.extract_first(['gemini_1', 'gemini_2'], image_path)
+    if extracted_data is None:
+        app.logger.error("All API keys failed. Could not extract passport data.")
+    return extracted_data
 
+@cached_extraction('openrouter')
 def extract_passport_data_with_openrouter(image_path):
-    if not OPENROUTER_API_KEY:
-        app.logger.error("OpenRouter API key not set.")
-        return None
+    return provider_registry.call('openrouter', image_path)
 
-    try:
-        with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:5000",
-                "X-Title": "CV Generator"
-            },
-            json={
-                "model": "google/gemini-flash-1.5",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """You are an expert passport data extraction agent. I have provided you with an image of a passport.
-Your task is to accurately extract the required information and return it as a single, valid JSON object.
-
-For names, pay close attention to the Machine-Readable Zone (MRZ) format:
-  - The MRZ for Ethiopian passports is structured as SURNAME<<FIRSTNAME<FATHERNAME.
-  - The SURNAME is the grandfather's name.
-  - The FIRSTNAME is the person's first name.
-  - The FATHERNAME is the father's name.
-  - Example: If the MRZ is "ETHDOE<<JOHN<DOE", then:
-    - grandfatherName: "DOE"
-    - firstName: "JOHN"
-    - fatherName: "DOE"
-  - Extract the FIRST NAME, FATHER'S NAME, and GRANDFATHER'S NAME based on this structure.
-  - If any of these name components are not explicitly found in the MRZ, set their value to 'NOT_FOUND'.
-
-Prioritize the Machine-Readable Zone (MRZ) for the highest accuracy for fields like passport number, nationality, date of birth, sex, and expiry date.
-For fields not in the MRZ, like 'Place of Birth', 'Place of Issue' and 'Date of Issue', use the visually printed text.
-If the 'Place of Birth' is not explicitly found, set the value to 'NOT_FOUND'.
-The JSON object should have the following keys:
-firstName
-fatherName
-grandfatherName
-passportNo
-nationality
-dob (format as DD MMM YY, e.g., 23 OCT 91)
-sex (e.g., F or M)
-pob (Place of Birth)
-placeOfIssue
-dateOfIssue (format as DD MMM YY, e.g., 06 MAY 25)
-dateOfExpiry (format as DD MMM YY, e.g., 05 MAY 30)
-Respond ONLY with the single, valid JSON object."""
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ]
-            },
-            timeout=60
-        )
-        response.raise_for_status()
-        json_response = response.json()
-        
-        app.logger.debug(f"Full OpenRouter response: {json.dumps(json_response, indent=2)}")
-
-        content_string = json_response.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
-        
-        app.logger.debug(f"Content from OpenRouter: '{content_string}'")
-
-        if content_string.startswith("```json"):
-            content_string = content_string.strip("```json").strip("```").strip()
-
-        if not content_string:
-            app.logger.error("OpenRouter response content is empty.")
-            return None
-
-        extracted_data = json.loads(content_string)
-        app.logger.info("Successfully extracted data with OpenRouter.")
-        return extracted_data
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Error calling OpenRouter API: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            app.logger.error(f"Response content: {e.response.text}")
+@cached_extraction('local_ocr')
+def extract_passport_data_with_local_ocr(image_path):
+    return provider_registry.call('local_ocr', image_path)
+
+@cached_extraction('local_ocr_fast')
+def extract_passport_data_with_mrz_ocr(image_path):
+    return provider_registry.call('mrz_ocr', image_path)
+
+@cached_extraction('local_ocr_multi')
+def extract_passport_data_with_mrz_multi(image_path):
+    return provider_registry.call('mrz_multi', image_path)
+
+def hedged_providers():
+    """
+    Returns the (name, start delay, extract function) triples raced by the hedged mode,
+    in the order given by HEDGED_PROVIDERS. Providers without an API key are left out.
+    """
+    providers = []
+    for name, delay in parse_hedged_providers(HEDGED_PROVIDERS):
+        provider = provider_registry.get(name)
+        if provider is None:
+            app.logger.warning(f"Unknown hedged provider '{name}'. Skipping.")
+        elif provider.available():
+            providers.append((name, delay, functools.partial(provider_registry.call, name)))
+    return providers
+
+@cached_extraction('hedged')
+def extract_passport_data_hedged(image_path):
+    """
+    Races the configured providers and returns the first result whose MRZ check digits
+    validate, or None if none does before HEDGED_TIMEOUT.
+    """
+    name, extracted_data = run_hedged(image_path, hedged_providers(), is_valid_extraction, HEDGED_TIMEOUT)
+    if extracted_data is None:
+        app.logger.error("No hedged provider returned a valid extraction.")
         return None
-    except (json.JSONDecodeError, KeyError, IndexError) as e:
-        app.logger.error(f"Error parsing OpenRouter response: {e}")
-        # Also log the problematic content if possible
-        if 'content_string' in locals():
-            app.logger.error(f"Problematic content: {content_string}")
+    app.logger.info(f"Hedged extraction won by {name}")
+    return extracted_data
+
+@cached_extraction('auto')
+def extract_passport_data_auto(image_path):
+    """
+    Tries the AUTO_PROVIDERS one at a time, best recent latency and success trade-off
+    first, until one returns a result whose MRZ check digits validate.
+    """
+    names = provider_registry.route([name.strip() for name in AUTO_PROVIDERS.split(',') if name.strip()])
+    app.logger.info(f"Auto extraction provider order: {', '.join(names)}")
+    extracted_data = provider_registry.extract_first(names, image_path, require_valid=True)
+    if extracted_data is None:
+        app.logger.error("No auto-routed provider could extract the passport data.")
+    return extracted_data
+
+# The extraction methods offered by the form
+EXTRACTION_METHODS = {
+    'ai': extract_passport_data_with_gemini,
+    'openrouter': extract_passport_data_with_openrouter,
+    'local_ocr': extract_passport_data_with_local_ocr,
+    'mrz_ocr': extract_passport_data_with_mrz_ocr,
+    'mrz_multi': extract_passport_data_with_mrz_multi,
+    'hedged': extract_passport_data_hedged,
+    'auto': extract_passport_data_auto,
+}
+
+def extract_passport_data(extraction_method, passport_path):
+    """
+    Runs the extraction method selected in the form on a saved passport image.
+    Returns the extracted fields, or None if the method failed or is unknown.
+    """
+    extract = EXTRACTION_METHODS.get(extraction_method)
+    if extract is None:
+        app.logger.error(f"Unknown extraction method '{extraction_method}'.")
         return None
+    with stage_timer('extraction'):
+        return extract(passport_path)
+
+def build_cv_data(extracted_data, contact_phone, religion, experiences):
+    """
+    Turns the raw fields extracted from a passport into the data stamped on the CV:
+    derives age and living town, fills defaults and adds the form-only fields.
+    """
+    if 'dob' in extracted_data and extracted_data['dob'] and extracted_data['dob'] != 'NOT_FOUND':
+        try:
+            dob = datetime.strptime(extracted_data['dob'], '%d %b %y')
+            today = datetime.today()
+            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+            extracted_data['age'] = str(age)
+        except ValueError:
+            app.logger.warning(f"Could not parse date of birth: {extracted_data['dob']}")
+            extracted_data['age'] = ''
+    else:
+        extracted_data['age'] = ''
+
+    if 'pob' in extracted_data and extracted_data['pob'] != 'NOT_FOUND':
+        extracted_data['livingTown'] = extracted_data['pob']
+    else:
+        extracted_data['livingTown'] = ''
+
+    # The raw MRZ line is only used to validate the extraction
+    extracted_data.pop('mrzLine2', None)
+
+    extracted_data["cvCreationDate"] = datetime.now().strftime("%d %b %Y").upper()
+    extracted_data['placeOfIssue'] = 'Addis Ababa'
+
+    default_data = {
+        "firstName": "", "fatherName": "", "grandfatherName": "", "passportNo": "",
+        "nationality": "", "dob": "", "sex": "", "pob": "", "placeOfIssue": "",
+        "dateOfIssue": "", "dateOfExpiry": "", "age": "", "livingTown": "",
+        "contactPhone": contact_phone,
+        "religion": religion,
+        "experiences": experiences
+    }
+    return {**default_data, **extracted_data}
+
+def set_full_name(cv_data):
+    """Reconstructs fullName from its components after the data is finalized."""
+    first_name = cv_data.get('firstName', '')
+    father_name = cv_data.get('fatherName', '')
+    grandfather_name = cv_data.get('grandfatherName', '')
+    full_name_parts = [part for part in [first_name, father_name, grandfather_name] if part and part != 'NOT_FOUND']
+    cv_data['fullName'] = " ".join(full_name_parts).strip()
+    return cv_data
+
+def cv_output_filename(cv_data):
+    """Returns a unique, filesystem-safe PDF filename for a candidate's CV."""
+    unique_id = uuid.uuid4().hex[:8]
+    safe_full_name = "".join([c if c.isalnum() else '_' for c in cv_data.get('fullName', 'candidate')])
+    return f"{safe_full_name}_{unique_id}.pdf"
 
 @app.route('/')
 def index():
-    cv_data = session.get('cv_data', {})
-    download_url = None
-    if 'output_pdf_path' in session:
-        output_pdf_path = session.get('output_pdf_path')
-        download_url = url_for('uploaded_file', filename=os.path.basename(output_pdf_path))
+    candidate = current_candidate()
+    cv_data = candidate['cv_data'] if candidate else {}
+    download_url = candidate_download_url(candidate) if candidate else None
     return render_template('index.html', cv_data=cv_data, download_url=download_url)
 
 @app.route('/edit')
 def edit_cv():
-    cv_data = session.get('cv_data', {})
+    candidate = current_candidate()
+    cv_data = candidate['cv_data'] if candidate else {}
     return render_template('edit_cv.html', cv_data=cv_data)
 
+@app.route('/candidates')
+def list_candidates():
+    """Lists stored candidates, newest first, optionally filtered by passport number or name."""
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = 50
+    candidates = candidate_store.list(query=query or None, limit=per_page + 1, offset=(page - 1) * per_page)
+    for candidate in candidates:
+        candidate['download_url'] = candidate_download_url(candidate)
+        candidate['updated'] = datetime.fromtimestamp(candidate['updated_at']).strftime('%d %b %Y %H:%M')
+    return render_template(
+        'candidates.html', candidates=candidates[:per_page], query=query, page=page,
+        has_next=len(candidates) > per_page
+    )
+
+@app.route('/candidates/<candidate_id>/cv.pdf')
+def candidate_pdf(candidate_id):
+    """
+    Serves a candidate's CV: the stored copy if there is one, otherwise the CV rendered
+    in memory from the candidate's data and streamed without touching the disk.
+    """
+    candidate = candidate_store.get(candidate_id)
+    if not candidate:
+        abort(404)
+    download_name = f"{secure_filename(candidate['full_name']) or 'candidate'}_CV.pdf"
+    if pdf_storage.exists(candidate['pdf_path']):
+        return send_file(os.path.abspath(candidate['pdf_path']), mimetype='application/pdf', download_name=download_name)
+    pdf_bytes = render_cv(candidate['cv_data'])
+    if pdf_bytes is None:
+        return jsonify({"message": "Failed to create the PDF. Please check the logs for more details."}), 500
+    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', download_name=download_name)
+
+@app.route('/candidates/<candidate_id>/open')
+def open_candidate(candidate_id):
+    """Makes a stored candidate the session's current CV and opens it for editing."""
+    if not candidate_store.get(candidate_id):
+        abort(404)
+    session['candidate_id'] = candidate_id
+    return redirect(url_for('edit_cv'))
+
 @app.route('/generate', methods=['POST'])
 def generate_cv():
+    """
+    Regenerates the session's candidate synchronously after an edit. For new candidates the
+    uploads are saved and a generate_cv job is queued; the response carries the job id
+    and the URL to poll for its progress and result.
+    """
     app.logger.info("Request received to generate CV")
 
     try:
-        if request.form.get('regenerate') == 'true':
-            final_data = session.get('cv_data', {})
-            # Preserve image paths from session if not explicitly sent in form
-            face_path = final_data.get('face_image_path')
-            full_body_path = final_data.get('full_body_image_path')
-            passport_path = final_data.get('passport_image_path')
-
-            app.logger.debug(f"final_data before update: {final_data}")
-            form_data_dict = request.form.to_dict()
-            app.logger.debug(f"Form data received: {form_data_dict}")
-            final_data.update(form_data_dict)
-            final_data['experiences'] = json.loads(request.form.get('experiences', '[]'))
-            app.logger.debug(f"final_data after update: {final_data}")
-
-            # Update paths if they were sent in the form (e.g., from hidden fields)
-            if request.form.get('face_image_path'):
-                face_path = request.form.get('face_image_path')
-            if request.form.get('full_body_image_path'):
-                full_body_path = request.form.get('full_body_image_path')
-            if request.form.get('passport_image_path'):
-                passport_path = request.form.get('passport_image_path')
+        if request.mimetype == 'multipart/form-data':
+            # Streamed to disk and checked as it arrives; request.form and request.files are not used
+            with stage_timer('upload_save'):
+                form, uploads = stream_upload(
+                    request.stream, request.mimetype_params.get('boundary', '').encode(), request.content_length,
+                    app.config['UPLOAD_FOLDER'], IMAGE_ROLES
+                )
         else:
-            passport_image = request.files.get('passport')
-            face_image = request.files.get('face')
-            full_body_image = request.files.get('full_body')
-
-            if not all([passport_image, face_image, full_body_image]) or \
-               not allowed_file(passport_image.filename) or \
-               not allowed_file(face_image.filename) or \
-               not allowed_file(full_body_image.filename):
-                return jsonify({"message": "Missing one or more required image files, or file type not allowed."}), 400
-
-            passport_filename = secure_filename(passport_image.filename)
-            face_filename = secure_filename(face_image.filename)
-            full_body_filename = secure_filename(full_body_image.filename)
-
-            passport_path = os.path.join(app.config['UPLOAD_FOLDER'], passport_filename)
-            face_path = os.path.join(app.config['UPLOAD_FOLDER'], face_filename)
-            full_body_path = os.path.join(app.config['UPLOAD_FOLDER'], full_body_filename)
-
-            passport_image.save(passport_path)
-            face_image.save(face_path)
-            full_body_image.save(full_body_path)
-
-            extraction_method = request.form.get('extractionMethod', 'ai') # Default to AI
-
-            if extraction_method == 'ai':
-                extracted_data = extract_passport_data_with_gemini(passport_path)
-            elif extraction_method == 'openrouter':
-                extracted_data = extract_passport_data_with_openrouter(passport_path)
-            elif extraction_method == 'local_ocr':
-                extracted_data = extract_passport_data_local(passport_path)
-            else:
-                extracted_data = None
-
-            if not extracted_data:
-                return jsonify({"message": f"Could not extract data from passport using {extraction_method}."}), 500
-            
-
-            if 'dob' in extracted_data and extracted_data['dob'] and extracted_data['dob'] != 'NOT_FOUND':
-                try:
-                    dob = datetime.strptime(extracted_data['dob'], '%d %b %y')
-                    today = datetime.today()
-                    age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-                    extracted_data['age'] = str(age)
-                except ValueError:
-                    app.logger.warning(f"Could not parse date of birth: {extracted_data['dob']}")
-                    extracted_data['age'] = ''
-            else:
-                extracted_data['age'] = ''
-
-            if 'pob' in extracted_data and extracted_data['pob'] != 'NOT_FOUND':
-                extracted_data['livingTown'] = extracted_data['pob']
-            else:
-                extracted_data['livingTown'] = ''
-
-            extracted_data["cvCreationDate"] = datetime.now().strftime("%d %b %Y").upper()
-            extracted_data['placeOfIssue'] = 'Addis Ababa'
-            
-            default_data = {
-                "firstName": "", "fatherName": "", "grandfatherName": "", "passportNo": "",
-                "nationality": "", "dob": "", "sex": "", "pob": "", "placeOfIssue": "",
-                "dateOfIssue": "", "dateOfExpiry": "", "age": "", "livingTown": "",
-                "contactPhone": request.form.get('contactPhone', '+251936987452'), 
-                "religion": request.form.get('religion', 'Muslim'), 
-                "experiences": json.loads(request.form.get('experiences', '[]'))
-            }
-            final_data = {**default_data, **extracted_data}
-
-        # Always reconstruct fullName from its components after data is finalized
-        first_name = final_data.get('firstName', '')
-        father_name = final_data.get('fatherName', '')
-        grandfather_name = final_data.get('grandfatherName', '')
-        full_name_parts = [part for part in [first_name, father_name, grandfather_name] if part and part != 'NOT_FOUND']
-        final_data['fullName'] = " ".join(full_name_parts).strip()
-        
-        session['cv_data'] = final_data
-        session['cv_data']['face_image_path'] = face_path
-        session['cv_data']['full_body_image_path'] = full_body_path
-        session['cv_data']['passport_image_path'] = passport_path
-
-        template_pdf_path = 'template.pdf'
-        unique_id = uuid.uuid4().hex[:8]
-        safe_full_name = "".join([c if c.isalnum() else '_' for c in final_data.get('fullName', 'candidate')])
-        output_filename = f"{safe_full_name}_{unique_id}.pdf"
-        output_pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-
-        pdf_created = create_cv_pdf(output_pdf_path, final_data, template_pdf_path, face_path, full_body_path, passport_path)
-
+            form, uploads = request.form.to_dict(), {}
+
+        if form.get('regenerate') != 'true':
+            return enqueue_generate_job(form, uploads)
+
+        candidate = current_candidate()
+        if not candidate:
+            return jsonify({"message": "There is no CV to regenerate. Please generate one first."}), 400
+        previous_data = candidate['cv_data']
+        final_data = dict(previous_data)
+        # Only the CV's text fields are taken from the form; the image paths stay those
+        # of the stored candidate, so a form can never point the CV at another file
+        final_data.update({field: form[field] for field in CV_TEXT_FIELDS if field in form})
+        final_data['experiences'] = json.loads(form.get('experiences', '[]'))
+
+        with stage_timer('post_process'):
+            set_full_name(final_data)
+
+        changed_fields = changed_cv_fields(previous_data, final_data)
+        if not changed_fields and (not pdf_storage.persistent or pdf_storage.exists(candidate['pdf_path'])):
+            app.logger.info(f"Nothing changed for candidate {candidate['id']}; keeping the current CV")
+            return redirect(url_for('index'))
+        # Only the text is stamped again; the images come from the cached image layer
+        # unless one of the image paths changed
+        app.logger.info(f"Regenerating candidate {candidate['id']}, changed fields: {', '.join(changed_fields)}")
+        pdf_created, output_pdf_path = save_cv(final_data)
         if not pdf_created:
             return jsonify({"message": "Failed to create the PDF. Please check the logs for more details."}), 500
 
-        if request.form.get('regenerate') == 'true':
-            session['output_pdf_path'] = output_pdf_path
-            return redirect(url_for('index'))
+        candidate_store.update(candidate['id'], final_data, output_pdf_path)
+        return redirect(url_for('index'))
+
+    except UploadError as e:
+        app.logger.warning(f"Rejected upload: {e}")
+        return jsonify({"message": str(e)}), e.status
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred: {e}", exc_info=True)
+        return jsonify({"message": "An unexpected server error occurred. Please try again later."}), 500
+
+def enqueue_generate_job(form, uploads):
+    """Queues a generate_cv job for the images `stream_upload` saved and the other form fields."""
+    if not all(role in uploads for role in IMAGE_ROLES):
+        return jsonify({"message": "Missing one or more required image files."}), 400
+
+    job_id = job_queue.submit('generate_cv', {
+        "extraction_method": form.get('extractionMethod', 'ai'), # Default to AI
+        "passport_image_path": uploads['passport']['path'],
+        "face_image_path": uploads['face']['path'],
+        "full_body_image_path": uploads['full_body']['path'],
+        "contact_phone": form.get('contactPhone', '+251936987452'),
+        "religion": form.get('religion', 'Muslim'),
+        "experiences": json.loads(form.get('experiences', '[]')),
+    })
+    app.logger.info(f"Queued generate_cv job {job_id}")
+    return jsonify({"jobId": job_id, "statusUrl": url_for('job_status', job_id=job_id)}), 202
+
+def changed_cv_fields(previous_data, cv_data):
+    """Returns the sorted names of the fields whose values differ between two versions of a cv_data."""
+    return sorted(
+        field for field in set(previous_data) | set(cv_data)
+        if previous_data.get(field) != cv_data.get(field)
+    )
+
+def render_cv(cv_data, run=None):
+    """
+    Renders the CV for finalized `cv_data` (which carries the three image paths) in
+    memory. Returns the PDF bytes, or None if the PDF could not be created.
+
+    `run(func, *args)` runs the pdf_utils render function; by default it runs in the
+    render pool (render_in_pool).
+    """
+    from pdf_utils import render_cv_pdf
+    try:
+        return (run or render_in_pool)(
+            render_cv_pdf, cv_data, TEMPLATE_PDF_PATH,
+            cv_data['face_image_path'], cv_data['full_body_image_path'], cv_data['passport_image_path']
+        )
+    except BrokenProcessPool as e:
+        app.logger.error(f"Rendering a CV failed: {e}")
+        return None
+
+def save_cv(cv_data, run=None):
+    """
+    Prepares the CV for finalized `cv_data` for download and returns (created, stored
+    PDF path). A PDF storage that keeps copies gets the rendered CV; otherwise only the
+    image layer is built and every download stamps the text in memory. `run` is as for
+    render_cv.
+    """
+    from pdf_utils import build_image_layer
+    if not pdf_storage.persistent:
+        try:
+            return (run or render_in_pool)(
+                build_image_layer, TEMPLATE_PDF_PATH,
+                cv_data['face_image_path'], cv_data['full_body_image_path'], cv_data['passport_image_path']
+            ), None
+        except BrokenProcessPool as e:
+            app.logger.error(f"Building an image layer failed: {e}")
+            return False, None
+    pdf_bytes = render_cv(cv_data, run)
+    if pdf_bytes is None:
+        return False, None
+    with stage_timer('pdf_store'):
+        return True, pdf_storage.save(cv_output_filename(cv_data), pdf_bytes)
+
+def run_generate_job(payload, report):
+    """Job handler that extracts the passport data and renders a new candidate's CV."""
+    with request_spans() as spans, image_context():
+        result = generate_candidate(payload, report)
+    app.logger.info(f"Generated candidate {result['candidateId']}: {format_spans(spans)}")
+    return result
+
+def prebuild_image_layer(payload):
+    """
+    Starts building the candidate's image layer in the render pool, so that it is
+    cached by the time the extraction returns. Returns the future, or None when
+    prebuilding is off or the pool cannot take it; save_cv then builds the layer itself.
+    """
+    if PREBUILD_IMAGE_LAYER != 'on':
+        return None
+    from pdf_utils import build_image_layer
+    try:
+        return get_render_pool().submit(
+            build_image_layer, TEMPLATE_PDF_PATH,
+            payload['face_image_path'], payload['full_body_image_path'], payload['passport_image_path']
+        )
+    except BrokenProcessPool as e:
+        global _render_pool
+        _render_pool = None
+        app.logger.warning(f"Could not prebuild the image layer: {e}")
+        return None
 
-        return jsonify({
-            "fullName": final_data.get('fullName', 'candidate'),
-            "downloadUrl": f"/uploads/{os.path.basename(output_pdf_path)}",
+def wait_for_image_layer(prebuild):
+    """Waits for a prebuilt image layer; the time it takes is what rendering still waits for the images."""
+    if prebuild is None:
+        return
+    with stage_timer('pdf_image_layer_wait'):
+        try:
+            prebuild.result()
+        except BrokenProcessPool as e:
+            global _render_pool
+            _render_pool = None
+            app.logger.warning(f"Prebuilding the image layer failed: {e}")
+
+def generate_candidate(payload, report):
+    extraction_method = payload['extraction_method']
+    report('extracting', 10)
+    prebuild = prebuild_image_layer(payload)
+    extracted_data = extract_passport_data(extraction_method, payload['passport_image_path'])
+    if not extracted_data:
+        if prebuild is not None:
+            prebuild.cancel()
+        raise JobFailed(f"Could not extract data from passport using {extraction_method}.")
+
+    report('rendering', 80)
+    wait_for_image_layer(prebuild)
+    with stage_timer('post_process'):
+        final_data = build_cv_data(
+            extracted_data,
+            contact_phone=payload['contact_phone'],
+            religion=payload['religion'],
+            experiences=payload['experiences']
+        )
+        set_full_name(final_data)
+    final_data['face_image_path'] = payload['face_image_path']
+    final_data['full_body_image_path'] = payload['full_body_image_path']
+    final_data['passport_image_path'] = payload['passport_image_path']
+
+    pdf_created, output_pdf_path = save_cv(final_data)
+    if not pdf_created:
+        raise JobFailed("Failed to create the PDF. Please check the logs for more details.")
+
+    candidate_id = candidate_store.create(final_data, output_pdf_path)
+    return {
+        "candidateId": candidate_id,
+        "fullName": final_data.get('fullName', 'candidate'),
+    }
+
+@app.route('/cache/stats')
+def extraction_cache_stats():
+    """Reports extraction cache hits and misses, i.e. how many AI/OCR calls were saved."""
+    cache = get_extraction_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+@app.route('/providers/stats')
+def provider_stats():
+    """Reports each extraction provider's recent latency percentiles, success and failure rates and circuit state."""
+    return jsonify(provider_registry.stats())
+
+@app.route('/metrics')
+def metrics():
+    """
+    Serves the stage timings, extraction latencies, PDF sizes and request latencies
+    in the Prometheus text format, for a Prometheus server or curl to scrape.
+    """
+    return Response(REGISTRY.expose(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Reports a job's status, stage and progress. Once a generate_cv job is done its
+    candidate becomes the session's current CV, so /edit and / pick it up; once a
+    generate_batch job is done it reports how many CVs were generated and where the
+    ZIP is.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"message": "Job not found."}), 404
+
+    response = {
+        "jobId": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": job['progress'],
+    }
+    if job['status'] == DONE and job['kind'] == 'generate_batch':
+        result = job['result']
+        response.update({
+            "generated": result['generated'],
+            "failed": result['failed'],
+            "downloadUrl": url_for('batch_archive', job_id=job['id']),
+        })
+    elif job['status'] == DONE:
+        result = job['result']
+        session['candidate_id'] = result['candidateId']
+        response.update({
+            "candidateId": result['candidateId'],
+            "fullName": result['fullName'],
+            "downloadUrl": url_for('candidate_pdf', candidate_id=result['candidateId']),
             "editUrl": url_for('edit_cv'),
-            "cv_data": final_data
         })
+    elif job['status'] == FAILED:
+        response["message"] = job['error']
+    return jsonify(response)
+
+_render_pool = None
+
+def get_render_pool():
+    """
+    Returns the process pool all CVs and image layers are rendered in. PyMuPDF runs one
+    call at a time per process, so rendering in the request and job threads would
+    serialise every render of a server process.
+    """
+    global _render_pool
+    if _render_pool is None:
+        from pdf_utils import lower_process_priority
+        # Renders get the CPU time the extractions, on the critical path of their
+        # requests, leave over
+        _render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            initializer=lower_process_priority, initargs=(RENDER_POOL_NICE,)
+        )
+    return _render_pool
+
+def render_in_pool(func, *args):
+    """
+    Runs a pdf_utils render function in the render pool and returns its result. A
+    crashed renderer breaks the whole pool, so a fresh one is started for the next
+    render and BrokenProcessPool is raised.
+    """
+    try:
+        return get_render_pool().submit(func, *args).result()
+    except BrokenProcessPool:
+        global _render_pool
+        _render_pool = None
+        raise
 
+def process_batch_candidate(candidate, images, form_fields, extraction_method, output_dir):
+    """
+    Extracts and renders one candidate of a batch. Never raises; returns a report row.
+    """
+    result = {'candidate': candidate, 'status': 'failed'}
+    try:
+        missing = [role for role in IMAGE_ROLES if role not in images]
+        if missing:
+            result['error'] = f"Missing image(s): {', '.join(missing)}"
+            return result
+
+        with image_context():
+            extracted_data = extract_passport_data(extraction_method, images['passport'])
+        if not extracted_data:
+            result['error'] = f"Could not extract data from passport using {extraction_method}."
+            return result
+
+        with stage_timer('post_process'):
+            cv_data = set_full_name(build_cv_data(extracted_data, **form_fields))
+        cv_data['face_image_path'] = images['face']
+        cv_data['full_body_image_path'] = images['full_body']
+        cv_data['passport_image_path'] = images['passport']
+        result['fullName'] = cv_data['fullName']
+        result['passportNo'] = cv_data.get('passportNo', '')
+
+        from pdf_utils import create_cv_pdf
+        output_filename = cv_output_filename(cv_data)
+        output_pdf_path = os.path.join(output_dir, output_filename)
+        pdf_created = render_in_pool(
+            create_cv_pdf, output_pdf_path, cv_data, TEMPLATE_PDF_PATH,
+            images['face'], images['full_body'], images['passport']
+        )
+        if not pdf_created:
+            result['error'] = "Failed to create the PDF."
+            return result
+
+        candidate_store.create(cv_data, output_pdf_path)
+        result.update({'status': 'ok', 'pdf': f"{candidate}/{output_filename}", 'pdf_path': output_pdf_path})
+    except BrokenProcessPool as e:
+        app.logger.error(f"Batch candidate {candidate} failed: {e}")
+        result['error'] = str(e)
     except Exception as e:
-        app.logger.error(f"An unexpected error occurred: {e}", exc_info=True)
-        return jsonify({"message": "An unexpected server error occurred. Please try again later."}), 500
+        app.logger.error(f"Batch candidate {candidate} failed: {e}", exc_info=True)
+        result['error'] = str(e)
+    return result
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    """
+    Queues a job that generates CVs for many candidates at once, and answers 202 with
+    its id, status URL and the URL the ZIP of the PDFs can be downloaded from once the
+    job is done. The ZIP has a report.json/report.csv listing every candidate and why
+    any of them failed.
+
+    Accepts either a `batch` ZIP of per-candidate folders (with an optional root
+    manifest.csv), or repeated `passport`/`face`/`full_body` multipart fields with an
+    optional `manifest` CSV upload. The contactPhone, religion and experiences form
+    fields are used for every candidate the manifest does not override.
+
+    The upload is streamed to disk and checked as it arrives, like /generate's, up to
+    BATCH_MAX_UPLOAD_MB in all.
+    """
+    if request.mimetype != 'multipart/form-data':
+        return jsonify({"message": "The batch must be uploaded as multipart/form-data."}), 400
+    batch_id = uuid.uuid4().hex[:8]
+    batch_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'batches', batch_id)
+    os.makedirs(batch_dir, exist_ok=True)
+
+    try:
+        with stage_timer('upload_save'):
+            form, uploads = stream_upload(
+                request.stream, request.mimetype_params.get('boundary', '').encode(), request.content_length,
+                batch_dir, IMAGE_ROLES, archive_fields=('batch',), text_fields=('manifest',),
+                max_request_bytes=BATCH_MAX_UPLOAD_MB * 1024 * 1024, max_files_per_field=BATCH_MAX_CANDIDATES,
+            )
+        manifest_bytes = None
+        if 'batch' in uploads:
+            if len(uploads['batch']) > 1:
+                raise BatchError("Send one batch ZIP per request.")
+            archive_path = uploads['batch'][0]['path']
+            try:
+                candidates, manifest_bytes = extract_batch_zip(archive_path, batch_dir)
+            finally:
+                os.remove(archive_path)
+        else:
+            candidates = multipart_batch_candidates(uploads)
+        if 'manifest' in form:
+            manifest_bytes = form['manifest'].encode('utf-8')
+        manifest = parse_manifest(manifest_bytes) if manifest_bytes else {}
+        default_experiences = json.loads(form.get('experiences', '[]'))
+        if not candidates:
+            raise BatchError("The batch does not contain any candidates.")
+        if len(candidates) > BATCH_MAX_CANDIDATES:
+            raise BatchError(f"A batch may contain at most {BATCH_MAX_CANDIDATES} candidates.")
+    except UploadError as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        app.logger.warning(f"Rejected batch upload: {e}")
+        return jsonify({"message": str(e)}), e.status
+    except (BatchError, json.JSONDecodeError) as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        return jsonify({"message": str(e)}), 400
+
+    form_fields = {}
+    for candidate in candidates:
+        overrides = manifest.get(candidate, {})
+        form_fields[candidate] = {
+            'contact_phone': overrides.get('contactPhone', form.get('contactPhone', '+251936987452')),
+            'religion': overrides.get('religion', form.get('religion', 'Muslim')),
+            'experiences': overrides.get('experiences', default_experiences),
+        }
+    extraction_method = form.get('extractionMethod', 'ai')
+    job_id = job_queue.submit('generate_batch', {
+        "batch_id": batch_id,
+        "batch_dir": batch_dir,
+        "extraction_method": extraction_method,
+        "candidates": candidates,
+        "form_fields": form_fields,
+    })
+    app.logger.info(f"Queued generate_batch job {job_id} (batch {batch_id}): {len(candidates)} CVs using {extraction_method}")
+    return jsonify({
+        "jobId": job_id,
+        "statusUrl": url_for('job_status', job_id=job_id),
+        "downloadUrl": url_for('batch_archive', job_id=job_id),
+    }), 202
+
+def run_batch_job(payload, report):
+    """Job handler that generates a batch's CVs and writes the ZIP of PDFs and reports."""
+    batch_id, candidates = payload['batch_id'], payload['candidates']
+    report('generating', 5)
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                process_batch_candidate, candidate, images, payload['form_fields'][candidate],
+                payload['extraction_method'], payload['batch_dir']
+            )
+            for candidate, images in sorted(candidates.items())
+        ]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            report('generating', 5 + 90 * len(results) // len(futures))
+
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    app.logger.info(f"Batch {batch_id}: {len(results) - failed} CVs generated, {failed} failed")
+
+    report('archiving', 95)
+    archive_path = os.path.join(payload['batch_dir'], f"cvs_{batch_id}.zip")
+    write_batch_archive(archive_path, results)
+    return {"batchId": batch_id, "archivePath": archive_path, "generated": len(results) - failed, "failed": failed}
+
+@app.route('/jobs/<job_id>/archive')
+def batch_archive(job_id):
+    """Downloads the ZIP of a finished generate_batch job, until the storage cleanup deletes it."""
+    job = job_queue.get(job_id)
+    if not job or job['kind'] != 'generate_batch':
+        abort(404)
+    if job['status'] != DONE:
+        return jsonify({"message": "The batch is not finished yet.", "statusUrl": url_for('job_status', job_id=job_id)}), 409
+    archive_path = job['result']['archivePath']
+    if not os.path.exists(archive_path):
+        return jsonify({"message": "The batch archive has expired."}), 410
+    batch_id = job['result']['batchId']
+    return send_file(os.path.abspath(archive_path), mimetype='application/zip', as_attachment=True, download_name=f"cvs_{batch_id}.zip")
+
+if JOB_STORE == 'memory':
+    job_store = MemoryJobStore()
+else:
+    job_store = SQLiteJobStore(os.path.join(DATA_FOLDER, 'jobs.sqlite3'))
+job_queue = JobQueue(job_store, workers=JOB_WORKERS)
+job_queue.register('generate_cv', run_generate_job)
+job_queue.register('generate_batch', run_batch_job)
+
+def referenced_upload_paths():
+    """Returns the paths stored candidates and unfinished jobs still refer to."""
+    paths = candidate_store.referenced_paths()
+    for job in job_store.unfinished():
+        paths.update(value for key, value in job['payload'].items() if key.endswith('_path') and value)
+        # A batch job's images, by candidate and role
+        for images in job['payload'].get('candidates', {}).values():
+            paths.update(images.values())
+    return paths
+
+# With several server processes, the one holding the lock cleans up and the others
+# take over if it exits
+storage_cleaner = StorageCleaner(
+    app.config['UPLOAD_FOLDER'], referenced_upload_paths, lock_path=os.path.join(DATA_FOLDER, 'storage_cleanup.lock'),
+    cache_folders=(IMAGE_LAYER_FOLDER, DERIVATIVE_FOLDER)
+)
+
+def start_background_tasks(resume_jobs=True):
+    """
+    Re-queues the jobs a previous run left unfinished, if `resume_jobs`, and starts the
+    storage cleanup. Jobs must be resumed by a single process, once per server start.
+    Runs on the main thread of the serving process.
+    """
+    try:
+        # tesserocr's first import installs cysignals' signal handlers, which Python only
+        # allows on the main thread; the OCR modules themselves load lazily in a job or
+        # request thread
+        import cysignals  # noqa: F401
+    except ImportError:
+        pass
+    if resume_jobs:
+        resumed_jobs = job_queue.resume()
+        if resumed_jobs:
+            app.logger.info(f"Resumed {resumed_jobs} unfinished job(s)")
+    storage_cleaner.start()
+
+def warm_up():
+    """
+    Imports the PDF and OCR modules, compiles the CV template and loads an OCR model.
+    A preforking server runs this before forking, so that every worker shares them
+    copy-on-write instead of loading its own.
+    """
+    from pdf_utils import get_cv_template
+    from local_ocr import passport_ocr
+    get_cv_template(TEMPLATE_PDF_PATH)
+    passport_ocr.ocr_engine.get_ocr_engine()
+    app.logger.info("Preloaded the CV template and the OCR engine")
+
+# Render pool workers re-import this module when started with `python app.py`; only
+# the parent process may pick up unfinished jobs and clean up storage
+if BACKGROUND_TASKS == 'on' and multiprocessing.parent_process() is None:
+    start_background_tasks()
 
 if __name__ == '__main__':
     app.run(debug=False)
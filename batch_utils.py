@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import zipfile
+import zlib
+from werkzeug.utils import secure_filename
+
+from upload_stream import UPLOAD_CHUNK_BYTES, UPLOAD_MAX_FILE_BYTES, sniff_image_type
+
+# Recognised image names inside a candidate folder, by upload slot
+IMAGE_ROLES = {
+    'passport': {'passport'},
+    'face': {'face'},
+    'full_body': {'full_body', 'full-body', 'fullbody', 'body'},
+}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+MANIFEST_NAMES = {'manifest.csv'}
+REPORT_FIELDS = ['candidate', 'status', 'fullName', 'passportNo', 'pdf', 'error']
+
+# Largest batch upload request (the ZIP, or all images of a multipart batch)
+BATCH_MAX_UPLOAD_MB = int(os.getenv("BATCH_MAX_UPLOAD_MB", "1024"))
+# Limits on what a batch ZIP unpacks to: each image is held to the same limit as a single
+# upload, the manifest to MANIFEST_MAX_BYTES, and the whole batch to BATCH_MAX_UNPACKED_MB
+BATCH_MAX_UNPACKED_MB = float(os.getenv("BATCH_MAX_UNPACKED_MB", "2048"))
+MANIFEST_MAX_BYTES = 1024 * 1024
+# JPEG and PNG images barely compress; an entry that inflates more than this is rejected
+BATCH_MAX_COMPRESSION_RATIO = 100
+
+
+class BatchError(ValueError):
+    """Raised when an uploaded batch cannot be read at all."""
+
+
+def _image_role(filename):
+    stem, _, extension = filename.rpartition('.')
+    if extension.lower() not in IMAGE_EXTENSIONS:
+        return None
+    for role, names in IMAGE_ROLES.items():
+        if stem.lower() in names:
+            return role
+    return None
+
+
+def parse_manifest(manifest_bytes):
+    """
+    Parses the optional CSV manifest into a dict of per-candidate form fields.
+
+    The manifest needs a `candidate` column naming the candidate folder, and may have
+    `contactPhone`, `religion` and `experiences` columns. `experiences` is either a JSON
+    list of {"country", "period"} objects or `Country:period` pairs separated by `;`.
+    """
+    try:
+        text = manifest_bytes.decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        raise BatchError(f"Manifest is not valid UTF-8: {e}")
+
+    manifest = {}
+    for row_number, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        candidate = (row.get('candidate') or '').strip()
+        if not candidate:
+            raise BatchError(f"Manifest row {row_number} has no candidate name.")
+        entry = {}
+        if row.get('contactPhone'):
+            entry['contactPhone'] = row['contactPhone'].strip()
+        if row.get('religion'):
+            entry['religion'] = row['religion'].strip()
+        if row.get('experiences'):
+            entry['experiences'] = _parse_experiences(row['experiences'].strip(), row_number)
+        manifest[secure_filename(candidate)] = entry
+    return manifest
+
+
+def _parse_experiences(value, row_number):
+    if value.startswith('['):
+        try:
+            experiences = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise BatchError(f"Manifest row {row_number} has invalid experiences JSON: {e}")
+        return [{'country': str(exp.get('country', '')), 'period': str(exp.get('period', ''))} for exp in experiences]
+    experiences = []
+    for item in value.split(';'):
+        if not item.strip():
+            continue
+        country, _, period = item.partition(':')
+        experiences.append({'country': country.strip(), 'period': period.strip()})
+    return experiences
+
+
+def extract_batch_zip(zip_file, destination):
+    """
+    Unpacks a batch ZIP (a path or file object) of per-candidate folders into `destination`.
+
+    Each folder holding images is one candidate, named after the folder, and must
+    contain passport, face and full_body images (e.g. `abebe/passport.jpg`). A
+    `manifest.csv` may sit at the root of the ZIP. Every path component is sanitised,
+    so entries cannot escape `destination`.
+
+    The whole archive is checked before anything is written: entry sizes and
+    compression ratios against the limits above, and candidate folders whose names
+    collide (e.g. `a/x/` and `b/x/`) or that hold two images for the same role. Each
+    image's type is then sniffed from its first bytes as it is unpacked.
+
+    Returns:
+        tuple: (candidates, manifest_bytes) where candidates maps a candidate name to a
+        dict of image paths by role, and manifest_bytes is None if there is no manifest.
+    """
+    try:
+        archive = zipfile.ZipFile(zip_file)
+    except zipfile.BadZipFile as e:
+        raise BatchError(f"Uploaded batch is not a valid ZIP file: {e}")
+
+    with archive:
+        manifest_info, entries = _plan_batch_zip(archive)
+        candidates = {}
+        try:
+            manifest_bytes = archive.read(manifest_info) if manifest_info else None
+            for candidate, role, info, filename in entries:
+                candidate_dir = os.path.join(destination, candidate)
+                os.makedirs(candidate_dir, exist_ok=True)
+                image_path = os.path.join(candidate_dir, filename)
+                candidates.setdefault(candidate, {})[role] = image_path
+                # Copied in chunks; zipfile never inflates an entry beyond its checked size
+                with archive.open(info) as source, open(image_path, 'wb') as target:
+                    head = source.read(UPLOAD_CHUNK_BYTES)
+                    if sniff_image_type(head) is None:
+                        raise BatchError(f"Batch entry {info.filename} is not a JPEG or PNG image.")
+                    target.write(head)
+                    shutil.copyfileobj(source, target)
+        except (BatchError, zipfile.BadZipFile, zlib.error) as e:
+            for images in candidates.values():
+                for image_path in images.values():
+                    try:
+                        os.remove(image_path)
+                    except FileNotFoundError:
+                        pass
+            if isinstance(e, BatchError):
+                raise
+            raise BatchError(f"Uploaded batch is damaged: {e}")
+
+    return candidates, manifest_bytes
+
+
+def _plan_batch_zip(archive):
+    """Checks a batch ZIP's entries; returns (manifest entry or None, [(candidate, role, entry, filename)])."""
+    manifest_info = None
+    entries = []
+    # The folder each candidate name came from, and the (candidate, role) pairs seen
+    folders = {}
+    roles = set()
+    unpacked = 0
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        parts = [part for part in info.filename.replace('\\', '/').split('/') if part]
+        # Skip metadata that macOS and Windows add to archives
+        if not parts or parts[0] == '__MACOSX' or parts[-1].startswith('.'):
+            continue
+        if len(parts) == 1:
+            if parts[0].lower() in MANIFEST_NAMES:
+                _check_entry_size(info, MANIFEST_MAX_BYTES)
+                manifest_info = info
+                unpacked += info.file_size
+            continue
+
+        candidate = secure_filename(parts[-2])
+        role = _image_role(parts[-1])
+        if not candidate or role is None:
+            logging.info(f"Ignoring batch entry {info.filename}")
+            continue
+
+        folder = '/'.join(parts[:-1])
+        if folders.setdefault(candidate, folder) != folder:
+            raise BatchError(f"The folders {folders[candidate]} and {folder} both make candidate {candidate}; rename one of them.")
+        if (candidate, role) in roles:
+            raise BatchError(f"Candidate {candidate} has more than one {role} image.")
+        roles.add((candidate, role))
+        _check_entry_size(info, UPLOAD_MAX_FILE_BYTES)
+        unpacked += info.file_size
+        entries.append((candidate, role, info, secure_filename(parts[-1])))
+
+    if unpacked > BATCH_MAX_UNPACKED_MB * 1024 * 1024:
+        raise BatchError(f"The batch unpacks to more than {BATCH_MAX_UNPACKED_MB:g} MB.")
+    return manifest_info, entries
+
+
+def _check_entry_size(info, max_bytes):
+    if info.file_size > max_bytes:
+        raise BatchError(f"Batch entry {info.filename} is larger than {max_bytes // (1024 * 1024)} MB.")
+    if info.compress_size and info.file_size / info.compress_size > BATCH_MAX_COMPRESSION_RATIO:
+        raise BatchError(f"Batch entry {info.filename} is compressed suspiciously well.")
+
+
+def multipart_batch_candidates(uploads):
+    """
+    Groups the images of a multipart batch, where the `passport`, `face` and `full_body`
+    fields are repeated once per candidate in the same order, into candidates.
+    `uploads` maps each field to its images as saved by upload_stream.stream_upload.
+
+    Returns:
+        dict: candidate name (`candidate_001`, ...) to a dict of image paths by role.
+    """
+    counts = {len(uploads.get(role, [])) for role in IMAGE_ROLES}
+    if len(counts) != 1:
+        raise BatchError("The passport, face and full_body fields must be repeated the same number of times.")
+    return {
+        f"candidate_{index + 1:03d}": {role: uploads[role][index]['path'] for role in IMAGE_ROLES}
+        for index in range(counts.pop())
+    }
+
+
+def write_batch_archive(archive_path, results):
+    """
+    Writes the generated PDFs plus report.json and report.csv into a ZIP at `archive_path`.
+
+    `results` is a list of report rows (see REPORT_FIELDS); rows with status `ok` carry
+    the local PDF path under `pdf_path`, which is stored in the archive under `pdf`.
+    """
+    report = [{field: result.get(field, '') for field in REPORT_FIELDS} for result in results]
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if result.get('status') == 'ok':
+                archive.write(result['pdf_path'], result['pdf'])
+        archive.writestr('report.json', json.dumps(report, indent=2))
+        csv_buffer = io.StringIO()
+        writer = csv.DictWriter(csv_buffer, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
+        archive.writestr('report.csv', csv_buffer.getvalue())
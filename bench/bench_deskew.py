@@ -0,0 +1,73 @@
+"""
+Regression benchmark for `deskew` in local_ocr/passport_ocr.py on synthetic rotated
+passport scans: estimated skew against the true rotation, wall time, peak RSS and its
+growth over the decoded image, for the projection-profile estimator and for the
+previous minAreaRect-over-every-pixel implementation. Each measurement runs in a fresh
+process so peak RSS is not shared between runs.
+
+Usage: python -m bench.bench_deskew [--width PX]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bench.common import make_passport_image
+
+ROTATIONS = [0, 0.7, 3, -5, 12]
+
+
+def legacy_skew_angle(image):
+    """The skew angle computed by deskew() before it was bounded in memory."""
+    coords = np.column_stack(np.where(image > 0))
+    if coords.size == 0:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    return -(90 + angle) if angle < -45 else -angle
+
+
+def projection_skew_angle(image):
+    from local_ocr.passport_ocr import estimate_skew_angle
+    return estimate_skew_angle(image)
+
+
+def run(estimator_name, path):
+    estimator = {'legacy': legacy_skew_angle, 'projection': projection_skew_angle}[estimator_name]
+    # Prepared the way the full local OCR pass prepares the page for deskew()
+    image = cv2.medianBlur(np.array(Image.open(path).convert('L')), 3)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    angle = estimator(image)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return angle, seconds, peak * 1024, (peak - baseline) * 1024, image.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=3300, help='page width; 3300 px gives a ~12 MP unrotated scan')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'rotation':>8}  {'MP':>5}  {'estimator':>10}  {'angle':>7}  {'error':>6}  {'time':>8}  {'peak RSS':>9}  {'growth':>7}")
+        for rotation in ROTATIONS:
+            path = os.path.join(tmp, f"passport_{rotation}.jpg")
+            make_passport_image(path, args.width, rotation)
+            for estimator_name in ('legacy', 'projection'):
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    angle, seconds, peak_bytes, growth_bytes, pixels = pool.apply(run, (estimator_name, path))
+                # deskew() rotates counter-clockwise by the angle, so a level result is -rotation
+                error = abs(angle + rotation)
+                print(f"{rotation:>7}°  {pixels / 1e6:5.1f}  {estimator_name:>10}  {angle:6.2f}°  {error:5.2f}°  "
+                      f"{seconds * 1000:6.0f}ms  {peak_bytes / 1e6:7.0f}MB  {growth_bytes / 1e6:5.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
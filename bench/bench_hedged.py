@@ -0,0 +1,58 @@
+"""
+Compares the sequential Gemini key fallback with the hedged extraction mode against a
+mock provider where Gemini key 1 is slow and failing while key 2 and OpenRouter are
+healthy.
+
+Usage: python -m bench.bench_hedged [--repeat N]
+"""
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+
+from bench.common import make_sample_images
+from bench.mock_providers import MockProviderServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--slow-latency', type=float, default=2.0)
+    parser.add_argument('--fast-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    server = MockProviderServer(
+        latency=args.fast_latency,
+        per_key={'key-1': {'latency': args.slow_latency, 'failure_rate': 1.0, 'failure_status': 503}},
+    ).start()
+    os.environ.update({
+        'GEMINI_API_KEY_1': 'key-1', 'GEMINI_API_KEY_2': 'key-2', 'OPENROUTER_API_KEY': 'key-or',
+        'GEMINI_API_BASE': server.base_url, 'OPENROUTER_API_URL': server.openrouter_url,
+        'HEDGED_PROVIDERS': 'gemini_1:0,gemini_2:0.5,openrouter:1',
+        'EXTRACTION_CACHE': 'off', 'JOB_STORE': 'memory',
+    })
+    app = importlib.import_module('app')
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            passport_path = make_sample_images(tmp)['passport']
+            modes = {
+                'sequential (ai)': app.extract_passport_data_with_gemini,
+                'hedged': app.extract_passport_data_hedged,
+            }
+            for label, extract in modes.items():
+                latencies = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = extract(passport_path)
+                    latencies.append(time.perf_counter() - start)
+                    assert result, f"{label} extraction failed"
+                print(f"{label:16s} median {statistics.median(latencies):.2f}s  max {max(latencies):.2f}s")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
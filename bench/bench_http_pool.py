@@ -0,0 +1,51 @@
+"""
+Measures per-call latency of provider requests against a local mock server with a
+fresh connection per call (plain `requests.post`) and with the pooled provider session.
+
+The mock server speaks plain HTTP, so this only shows the TCP handshake and connection
+setup saved by keep-alive; against the real HTTPS endpoints the TLS handshake is saved
+too, which is typically tens of milliseconds more per call.
+
+Usage: python -m bench.bench_http_pool [--calls N]
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from bench.mock_providers import MockProviderServer
+from provider_client import create_provider_session
+
+# A request body roughly the size of a base64-encoded, downscaled passport photo
+PAYLOAD = {"contents": [{"parts": [{"text": "x" * 200_000}]}]}
+
+
+def time_calls(post, url, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = post(url, json=PAYLOAD, headers={"x-goog-api-key": "bench"}, timeout=10)
+        response.raise_for_status()
+        response.json()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    with MockProviderServer() as server:
+        url = f"{server.base_url}/v1beta/models/bench:generateContent"
+        session = create_provider_session()
+        for label, post in (('requests.post', requests.post), ('pooled session', session.post)):
+            time_calls(post, url, 5)
+            latencies = sorted(time_calls(post, url, args.calls))
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{label:16s} median {statistics.median(latencies):.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures the image work one request does on a large passport photo, with and without a
+shared image context. The request is an `mrz_ocr` extraction that falls back to the
+full local pass, the passport sent by three AI providers (as the hedged and auto modes
+do), and the three images sized for the PDF.
+
+Without a context every stage decodes or reads on its own, as before: the fast mode
+decodes the page to grayscale, the full pass decodes it to RGB, converts it to BGR and
+then to grayscale twice, every provider base64-encodes the AI image, and rendering
+reads every image header. With a context the page is decoded once, straight to
+grayscale, and the rest is computed once and shared.
+
+Reports the CPU time and the peak of traced allocations (numpy and OpenCV arrays,
+Python objects; Pillow's own image buffers are not traced).
+
+Usage: python -m bench.bench_image_context [--width PIXELS] [--repeat N]
+"""
+import argparse
+import base64
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+# Derivatives are created under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import image_pipeline
+from bench.common import make_passport_image, make_sample_images
+from extraction_providers import encoded_ai_image
+from image_context import image_context
+from local_ocr.passport_ocr import load_gray
+
+AI_PROVIDERS = 3
+
+
+def separate_decodes(passport, images):
+    # The fast mode's page
+    gray = np.array(Image.open(passport).convert('L'))
+    gray.mean()
+    # The full pass's page
+    image = cv2.cvtColor(np.array(Image.open(passport)), cv2.COLOR_RGB2BGR)
+    cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).mean()
+    cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).mean()
+    for _ in range(AI_PROVIDERS):
+        with open(image_pipeline.ai_image(passport), 'rb') as f:
+            base64.b64encode(f.read()).decode('utf-8')
+    for path in images:
+        image_pipeline._read_oriented_size(path)
+
+
+def shared_context(passport, images):
+    with image_context():
+        load_gray(passport).mean()
+        load_gray(passport).mean()
+        for _ in range(AI_PROVIDERS):
+            encoded_ai_image(passport)
+        for path in images:
+            image_pipeline.oriented_size(path)
+
+
+def run(func, args):
+    """Returns (CPU seconds, peak traced bytes) of one call."""
+    tracemalloc.start()
+    start = time.process_time()
+    func(*args)
+    elapsed = time.process_time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=4000, help="passport photo width in pixels")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_sample_images(tmp)
+        passport = os.path.join(tmp, 'passport_scan.jpg')
+        make_passport_image(passport, args.width, 2)
+        images = [paths['face'], paths['full_body'], passport]
+        width, height = image_pipeline.oriented_size(passport)
+        print(f"{width}x{height} passport JPEG ({os.path.getsize(passport) / 1e6:.1f} MB), "
+              f"{AI_PROVIDERS} AI providers")
+        print(f"{'':>20} {'CPU':>9} {'peak traced':>12}")
+        for label, func in (('separate decodes', separate_decodes), ('shared context', shared_context)):
+            func(passport, images)  # creates the AI derivative
+            samples = [run(func, (passport, images)) for _ in range(args.repeat)]
+            cpu_ms = statistics.median(s[0] for s in samples) * 1000
+            peak_mb = statistics.median(s[1] for s in samples) / 1e6
+            print(f"{label:>20} {cpu_ms:7.1f}ms {peak_mb:10.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures the CPU time and PDF size of rendering a CV whose images must be embedded, as
+on a first render or a full rebuild of one, with the three photos embedded:
+
+- by `page.insert_image(filename=...)` from the derivative files (the previous behaviour);
+- from the in-memory image cache written straight into image XObjects, cold (each
+  image read from its derivative file) and warm (the same photos rendered again, e.g.
+  in another CV or with another template).
+
+Usage: python -m bench.bench_image_embed [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+# Derivatives are created under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+
+import image_pipeline
+import pdf_utils
+from bench.common import TEMPLATE_PATH, make_sample_images, sample_cv_data
+
+
+def insert_image_from_files(doc, layout, images):
+    for slot_name, (page_num, slot_rect) in layout.image_slots.items():
+        max_size = (slot_rect.width / 72 * image_pipeline.PDF_IMAGE_DPI, slot_rect.height / 72 * image_pipeline.PDF_IMAGE_DPI)
+        derivative_path = image_pipeline.get_derivative(images[slot_name], max_size)
+        image_rect = pdf_utils.fit_image_rect(slot_rect, image_pipeline.oriented_size(images[slot_name]))
+        doc[page_num].insert_image(image_rect, filename=derivative_path)
+
+
+def cached_xobjects(doc, layout, images):
+    pdf_utils.stamp_images(doc, pdf_utils.slot_images(layout, images['face'], images['full_body'], images['passport']))
+
+
+def cold_xobjects(doc, layout, images):
+    image_pipeline._pdf_images.clear()
+    image_pipeline._pdf_images_bytes = 0
+    cached_xobjects(doc, layout, images)
+
+
+def render(template, data, images, embed):
+    """Renders a CV with `embed` embedding the images; returns (CPU seconds to embed, total CPU seconds, PDF bytes)."""
+    start = time.process_time()
+    doc = template.new_document()
+    embed(doc, template.layout, images)
+    embedded = time.process_time()
+    text_doc = template.text_layer(data)
+    for page_num in template.layout.text_pages:
+        doc[page_num].show_pdf_page(doc[page_num].rect, text_doc, page_num)
+    pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    end = time.process_time()
+    return embedded - start, end - start, pdf_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    template = pdf_utils.get_cv_template(TEMPLATE_PATH)
+    data = sample_cv_data()
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_sample_images(tmp)
+        print(f"{'images embedded by':>26} {'embed CPU':>10} {'render CPU':>11} {'PDF size':>10}")
+        for label, embed in (('insert_image from files', insert_image_from_files),
+                             ('XObjects, cold cache', cold_xobjects), ('XObjects, warm cache', cached_xobjects)):
+            render(template, data, images, embed)  # creates the derivatives
+            samples = [render(template, data, images, embed) for _ in range(args.repeat)]
+            embed_ms = statistics.median(s[0] for s in samples) * 1000
+            render_ms = statistics.median(s[1] for s in samples) * 1000
+            print(f"{label:>26} {embed_ms:8.2f}ms {render_ms:9.2f}ms {len(samples[0][2]) / 1e6:8.3f}MB")
+
+
+if __name__ == '__main__':
+    main()
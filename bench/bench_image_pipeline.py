@@ -0,0 +1,75 @@
+"""
+Measures what the image derivative stage saves for one candidate with phone-camera
+sized photos: bytes uploaded to the AI provider, size of the generated PDF, and CV
+rendering latency when the full-resolution uploads are embedded versus derivatives
+(cold, i.e. including creating them, and warm, i.e. cached).
+
+Usage: python -m bench.bench_image_pipeline [--repeat N]
+"""
+import argparse
+import base64
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from PIL import Image
+
+import extraction_cache
+import image_pipeline
+import pdf_utils
+from bench.common import TEMPLATE_PATH, make_sample_images, measure, sample_cv_data
+
+
+def original_image(image_path, slot_rect):
+    return image_pipeline.load_pdf_image(image_path), Image.open(image_path).size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_sample_images(tmp)
+        data = sample_cv_data()
+        output_path = os.path.join(tmp, 'out.pdf')
+        derivative_folder = os.path.join(tmp, 'derivatives')
+        layer_folder = os.path.join(tmp, 'image_layers')
+
+        def render():
+            # Embed the images on every render instead of reusing a cached image layer
+            shutil.rmtree(layer_folder, ignore_errors=True)
+            assert pdf_utils.create_cv_pdf(
+                output_path, data, TEMPLATE_PATH, images['face'], images['full_body'], images['passport']
+            )
+
+        with mock.patch.object(image_pipeline, 'DERIVATIVE_FOLDER', derivative_folder), \
+                mock.patch.object(pdf_utils, 'IMAGE_LAYER_FOLDER', layer_folder):
+            raw_upload = len(base64.b64encode(open(images['passport'], 'rb').read()))
+            ai_upload = len(base64.b64encode(open(image_pipeline.ai_image(images['passport']), 'rb').read()))
+            print(f"AI upload body    original {raw_upload / 1e6:6.2f} MB   derivative {ai_upload / 1e6:6.2f} MB")
+
+            with mock.patch.object(pdf_utils, 'pdf_image', original_image):
+                render()
+                original_pdf_size = os.path.getsize(output_path)
+                original_seconds = measure(render, args.repeat) / args.repeat
+
+            def cold_render():
+                shutil.rmtree(derivative_folder, ignore_errors=True)
+                extraction_cache._hashes.clear()
+                image_pipeline._pdf_images.clear()
+                image_pipeline._pdf_images_bytes = 0
+                render()
+
+            cold_seconds = measure(cold_render, args.repeat) / args.repeat
+            derivative_pdf_size = os.path.getsize(output_path)
+            warm_seconds = measure(render, args.repeat) / args.repeat
+
+        print(f"PDF size          original {original_pdf_size / 1e6:6.2f} MB   derivative {derivative_pdf_size / 1e6:6.2f} MB")
+        print(f"Render latency    original {original_seconds * 1000:6.1f} ms   "
+              f"derivative cold {cold_seconds * 1000:6.1f} ms   warm {warm_seconds * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the per-passport latency and accuracy of the two local OCR modes on synthetic
+TD3 passports: the full two-pass extraction (`local_ocr`) and the MRZ-first fast mode
+(`mrz_ocr`). The extraction cache is bypassed. Requires tesserocr or the tesseract binary.
+
+Usage: python -m bench.bench_local_ocr [--repeat N]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from bench.common import SAMPLE_PASSPORT, local_ocr_ground_truth, make_passport_image
+from local_ocr.mrz_band import locate_mrz_band
+from local_ocr.ocr_engine import get_ocr_engine
+from local_ocr.passport_ocr import extract_passport_data_local, extract_passport_data_local_fast
+
+# (page width in pixels, rotation in degrees)
+SCANS = [(1200, 0), (2000, 0), (2000, 3), (3000, -2)]
+
+EXPECTED = local_ocr_ground_truth(SAMPLE_PASSPORT)
+
+
+def correct_fields(data):
+    return sum(1 for field, value in EXPECTED.items() if data and data.get(field) == value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if get_ocr_engine().name == 'pytesseract':
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            sys.exit("tesseract is not installed; install it (or tesserocr) to run this benchmark.")
+
+    modes = [
+        ('local_ocr', extract_passport_data_local.__wrapped__),
+        ('mrz_ocr', extract_passport_data_local_fast.__wrapped__),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'scan':>14} {'locate':>8}  " + "  ".join(f"{name:>19}" for name, _ in modes))
+        for width, rotation in SCANS:
+            path = os.path.join(tmp, f"passport_{width}_{rotation}.jpg")
+            make_passport_image(path, width, rotation)
+
+            gray = np.array(Image.open(path).convert('L'))
+            start = time.perf_counter()
+            locate_mrz_band(gray)
+            locate_ms = (time.perf_counter() - start) * 1000
+
+            cells = []
+            for name, extract in modes:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    data = extract(path)
+                seconds = (time.perf_counter() - start) / args.repeat
+                cells.append(f"{seconds * 1000:8.0f} ms {correct_fields(data)}/{len(EXPECTED)} ok")
+            print(f"{width:>6}px {rotation:+3d}deg {locate_ms:6.1f}ms  " + "  ".join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Compares the MRZ-first fast mode (`mrz_ocr`) with the multi-variant mode (`mrz_multi`)
+on synthetic TD3 passports degraded the way poor phone photos and scans are: blurred,
+noisy, heavily JPEG-compressed, low-resolution and skewed. For each degradation it
+reports the mean latency of a whole extraction (including the fast mode's fallback to
+the full pass), how many MRZs were read exactly, how many fields were correct, and which
+variant decided the multi-variant reads. The extraction cache is bypassed. Requires
+tesserocr or the tesseract binary.
+
+Usage: python -m bench.bench_mrz_vote [--passports N]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageFilter
+
+from bench.common import local_ocr_ground_truth, make_passport_image, random_passport
+from local_ocr.mrz_band import locate_mrz_band
+from local_ocr.ocr_engine import get_ocr_engine
+from local_ocr.passport_ocr import extract_passport_data_local_fast, extract_passport_data_local_multi, read_mrz_variants
+
+
+def blur(image):
+    return image.filter(ImageFilter.GaussianBlur(3.5))
+
+
+def noise(image):
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels += np.random.default_rng(0).normal(0, 60, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def shadow(image):
+    # Darkens the page from left to right, like a phone held over one side of it
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels *= np.linspace(1.0, 0.35, pixels.shape[1])[None, :, None]
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+# name: (page width in pixels, rotation in degrees, JPEG quality, degradation or None)
+DEGRADATIONS = {
+    'clean': (1600, 0, 90, None),
+    'blur': (1600, 0, 90, blur),
+    'noise': (1600, 0, 90, noise),
+    'jpeg q5': (1600, 0, 5, None),
+    'low-res 700px': (700, 0, 60, None),
+    'shadow': (1600, 0, 90, shadow),
+    'skew 6deg + blur': (1600, 6, 90, blur),
+}
+
+
+def make_scan(path, passport, width, rotation, quality, degrade):
+    """Draws a degraded passport scan at `path`; returns its MRZ second line."""
+    _, line2 = make_passport_image(path, width, rotation, passport)
+    image = Image.open(path).convert('RGB')
+    if degrade:
+        image = degrade(image)
+    image.save(path, quality=quality)
+    return line2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--passports', type=int, default=4, help="passports per degradation")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if get_ocr_engine().name == 'pytesseract':
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            sys.exit("tesseract is not installed; install it (or tesserocr) to run this benchmark.")
+
+    modes = [
+        ('mrz_ocr', extract_passport_data_local_fast.__wrapped__),
+        ('mrz_multi', extract_passport_data_local_multi.__wrapped__),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = {}
+        for name, (width, rotation, quality, degrade) in DEGRADATIONS.items():
+            samples[name] = []
+            for i in range(args.passports):
+                passport = random_passport(seed=i)
+                path = os.path.join(tmp, f"passport_{len(samples)}_{i}.jpg")
+                line2 = make_scan(path, passport, width, rotation, quality, degrade)
+                samples[name].append((path, line2, local_ocr_ground_truth(passport)))
+        modes[0][1](samples['clean'][0][0])  # loads the OCR models
+
+        fields = len(next(iter(samples.values()))[0][2]) * args.passports
+        print(f"{args.passports} passports per scan; MRZ read exactly, fields correct of {fields}, mean latency")
+        print(f"{'scan':>18}  " + "  ".join(f"{name:>24}" for name, _ in modes) + "  decided by")
+        for name, scans in samples.items():
+            cells = []
+            for _, extract in modes:
+                mrz_ok = fields_ok = 0
+                start = time.perf_counter()
+                for path, line2, expected in scans:
+                    data = extract(path) or {}
+                    mrz_ok += data.get('mrzLine2') == line2
+                    fields_ok += sum(1 for field, value in expected.items() if data.get(field) == value)
+                seconds = (time.perf_counter() - start) / len(scans)
+                cells.append(f"{mrz_ok}/{len(scans)} {fields_ok:3d}/{fields} {seconds * 1000:7.0f} ms")
+
+            decided = Counter()
+            for path, _, _ in scans:
+                gray = np.array(Image.open(path).convert('L'))
+                decided[read_mrz_variants(gray, locate_mrz_band(gray))[2]] += 1
+            print(f"{name:>18}  " + "  ".join(f"{cell:>24}" for cell in cells) + "  " +
+                  ", ".join(f"{variant} {count}" for variant, count in decided.most_common()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Measures local OCR throughput with 1, 2, 4 and 8 workers for each available OCR engine:
+the in-process tesserocr pool and the tesseract binary run through pytesseract. The
+workload is the MRZ band and page crops that the fast local OCR mode recognises for a
+set of synthetic passports, submitted by as many concurrent callers as there are workers.
+
+Usage: python -m bench.bench_ocr_engine [--passports N] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from bench.common import make_passport_image
+from local_ocr.mrz_band import MRZ_OCR_CONFIG, crop_mrz_band, locate_mrz_band
+from local_ocr.ocr_engine import create_ocr_engine, tesserocr
+
+PAGE_OCR_CONFIG = r'--oem 1 --psm 11'
+
+
+def build_workload(directory, passports):
+    """Returns (image, config) pairs: the MRZ band and the page above it of each passport."""
+    jobs = []
+    for i in range(passports):
+        path = os.path.join(directory, f"passport_{i}.jpg")
+        make_passport_image(path, width=1600 + 200 * (i % 4), rotation=(i % 5) - 2)
+        gray = np.array(Image.open(path).convert('L'))
+        band = locate_mrz_band(gray)
+        jobs.append((crop_mrz_band(gray, band), MRZ_OCR_CONFIG))
+        jobs.append((gray[:band[1], :], PAGE_OCR_CONFIG))
+    return jobs
+
+
+def available_engines():
+    engines = []
+    if tesserocr is not None:
+        engines.append('tesserocr')
+    try:
+        pytesseract.get_tesseract_version()
+        engines.append('pytesseract')
+    except pytesseract.TesseractNotFoundError:
+        pass
+    return engines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--passports', type=int, default=8)
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    engines = available_engines()
+    if not engines:
+        raise SystemExit("Neither tesserocr nor the tesseract binary is installed.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = build_workload(tmp, args.passports)
+        print(f"{len(jobs)} OCR calls per run on {os.cpu_count()} CPUs")
+        print(f"{'engine':>12} {'workers':>8} {'calls/s':>8} {'p50':>8} {'p95':>8}")
+        for engine_name in engines:
+            for workers in [int(w) for w in args.workers.split(',')]:
+                engine = create_ocr_engine(engine_name, workers)
+
+                def timed_call(job):
+                    start = time.perf_counter()
+                    engine.image_to_string(job[0], config=job[1])
+                    return time.perf_counter() - start
+
+                # Warm up: the pool loads its models on first use
+                with ThreadPoolExecutor(workers) as executor:
+                    list(executor.map(timed_call, jobs[:workers]))
+                start = time.perf_counter()
+                with ThreadPoolExecutor(workers) as executor:
+                    latencies = sorted(executor.map(timed_call, jobs))
+                elapsed = time.perf_counter() - start
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                print(f"{engine_name:>12} {workers:>8} {len(jobs) / elapsed:8.2f} "
+                      f"{statistics.median(latencies) * 1000:6.0f}ms {p95 * 1000:6.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures edit-regenerate-download cycles for one candidate with each PDF storage
+backend: 'local', which writes every regenerated CV to the upload folder and serves the
+file, and 'none', which writes nothing and streams the CV rendered in memory. Reports
+latencies, the cycles per second of all clients together and the disk space the cycles
+leave behind, before and after a storage cleanup run that treats every unreferenced
+file as expired. With --clients N, N clients each edit a candidate of their own at the
+same time.
+
+Usage: python -m bench.bench_pdf_storage [--cycles N] [--clients N]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The app creates its databases, derivatives and image layers under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('JOB_STORE', 'memory')
+# Keep the app's storage cleanup away from the repository's upload folder
+os.environ.setdefault('STORAGE_CLEANUP_INTERVAL', '0')
+
+import app as cv_app
+from bench.common import make_sample_images, sample_cv_data
+from storage import StorageCleaner, create_pdf_storage
+
+
+def pdf_bytes_on_disk(folder):
+    return sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for directory, _, filenames in os.walk(folder) for filename in filenames if filename.endswith('.pdf')
+    )
+
+
+def run_client(images, cycles):
+    """Creates a candidate and regenerates and downloads it `cycles` times; returns the timings."""
+    cv_data = sample_cv_data()
+    cv_data.update({"firstName": "ABEBE", "fatherName": "KEBEDE", "grandfatherName": "TESFAYE"})
+    cv_data.update({f"{name}_image_path": path for name, path in images.items()})
+    candidate_id = cv_app.candidate_store.create(cv_data, cv_app.save_cv(cv_data)[1])
+
+    client = cv_app.app.test_client()
+    with client.session_transaction() as session:
+        session['candidate_id'] = candidate_id
+    form = {name: value for name, value in cv_data.items() if isinstance(value, str) and not name.endswith('_image_path')}
+    form.update({'experiences': json.dumps(cv_data['experiences']), 'regenerate': 'true'})
+
+    regenerate, download = [], []
+    for i in range(cycles):
+        form['contactPhone'] = f"+2519{i:08d}"
+        start = time.perf_counter()
+        assert client.post('/generate', data=form).status_code == 302
+        middle = time.perf_counter()
+        response = client.get(f"/candidates/{candidate_id}/cv.pdf")
+        assert response.status_code == 200 and response.data.startswith(b'%PDF')
+        response.close()
+        end = time.perf_counter()
+        regenerate.append((middle - start) * 1000)
+        download.append((end - middle) * 1000)
+    return regenerate, download
+
+
+def run_cycles(storage_name, images, cycles, clients=1):
+    """
+    Runs `clients` clients of `cycles` cycles each at the same time; returns their
+    timings, the cycles per second and the disk use.
+    """
+    with tempfile.TemporaryDirectory() as upload_folder:
+        cv_app.app.config['UPLOAD_FOLDER'] = upload_folder
+        cv_app.pdf_storage = create_pdf_storage(storage_name, upload_folder)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(lambda _: run_client(images, cycles), range(clients)))
+        throughput = clients * cycles / (time.perf_counter() - start)
+        regenerate = [ms for result in results for ms in result[0]]
+        download = [ms for result in results for ms in result[1]]
+
+        before_cleanup = pdf_bytes_on_disk(upload_folder)
+        # Leave the sample images alone; expire every PDF no candidate refers to
+        cleaner = StorageCleaner(upload_folder, lambda: cv_app.candidate_store.referenced_paths() | set(images.values()),
+                                 orphan_retention_hours=0, interval=0)
+        cleaner.run_once()
+        return regenerate, download, throughput, before_cleanup, pdf_bytes_on_disk(upload_folder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cycles', type=int, default=30)
+    parser.add_argument('--clients', type=int, default=1, help="clients cycling at the same time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_sample_images(tmp)
+        # Warm up the derivatives, the image layer and the rendering processes
+        run_cycles('local', images, 2, args.clients)
+        print(f"{args.cycles} edit-regenerate-download cycles per client and backend, {args.clients} client(s)")
+        print(f"{'storage':>8} {'regenerate':>11} {'download':>9} {'cycle':>8} {'cycles/s':>9} {'PDFs on disk':>13} {'after cleanup':>14}")
+        for storage_name in ('local', 'none'):
+            regenerate, download, throughput, before, after = run_cycles(storage_name, images, args.cycles, args.clients)
+            cycle = [r + d for r, d in zip(regenerate, download)]
+            print(f"{storage_name:>8} {statistics.median(regenerate):9.1f}ms {statistics.median(download):7.1f}ms "
+                  f"{statistics.median(cycle):6.1f}ms {throughput:9.1f} {before / 1e6:11.1f}MB {after / 1e6:12.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the generate_cv job with a slow mock AI provider, building the candidate's
+image layer after the extraction returns (PREBUILD_IMAGE_LAYER=off, as before) and
+while the extraction is in flight (on). Each job gets fresh phone-camera sized photos,
+so every job embeds its images. Reports the median job latency, the median time left
+after the extraction returned, i.e. the critical path the pipelining shortens, and the
+jobs per second. With --clients N, N clients each run their jobs at the same time, like
+the job threads of a busy server.
+
+Usage: python -m bench.bench_pipelined_generate [--repeat N] [--clients N] [--provider-latency SECONDS]
+"""
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import make_sample_images
+from bench.mock_providers import MockProviderServer
+
+
+def run_jobs(app, tmp, repeat, first_seed):
+    """Runs `repeat` jobs on fresh images; returns their (total, after extraction) seconds."""
+    from metrics import request_spans
+    samples = []
+    for i in range(repeat):
+        folder = os.path.join(tmp, str(first_seed + i))
+        os.makedirs(folder)
+        images = make_sample_images(folder, seed=first_seed + i)
+        payload = {
+            'extraction_method': 'ai', 'passport_image_path': images['passport'],
+            'face_image_path': images['face'], 'full_body_image_path': images['full_body'],
+            'contact_phone': '+251936987452', 'religion': 'Muslim', 'experiences': [],
+        }
+        start = time.perf_counter()
+        with request_spans() as spans:
+            app.generate_candidate(payload, lambda stage, progress: None)
+        total = time.perf_counter() - start
+        extraction = sum(seconds for name, seconds in spans if name == 'extraction')
+        samples.append((total, total - extraction))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=1, help="clients running jobs at the same time")
+    parser.add_argument('--provider-latency', type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = MockProviderServer(latency=args.provider_latency).start()
+    os.environ.update({
+        'GEMINI_API_KEY_1': 'key-1', 'GEMINI_API_BASE': server.base_url,
+        'EXTRACTION_CACHE': 'off', 'JOB_STORE': 'memory', 'STORAGE_CLEANUP_INTERVAL': '0',
+        'DATA_FOLDER': tempfile.mkdtemp(),
+    })
+    app = importlib.import_module('app')
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            app.app.config['UPLOAD_FOLDER'] = tmp
+            app.pdf_storage.folder = tmp
+            print(f"{args.repeat} generate_cv jobs per client, {args.clients} client(s), "
+                  f"provider latency {args.provider_latency:g}s, median")
+            print(f"{'image layer':>22} {'job':>9} {'after extraction':>17} {'jobs/s':>7}")
+            first_seed = 0
+            for label, setting in (('after extraction', 'off'), ('during extraction', 'on')):
+                app.PREBUILD_IMAGE_LAYER = setting
+                # The first jobs also compile the template and start the rendering processes
+                with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                    list(executor.map(lambda c: run_jobs(app, tmp, 1, first_seed + c), range(args.clients)))
+                first_seed += args.clients
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                    results = list(executor.map(
+                        lambda c: run_jobs(app, tmp, args.repeat, first_seed + c * args.repeat), range(args.clients)
+                    ))
+                throughput = args.clients * args.repeat / (time.perf_counter() - start)
+                first_seed += args.clients * args.repeat
+                samples = [sample for result in results for sample in result]
+                total = statistics.median(s[0] for s in samples) * 1000
+                after = statistics.median(s[1] for s in samples) * 1000
+                print(f"{label:>22} {total:7.0f}ms {after:15.0f}ms {throughput:7.2f}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the sequential Gemini key fallback (`ai`), without and with circuit breakers,
+and the adaptive `auto` method against a mock provider where Gemini key 1 is out of
+quota (429 after a delay), key 2 fails a share of its calls and OpenRouter is healthy
+but slower. Reports latency and
+success per method, then the per-provider metrics the registry collected.
+
+Usage: python -m bench.bench_provider_routing [--requests N]
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import tempfile
+import time
+
+# Read by the app's modules on import; every extraction must reach the providers
+os.environ.update({
+    'EXTRACTION_CACHE': 'off', 'JOB_STORE': 'memory', 'STORAGE_CLEANUP_INTERVAL': '0',
+    'DATA_FOLDER': tempfile.mkdtemp(),
+})
+
+from bench.common import make_sample_images
+from bench.mock_providers import MockProviderServer
+from extraction_providers import CircuitBreaker
+
+
+def reset_registry(registry, breaker_enabled=True):
+    """Clears the metrics and circuit state collected by a previous method."""
+    for name in list(registry.stats()):
+        registry.register(registry.get(name))
+        if not breaker_enabled:
+            registry._breakers[name] = CircuitBreaker(failure_threshold=10 ** 9, quota_open_seconds=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--quota-latency', type=float, default=1.0)
+    parser.add_argument('--flaky-failure-rate', type=float, default=0.3)
+    args = parser.parse_args()
+
+    server = MockProviderServer(
+        latency=0.6, seed=1,
+        per_key={
+            'key-1': {'latency': args.quota_latency, 'failure_rate': 1.0, 'failure_status': 429,
+                      'failure_message': "Quota exceeded for this API key."},
+            'key-2': {'latency': 0.3, 'failure_rate': args.flaky_failure_rate, 'failure_status': 500},
+        },
+    ).start()
+    os.environ.update({
+        'GEMINI_API_KEY_1': 'key-1', 'GEMINI_API_KEY_2': 'key-2', 'OPENROUTER_API_KEY': 'key-or',
+        'GEMINI_API_BASE': server.base_url, 'OPENROUTER_API_URL': server.openrouter_url,
+        'AUTO_PROVIDERS': 'gemini_1,gemini_2,openrouter',
+    })
+    app = importlib.import_module('app')
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            passport_path = make_sample_images(tmp)['passport']
+            print(f"{args.requests} extractions per method")
+            print(f"{'method':>20} {'p50':>7} {'p95':>7} {'max':>7} {'ok':>6}")
+            modes = [('ai, no breaker', 'ai', False), ('ai', 'ai', True), ('auto', 'auto', True)]
+            for label, method, breaker_enabled in modes:
+                reset_registry(app.provider_registry, breaker_enabled)
+                latencies, successes = [], 0
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    result = app.extract_passport_data(method, passport_path)
+                    latencies.append(time.perf_counter() - start)
+                    successes += bool(result)
+                latencies.sort()
+                print(f"{label:>20} {statistics.median(latencies):6.2f}s "
+                      f"{latencies[int(len(latencies) * 0.95) - 1]:6.2f}s {latencies[-1]:6.2f}s "
+                      f"{successes:>3}/{args.requests}")
+            print(json.dumps({
+                name: {key: value for key, value in stats.items() if key in ('circuit', 'calls', 'success_rate', 'p50', 'p95', 'totals')}
+                for name, stats in app.provider_registry.stats().items() if stats['available']
+            }, indent=2))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures edit-fix-regenerate cycles through the `/generate` regenerate route for one
+candidate with phone-camera sized photos: a full rebuild that embeds the three images
+again on every regenerate (the previous behaviour), the incremental regenerate that
+stamps the text onto the cached image layer, and a submit that changes nothing.
+
+Usage: python -m bench.bench_regenerate [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+# The app creates its databases, derivatives and image layers under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('JOB_STORE', 'memory')
+# Keep the app's storage cleanup away from the repository's upload folder
+os.environ.setdefault('STORAGE_CLEANUP_INTERVAL', '0')
+
+import app as cv_app
+import pdf_utils
+from bench.common import make_sample_images, sample_cv_data, stamp_cv
+from storage import LocalPDFStorage
+
+
+def full_rebuild(self, data, face_image_path, full_body_image_path, passport_image_path):
+    doc = self.new_document()
+    stamp_cv(doc, self.layout, data, face_image_path, full_body_image_path, passport_image_path)
+    return doc
+
+
+def edit_form(cv_data, typo):
+    """The fields the edit page posts, with the first name edited when `typo` is set."""
+    form = {name: value for name, value in cv_data.items() if isinstance(value, str)}
+    form['firstName'] = 'ABEBEE' if typo else 'ABEBE'
+    form['experiences'] = json.dumps(cv_data['experiences'])
+    form['regenerate'] = 'true'
+    return form
+
+
+def run_cycles(client, cv_data, repeat, edit):
+    """Posts `repeat` regenerates, toggling a typo if `edit`; returns latencies in ms."""
+    latencies = []
+    for i in range(repeat):
+        form = edit_form(cv_data, typo=edit and i % 2 == 0)
+        start = time.perf_counter()
+        response = client.post('/generate', data=form)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 302, response.get_data(as_text=True)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cv_app.app.config['UPLOAD_FOLDER'] = tmp
+        images = make_sample_images(tmp)
+        cv_data = sample_cv_data()
+        cv_data.update({"firstName": "ABEBE", "fatherName": "KEBEDE", "grandfatherName": "TESFAYE"})
+        cv_data.update({f"{name}_image_path": path for name, path in images.items()})
+        cv_app.pdf_storage = LocalPDFStorage(tmp)
+        output_pdf_path = cv_app.save_cv(cv_data)[1]
+        candidate_id = cv_app.candidate_store.create(cv_data, output_pdf_path)
+
+        client = cv_app.app.test_client()
+        with client.session_transaction() as session:
+            session['candidate_id'] = candidate_id
+        # Warm up: the first regenerate stores the form's field set with the candidate
+        run_cycles(client, cv_data, 2, edit=True)
+
+        results = {}
+        with mock.patch.object(pdf_utils.CVTemplate, 'render', full_rebuild):
+            results['full rebuild'] = run_cycles(client, cv_data, args.repeat, edit=True)
+        results['incremental'] = run_cycles(client, cv_data, args.repeat, edit=True)
+        run_cycles(client, cv_data, 1, edit=False)
+        results['unchanged'] = run_cycles(client, cv_data, args.repeat, edit=False)
+
+        print(f"{args.repeat} regenerates per mode")
+        print(f"{'mode':>14} {'p50':>9} {'p95':>9}")
+        for mode, latencies in results.items():
+            latencies.sort()
+            print(f"{mode:>14} {statistics.median(latencies):7.1f}ms {latencies[int(len(latencies) * 0.95) - 1]:7.1f}ms")
+        saved = statistics.median(results['full rebuild']) - statistics.median(results['incremental'])
+        print(f"Incremental regenerate saves {saved:.1f} ms per edit")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Load test of the pages that read the current CV (`/` and `/edit`) with the candidate
+kept in the signed session cookie, as the app used to, versus kept in the server-side
+candidate store with only its id in the cookie. The app runs on a local threaded HTTP
+server and is driven by concurrent clients; latency percentiles and request bytes per
+call are reported for a candidate with long names and three experiences.
+
+Usage: python -m bench.bench_session_store [--requests N] [--concurrency C]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The app creates its job and candidate databases on import
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('JOB_STORE', 'memory')
+# Keep the app's storage cleanup away from the repository's upload folder
+os.environ.setdefault('STORAGE_CLEANUP_INTERVAL', '0')
+
+import requests
+from flask import render_template, session
+from werkzeug.serving import make_server
+
+import app as cv_app
+from bench.common import sample_cv_data
+
+# Browsers drop cookies larger than this, so a larger session is silently lost
+COOKIE_LIMIT = 4096
+
+
+def long_candidate():
+    cv_data = sample_cv_data()
+    cv_data.update({
+        "firstName": "WOLDEGIORGIS", "fatherName": "GEBREMEDHIN", "grandfatherName": "HAILEMARIAM",
+        "fullName": "WOLDEGIORGIS GEBREMEDHIN HAILEMARIAM", "nationality": "ETHIOPIAN", "sex": "M",
+        "pob": "DEBRE MARKOS, EAST GOJJAM ZONE", "livingTown": "DEBRE MARKOS, EAST GOJJAM ZONE",
+        "experiences": [
+            {"country": "Kingdom of Saudi Arabia", "period": "4"},
+            {"country": "United Arab Emirates", "period": "2"},
+            {"country": "Hashemite Kingdom of Jordan", "period": "1"},
+        ],
+    })
+    for role in ('face', 'full_body', 'passport'):
+        cv_data[f"{role}_image_path"] = f"uploads/WOLDEGIORGIS_GEBREMEDHIN_HAILEMARIAM_{role}_photo_2024.jpeg"
+    return cv_data
+
+
+def legacy_index():
+    return render_template('index.html', cv_data=session.get('cv_data', {}), download_url=None)
+
+
+def legacy_edit():
+    return render_template('edit_cv.html', cv_data=session.get('cv_data', {}))
+
+
+def run_load(base_url, prefix, cookie, total, concurrency):
+    """Requests `/` and `/edit` alternately; returns latencies in ms and request bytes."""
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'http'):
+            local.http = requests.Session()
+            local.http.cookies.set('session', cookie)
+        path = f"{prefix}/" if i % 2 == 0 else f"{prefix}/edit"
+        start = time.perf_counter()
+        response = local.http.get(base_url + path, timeout=10)
+        latency = (time.perf_counter() - start) * 1000
+        response.raise_for_status()
+        request = response.request
+        sent = len(f"GET {request.path_url} HTTP/1.1\r\n") + sum(
+            len(f"{name}: {value}\r\n") for name, value in request.headers.items()
+        )
+        return latency, sent, len(response.content)
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(call, range(total)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    app = cv_app.app
+    app.add_url_rule('/legacy/', 'legacy_index', legacy_index)
+    app.add_url_rule('/legacy/edit', 'legacy_edit', legacy_edit)
+
+    cv_data = long_candidate()
+    candidate_id = cv_app.candidate_store.create(cv_data, None)
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookies = {
+        'cookie session': ('/legacy', serializer.dumps({'cv_data': cv_data, 'output_pdf_path': 'uploads/x.pdf'})),
+        'candidate store': ('', serializer.dumps({'candidate_id': candidate_id})),
+    }
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        print(f"{args.requests} requests, {args.concurrency} concurrent clients")
+        print(f"{'session':>16} {'cookie':>8} {'req bytes':>10} {'p50':>8} {'p95':>8} {'req/s':>8}")
+        for name, (prefix, cookie) in cookies.items():
+            run_load(base_url, prefix, cookie, 50, args.concurrency)  # warm up
+            start = time.perf_counter()
+            results = run_load(base_url, prefix, cookie, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - start
+            latencies = sorted(latency for latency, _, _ in results)
+            sent = statistics.mean(sent for _, sent, _ in results)
+            warning = '  (over the browser cookie limit)' if len(cookie) > COOKIE_LIMIT else ''
+            print(f"{name:>16} {len(cookie):>7}B {sent:>9.0f}B {statistics.median(latencies):6.2f}ms "
+                  f"{latencies[int(len(latencies) * 0.95) - 1]:6.2f}ms {len(results) / elapsed:8.0f}{warning}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
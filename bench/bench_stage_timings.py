@@ -0,0 +1,72 @@
+"""
+Runs the generate_cv job handler end to end with the local `mrz_ocr` extraction on a
+synthetic passport and phone-camera sized photos, and reports where the time goes: the
+median of every stage span the pipeline records, as /metrics and the job log see them.
+Each candidate gets fresh photos, so every run embeds its images. Also reports what
+one instrumented stage costs compared with the untimed block.
+
+Usage: python -m bench.bench_stage_timings [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+from collections import defaultdict
+
+# Read by the app's modules on import; every extraction must run the OCR
+os.environ.update({
+    'EXTRACTION_CACHE': 'off', 'JOB_STORE': 'memory', 'STORAGE_CLEANUP_INTERVAL': '0',
+    'DATA_FOLDER': tempfile.mkdtemp(),
+})
+
+import app as cv_app
+from bench.common import make_passport_image, make_sample_images, measure
+from metrics import request_spans, stage_timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cv_app.app.config['UPLOAD_FOLDER'] = tmp
+        cv_app.pdf_storage.folder = tmp
+        passport_path = os.path.join(tmp, 'passport.jpg')
+        make_passport_image(passport_path, width=2400)
+
+        durations = defaultdict(list)
+        for i in range(args.repeat + 1):
+            images = make_sample_images(tmp, seed=i)
+            payload = {
+                'extraction_method': 'mrz_ocr', 'passport_image_path': passport_path,
+                'face_image_path': images['face'], 'full_body_image_path': images['full_body'],
+                'contact_phone': '+251936987452', 'religion': 'Muslim', 'experiences': [],
+            }
+            with request_spans() as spans:
+                cv_app.generate_candidate(payload, lambda stage, progress: None)
+            if i == 0:
+                continue  # the first run also loads Tesseract and compiles the template
+            for name, seconds in spans:
+                durations[name].append(seconds * 1000)
+
+    print(f"{args.repeat} generate_cv jobs, median per stage")
+    for name, values in durations.items():
+        print(f"{name:>22} {statistics.median(values):9.1f}ms")
+
+    repeat = 100000
+    overhead = measure(timed_block, repeat) - measure(untimed_block, repeat)
+    print(f"Timing one stage adds {overhead / repeat * 1e6:.1f} us")
+
+
+def untimed_block():
+    pass
+
+
+def timed_block():
+    with stage_timer('bench'):
+        pass
+
+
+if __name__ == '__main__':
+    main()
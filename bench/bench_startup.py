@@ -0,0 +1,196 @@
+"""
+Compares the start-up time and memory of the app's entry points:
+
+- the Flask development server (`python app.py`), with the PDF and OCR modules imported
+  eagerly as app.py used to, and with the lazy imports;
+- gunicorn with gunicorn.conf.py and --workers workers, without and with the preloaded,
+  warmed-up app the workers share copy-on-write.
+
+Each server runs in a scratch directory with its own data folder. Reports the seconds
+until it first answers `/`, then the memory of all its processes, idle and after
+serving `mrz_ocr` generate jobs (by default 4 per worker, submitted together so every
+worker loads the OCR and PDF modules): total RSS, total PSS (shared pages split
+between the processes sharing them, i.e. what the server really costs) and the mean
+and largest private memory of the worker processes. Also times a bare `import app`.
+Linux only.
+
+Usage: python -m bench.bench_startup [--workers N] [--jobs N]
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.common import REPO_ROOT, TEMPLATE_PATH, make_passport_image, make_sample_images
+from pdf_utils import layout_path_for
+
+GUNICORN_CONFIG = os.path.join(REPO_ROOT, 'gunicorn.conf.py')
+# What app.py imported at the top before the PDF and OCR modules were imported lazily
+EAGER_IMPORTS = "import pdf_utils, local_ocr.passport_ocr; "
+
+
+def server_commands(port, workers):
+    """Returns {name: (command, extra environment)} for every entry point compared."""
+    dev_server = f"import app; app.app.run(port={port})"
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONFIG,
+                '--bind', f"127.0.0.1:{port}", '--workers', str(workers), 'app:app']
+    return {
+        'dev server, eager': ([sys.executable, '-c', EAGER_IMPORTS + dev_server], {}),
+        'dev server, lazy': ([sys.executable, '-c', dev_server], {}),
+        'gunicorn': (gunicorn, {'PRELOAD_APP': 'off'}),
+        'gunicorn, preload': (gunicorn, {}),
+    }
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; the parent pid follows its closing parenthesis
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return children
+
+
+def process_memory(pid):
+    """Returns the Rss, Pss and private memory of a process, in MB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values['Rss'], 'pss': values['Pss'],
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def server_memory(pid):
+    """Totals the memory of a server and its workers, with the workers' mean and largest private memory."""
+    processes = [process_memory(p) for p in [pid] + child_pids(pid)]
+    # The development server has no workers; it serves requests itself
+    workers = processes[1:] or processes
+    return {
+        'processes': len(processes),
+        'rss': sum(m['rss'] for m in processes),
+        'pss': sum(m['pss'] for m in processes),
+        'private': statistics.mean(m['private'] for m in workers),
+        'max_private': max(m['private'] for m in workers),
+    }
+
+
+def wait_until_ready(url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"Server did not answer {url} within {timeout}s")
+
+
+def run_job(base_url, images, index):
+    files = {role: (f"{role}_{index}.jpg", open(path, 'rb'), 'image/jpeg') for role, path in images.items()}
+    try:
+        response = requests.post(f"{base_url}/generate", files=files, data={'extractionMethod': 'mrz_ocr'}, timeout=60)
+    finally:
+        for _, f, _ in files.values():
+            f.close()
+    response.raise_for_status()
+    status_url = base_url + response.json()['statusUrl']
+    while True:
+        job = requests.get(status_url, timeout=60).json()
+        if job['status'] == 'done':
+            return
+        if job['status'] == 'failed':
+            raise RuntimeError(f"Job {index} failed: {job.get('message')}")
+        time.sleep(0.1)
+
+
+def measure_server(command, extra_env, port, images, jobs):
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app reads its template and writes its uploads relative to the working directory
+        for path in (TEMPLATE_PATH, layout_path_for(TEMPLATE_PATH)):
+            os.symlink(path, os.path.join(workdir, os.path.basename(path)))
+        env = {
+            **os.environ, **extra_env,
+            'PYTHONPATH': REPO_ROOT, 'DATA_FOLDER': os.path.join(workdir, 'data'), 'JOB_STORE': 'sqlite',
+            'EXTRACTION_CACHE': 'off', 'STORAGE_CLEANUP_INTERVAL': '0', 'LOG_LEVEL': 'WARNING',
+        }
+        base_url = f"http://127.0.0.1:{port}"
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(base_url + '/', process)
+            ready_seconds = time.perf_counter() - start
+            time.sleep(0.5)  # let every worker finish booting
+            idle = server_memory(process.pid)
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                list(executor.map(lambda index: run_job(base_url, images, index), range(jobs)))
+            loaded = server_memory(process.pid)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+    return ready_seconds, idle, loaded
+
+
+def measure_import(imports, repeat=3):
+    """Returns the median seconds and peak RSS (MB) of importing the app in a fresh interpreter."""
+    snippet = (
+        "import resource, time; start = time.perf_counter(); " + imports + "import app; "
+        "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)"
+    )
+    samples = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**os.environ, 'DATA_FOLDER': workdir, 'BACKGROUND_TASKS': 'off', 'LOG_LEVEL': 'WARNING'}
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', snippet], cwd=REPO_ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            # PyMuPDF may print a deprecation warning first
+            samples.append([float(value) for value in output.splitlines()[-1].split()])
+    return statistics.median(s[0] for s in samples), statistics.median(s[1] for s in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--jobs', type=int, help="generate jobs per server; defaults to 4 per worker")
+    parser.add_argument('--port', type=int, default=8131)
+    args = parser.parse_args()
+    jobs = args.jobs or 4 * args.workers
+
+    print(f"{'import app':>20} {'seconds':>8} {'peak RSS':>9}")
+    for name, imports in (('eager', EAGER_IMPORTS), ('lazy', '')):
+        seconds, rss = measure_import(imports)
+        print(f"{name:>20} {seconds:7.2f}s {rss:7.0f}MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_sample_images(tmp)
+        make_passport_image(images['passport'], width=2000)
+        print(f"\n{args.workers} gunicorn workers, {jobs} mrz_ocr jobs; memory in MB, idle -> after the jobs")
+        print(f"{'server':>20} {'ready':>7} {'procs':>5} {'RSS':>13} {'PSS':>13} {'private/worker':>15} {'max':>5}")
+        for name, (command, extra_env) in server_commands(args.port, args.workers).items():
+            ready, idle, loaded = measure_server(command, extra_env, args.port, images, jobs)
+            print(f"{name:>20} {ready:6.2f}s {idle['processes']:>5} "
+                  f"{idle['rss']:5.0f} -> {loaded['rss']:4.0f} {idle['pss']:5.0f} -> {loaded['pss']:4.0f} "
+                  f"{idle['private']:6.0f} -> {loaded['private']:4.0f} {loaded['max_private']:5.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares CV rendering throughput of the original renderer, which opens template.pdf
+and inserts the full-size photos for every CV, with the compiled CVTemplate: stamping
+the text and the downscaled photos onto a copy of it, and the app's `create_cv_pdf`,
+which stamps only the text onto the candidate's cached image layer.
+
+Usage: python -m bench.bench_template [--repeat N]
+"""
+import argparse
+import os
+import tempfile
+
+# The derivatives and image layer cache are created under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+
+from bench import baseline_pdf
+from bench.common import TEMPLATE_PATH, make_sample_images, measure, sample_cv_data, stamp_cv
+from pdf_utils import create_cv_pdf, get_cv_template
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_sample_images(tmp)
+        data = sample_cv_data()
+        output_path = os.path.join(tmp, 'out.pdf')
+        template = get_cv_template(TEMPLATE_PATH)
+
+        def original():
+            assert baseline_pdf.create_cv_pdf(
+                output_path, data, TEMPLATE_PATH, images['face'], images['full_body'], images['passport'])
+
+        def compiled():
+            doc = template.new_document()
+            stamp_cv(doc, template.layout, data, images['face'], images['full_body'], images['passport'])
+            doc.save(output_path)
+            doc.close()
+
+        def cached_layer():
+            assert create_cv_pdf(output_path, data, TEMPLATE_PATH, images['face'], images['full_body'], images['passport'])
+
+        runs = (('original renderer', original), ('compiled template', compiled), ('cached image layer', cached_layer))
+        for label, func in runs:
+            func()
+            elapsed = measure(func, args.repeat)
+            print(f"{label:22s} {args.repeat / elapsed:7.2f} CVs/s  ({elapsed / args.repeat * 1000:.1f} ms/CV)"
+                  f"  {os.path.getsize(output_path) / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
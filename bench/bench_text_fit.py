@@ -0,0 +1,103 @@
+"""
+Fits a batch of long three- and four-part names and places into the template's
+`fullName`, `pob` and `placeOfIssue` fields. Compares measuring the strings with a
+MuPDF call per string (`fitz.get_text_length`) against the cached glyph widths, reports
+the fitting throughput and how many values overflowed their field at the fixed 9 pt
+before and still overflow after fitting, and times stamping the text layer of a CV
+with long values.
+
+Usage: python -m bench.bench_text_fit [--count N] [--repeat N]
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+
+# The image layer cache is created under DATA_FOLDER
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp())
+
+import fitz
+
+from bench.common import TEMPLATE_PATH, measure, sample_cv_data
+from pdf_utils import get_cv_template
+from text_fit import fit_text, text_width
+
+LONG_NAMES = [
+    "GEBREMEDHIN", "WOLDEGIORGIS", "HAILEMARIAM", "TEKLEHAIMANOT", "GEBREKIDAN", "WOLDEMICHAEL",
+    "KIDANEMARIAM", "GEBRESELASSIE", "TSEGAYE", "ABRAHAM", "FIKREMARIAM", "BIRHANEMESKEL",
+]
+LONG_PLACES = [
+    "GEBRE GURACHA", "NORTH SHEWA ZONE", "DEBRE MARKOS", "ARBA MINCH ZURIA", "SOUTH GONDAR",
+    "KAMBATA TEMBARO", "WEST ARSI ZONE", "DEBRE BIRHAN", "MAIN DEPARTMENT FOR IMMIGRATION",
+    "AND NATIONALITY AFFAIRS", "ADDIS ABABA", "OROMIA REGION",
+]
+FIELDS = ("fullName", "pob", "placeOfIssue")
+
+
+def long_values(count, seed=0):
+    """Returns `count` (field name, value) pairs of long names and places."""
+    rng = random.Random(seed)
+    values = []
+    for i in range(count):
+        field_name = FIELDS[i % len(FIELDS)]
+        if field_name == "fullName":
+            value = " ".join(rng.sample(LONG_NAMES, rng.choice((3, 4))))
+        else:
+            value = ", ".join(rng.sample(LONG_PLACES, rng.choice((1, 2))))
+        values.append((field_name, value))
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=6000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    # Values that overflow even at the smallest size log a warning each
+    logging.disable(logging.WARNING)
+    layout = get_cv_template(TEMPLATE_PATH).layout
+    font = layout.font_name
+    values = long_values(args.count)
+    strings = [value for _, value in values]
+
+    def mupdf_lengths():
+        for value in strings:
+            fitz.get_text_length(value, fontname=font, fontsize=9)
+
+    def cached_lengths():
+        for value in strings:
+            text_width(value, font, 9)
+
+    def fit_all():
+        for field_name, value in values:
+            fit_text(value, layout.fields[field_name], font)
+
+    cached_lengths()  # measures every character once
+    print(f"{args.count} long names and places")
+    for label, func in (('fitz.get_text_length', mupdf_lengths), ('cached glyph widths', cached_lengths),
+                        ('fit_text', fit_all)):
+        elapsed = measure(func, 3)
+        print(f"{label:>22} {3 * args.count / elapsed:10.0f} strings/s")
+
+    overflowing = fitted = 0
+    for field_name, value in values:
+        slot = layout.fields[field_name]
+        if text_width(value, font, slot["font_size"]) > slot["max_width"]:
+            overflowing += 1
+            font_size, lines = fit_text(value, slot, font)
+            if all(text_width(line, font, font_size) <= slot["max_width"] for _, _, line in lines):
+                fitted += 1
+    print(f"{overflowing} ({overflowing / args.count:.0%}) overflow their field at 9 pt; "
+          f"{fitted} of them fit after shrinking or wrapping")
+
+    template = get_cv_template(TEMPLATE_PATH)
+    data = sample_cv_data()
+    data.update({field_name: value for field_name, value in values[:len(FIELDS)]})
+    elapsed = measure(lambda: template.text_layer(data).close(), args.repeat)
+    print(f"Text layer of a CV with long values: {elapsed / args.repeat * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
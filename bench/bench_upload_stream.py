@@ -0,0 +1,100 @@
+"""
+Compares saving a /generate upload the way Flask's `request.files` does (the whole
+multipart body parsed and spooled first, then each file copied to `uploads/`) with
+`stream_upload`, which writes each file to its final place as it arrives, sniffing,
+hashing and header-checking it on the way. The upload is three large JPEGs.
+
+Reports the wall time, the peak of traced allocations and how many bytes of the body
+were read, for a valid upload and for one whose passport is not an image (which
+`request.files` only refused by extension, after reading everything).
+
+Usage: python -m bench.bench_upload_stream [--megabytes N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+from werkzeug.http import parse_options_header
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from extraction_cache import hash_file
+from upload_stream import UploadError, stream_upload
+
+ROLES = ('passport', 'face', 'full_body')
+
+
+def make_body(file_bytes):
+    """Returns (body, content type) of a multipart upload of three files."""
+    files = {role: (io.BytesIO(data), f"{role}.jpg") for role, data in zip(ROLES, file_bytes)}
+    builder = EnvironBuilder(method='POST', data={'extractionMethod': 'mrz_ocr', **files})
+    environ = builder.get_environ()
+    body = environ['wsgi.input'].read()
+    return body, environ['CONTENT_TYPE']
+
+
+def spooled(body, content_type, destination):
+    request = Request(EnvironBuilder(method='POST', input_stream=io.BytesIO(body), content_type=content_type,
+                                     content_length=len(body)).get_environ())
+    for role in ROLES:
+        path = os.path.join(destination, f"{role}.jpg")
+        request.files[role].save(path)
+        hash_file(path)
+    return len(body)
+
+
+def streamed(body, content_type, destination):
+    stream = io.BytesIO(body)
+    boundary = parse_options_header(content_type)[1]['boundary'].encode()
+    try:
+        stream_upload(stream, boundary, len(body), destination, set(ROLES))
+    except UploadError:
+        pass
+    return stream.tell()
+
+
+def run(func, body, content_type):
+    """Returns (seconds, peak traced bytes, bytes consumed) of one upload."""
+    with tempfile.TemporaryDirectory() as destination:
+        tracemalloc.start()
+        start = time.perf_counter()
+        consumed = func(body, content_type, destination)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak, consumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', type=float, default=10, help="size of each uploaded file")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    size = int(args.megabytes * 1024 * 1024)
+    # A real JPEG padded to size with random bytes; only its header is ever read
+    header = io.BytesIO()
+    Image.new('RGB', (3000, 4000), 'white').save(header, 'JPEG')
+    images = [header.getvalue() + os.urandom(size - header.tell()) for _ in ROLES]
+    uploads = {
+        'valid': make_body(images),
+        'not an image': make_body([b'%PDF-1.7\n' + images[0][9:]] + images[1:]),
+    }
+    print(f"3 x {args.megabytes:g} MB upload")
+    print(f"{'':>14} {'':>11} {'wall':>9} {'peak traced':>12} {'consumed':>10}")
+    for name, (body, content_type) in uploads.items():
+        for label, func in (('request.files', spooled), ('stream_upload', streamed)):
+            samples = [run(func, body, content_type) for _ in range(args.repeat)]
+            seconds = statistics.median(s[0] for s in samples)
+            peak_mb = statistics.median(s[1] for s in samples) / 1e6
+            consumed_mb = samples[0][2] / 1e6
+            print(f"{name:>14} {label:>11} {seconds * 1000:7.1f}ms {peak_mb:10.1f}MB {consumed_mb:8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
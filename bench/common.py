@@ -0,0 +1,199 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(REPO_ROOT, 'template.pdf')
+
+# Typical phone-camera sizes for the three uploads of one candidate
+SAMPLE_IMAGE_SIZES = {
+    'face': (1200, 1600),
+    'full_body': (2000, 3000),
+    'passport': (3000, 4000),
+}
+
+
+def make_sample_images(directory, sizes=SAMPLE_IMAGE_SIZES, seed=0):
+    """Writes noisy JPEG stand-ins for the candidate photos and returns their paths by name."""
+    rng = np.random.default_rng(seed)
+    paths = {}
+    for name, (width, height) in sizes.items():
+        blocks = rng.integers(0, 255, (height // 50, width // 50, 3)).astype('uint8')
+        image = Image.fromarray(blocks).resize((width, height))
+        path = os.path.join(directory, f"{name}.jpg")
+        image.save(path, quality=90)
+        paths[name] = path
+    return paths
+
+
+def sample_cv_data():
+    return {
+        "fullName": "ABEBE KEBEDE TESFAYE",
+        "passportNo": "EP1234567",
+        "dob": "01 JAN 90",
+        "age": "34",
+        "pob": "ADDIS ABABA",
+        "livingTown": "ADDIS ABABA",
+        "dateOfIssue": "06 MAY 25",
+        "placeOfIssue": "Addis Ababa",
+        "dateOfExpiry": "05 MAY 30",
+        "cvCreationDate": "01 JAN 2025",
+        "contactPhone": "+251936987452",
+        "religion": "Muslim",
+        "experiences": [{"country": "Saudi Arabia", "period": "2"}, {"country": "UAE", "period": "1"}],
+    }
+
+
+def stamp_cv(doc, layout, data, face_image_path, full_body_image_path, passport_image_path):
+    """
+    Inserts the candidate's text and images into `doc`, an opened copy of a CV template,
+    in one pass, without the image layer cache the app renders through.
+    """
+    # Imported here so that importing this module does not fix DATA_FOLDER for the benchmark
+    from pdf_utils import slot_images, stamp_images, stamp_text
+
+    stamp_text(doc, layout, data)
+    stamp_images(doc, slot_images(layout, face_image_path, full_body_image_path, passport_image_path))
+
+
+def measure(func, repeat):
+    """Calls `func` `repeat` times and returns the elapsed wall-clock seconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return time.perf_counter() - start
+
+
+def make_td3_mrz(surname, given_names, passport_no, nationality, dob, sex, expiry, issuing_state='ETH'):
+    """
+    Builds both lines of a TD3 (passport) MRZ with valid ICAO 9303 check digits.
+    Dates are YYMMDD strings and given_names is a list of names.
+    """
+    from local_ocr.mrz import mrz_check_digit
+
+    names = f"{surname}<<{'<'.join(given_names)}"
+    line1 = f"P<{issuing_state}{names}".ljust(44, '<')[:44]
+    passport_field = passport_no.ljust(9, '<')
+    personal_number = '<' * 14
+    line2 = (
+        f"{passport_field}{mrz_check_digit(passport_field)}{nationality}"
+        f"{dob}{mrz_check_digit(dob)}{sex}{expiry}{mrz_check_digit(expiry)}"
+        f"{personal_number}{mrz_check_digit(personal_number)}"
+    )
+    composite = line2[0:10] + line2[13:20] + line2[21:43]
+    return line1, line2 + mrz_check_digit(composite)
+
+
+def sample_extraction():
+    """A provider response for the sample candidate, including a valid MRZ line."""
+    _, mrz_line2 = make_td3_mrz('TESFAYE', ['ABEBE', 'KEBEDE'], 'EP1234567', 'ETH', '900101', 'M', '300505')
+    return {
+        "firstName": "ABEBE", "fatherName": "KEBEDE", "grandfatherName": "TESFAYE",
+        "passportNo": "EP1234567", "nationality": "ETH", "dob": "01 JAN 90", "sex": "M",
+        "pob": "ADDIS ABABA", "placeOfIssue": "ADDIS ABABA", "dateOfIssue": "06 MAY 25",
+        "dateOfExpiry": "05 MAY 30", "mrzLine2": mrz_line2,
+    }
+
+
+# Ground truth of the synthetic passport drawn by make_passport_image
+SAMPLE_PASSPORT = {
+    "surname": "TESFAYE", "given_names": ["ABEBE", "KEBEDE"], "passport_no": "EP1234567",
+    "nationality": "ETH", "dob": "900101", "sex": "M", "expiry": "300505",
+    "pob": "ADDIS ABABA", "date_of_issue": "06 MAY 25", "authority": "MAIN DEPARTMENT FOR IMMIGRATION",
+}
+
+
+GIVEN_NAMES = ["ABEBE", "KEBEDE", "TESFAYE", "ALMAZ", "HANA", "MEKDES", "YONAS", "DAWIT", "SELAM", "BIRTUKAN",
+               "GIRMA", "TSEHAY", "FATUMA", "AHMED", "MULU", "BEKELE"]
+TOWNS = ["ADDIS ABABA", "DIRE DAWA", "BAHIR DAR", "HAWASSA", "MEKELLE", "GONDAR", "JIMMA", "ADAMA"]
+
+
+def visual_date(yymmdd):
+    """Formats an MRZ date the way the printed page shows it, e.g. '900101' -> '01 JAN 90'."""
+    return datetime.strptime(yymmdd, '%y%m%d').strftime('%d %b %y').upper()
+
+
+def random_passport(seed):
+    """Returns a synthetic passport like SAMPLE_PASSPORT with names, number and dates drawn from `seed`."""
+    rng = random.Random(seed)
+    dob = date(1970, 1, 1) + timedelta(days=rng.randrange(35 * 365))
+    issued = date(2020, 1, 1) + timedelta(days=rng.randrange(5 * 365))
+    expiry = issued + timedelta(days=5 * 365)
+    surname, father, first = rng.sample(GIVEN_NAMES, 3)
+    return {
+        "surname": surname, "given_names": [first, father], "passport_no": f"EP{rng.randrange(10 ** 7):07d}",
+        "nationality": "ETH", "dob": dob.strftime('%y%m%d'), "sex": rng.choice("MF"), "expiry": expiry.strftime('%y%m%d'),
+        "pob": rng.choice(TOWNS), "date_of_issue": issued.strftime('%d %b %y').upper(),
+        "authority": "MAIN DEPARTMENT FOR IMMIGRATION",
+    }
+
+
+def local_ocr_ground_truth(passport):
+    """The fields local OCR should read from a passport drawn by make_passport_image."""
+    return {
+        "firstName": passport["given_names"][0],
+        "fatherName": passport["given_names"][1],
+        "passportNo": passport["passport_no"],
+        "dob": visual_date(passport["dob"]),
+        "sex": passport["sex"],
+        "dateOfExpiry": visual_date(passport["expiry"]),
+        "pob": passport["pob"],
+        "dateOfIssue": passport["date_of_issue"],
+    }
+
+
+def _font(name, size):
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def make_passport_image(path, width=1600, rotation=0.0, passport=SAMPLE_PASSPORT, quality=90):
+    """
+    Draws a synthetic TD3 passport data page with a valid MRZ, scaled to `width` pixels
+    and rotated by `rotation` degrees (counter-clockwise) on a light background, and saves
+    it as a JPEG. Returns the MRZ lines drawn.
+    """
+    line1, line2 = make_td3_mrz(
+        passport["surname"], passport["given_names"], passport["passport_no"],
+        passport["nationality"], passport["dob"], passport["sex"], passport["expiry"],
+    )
+    # Draw at a fixed 1600 x 1130 (ID-3 proportions) and scale afterwards
+    page = Image.new('RGB', (1600, 1130), (236, 233, 222))
+    draw = ImageDraw.Draw(page)
+    label_font, value_font = _font("DejaVuSans.ttf", 22), _font("DejaVuSans-Bold.ttf", 34)
+    draw.rectangle((60, 160, 460, 680), fill=(150, 140, 130))  # photo
+    fields = [
+        ("Surname", passport["surname"]),
+        ("Given Names", " ".join(passport["given_names"])),
+        ("Nationality", "ETHIOPIAN"),
+        ("Date of Birth", visual_date(passport["dob"])),
+        ("Place of Birth", passport["pob"]),
+        ("Date of Issue", passport["date_of_issue"]),
+        ("Date of Expiry", visual_date(passport["expiry"])),
+        ("Authority", passport["authority"]),
+    ]
+    draw.text((60, 50), "PASSPORT", font=_font("DejaVuSans-Bold.ttf", 48), fill=(30, 30, 60))
+    for i, (label, value) in enumerate(fields):
+        y = 160 + i * 80
+        draw.text((520, y), label, font=label_font, fill=(80, 80, 80))
+        draw.text((520, y + 26), value, font=value_font, fill=(20, 20, 20))
+    mrz_font = _font("DejaVuSansMono.ttf", 56)
+    draw.text((40, 900), line1, font=mrz_font, fill=(0, 0, 0))
+    draw.text((40, 990), line2, font=mrz_font, fill=(0, 0, 0))
+
+    page = page.resize((width, int(width * page.height / page.width)), Image.BICUBIC)
+    # Leave a margin around the page, like a scan or phone photo of it
+    margin = width // 10
+    canvas = Image.new('RGB', (page.width + 2 * margin, page.height + 2 * margin), (250, 250, 250))
+    canvas.paste(page, (margin, margin))
+    if rotation:
+        canvas = canvas.rotate(rotation, resample=Image.BICUBIC, expand=True, fillcolor=(250, 250, 250))
+    canvas.save(path, quality=quality)
+    return line1, line2
@@ -0,0 +1,143 @@
+"""
+Local stand-ins for the Gemini and OpenRouter HTTP APIs, with configurable latency and
+failure rates. Point the app at one with GEMINI_API_BASE=http://127.0.0.1:<port> and
+OPENROUTER_API_URL=http://127.0.0.1:<port>/api/v1/chat/completions.
+
+Usage: python -m bench.mock_providers [--port 8765] [--latency 1.5] [--failure-rate 0.1]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench.common import sample_extraction
+
+
+class MockProviderServer:
+    """
+    Serves Gemini `...:generateContent` and OpenRouter `/chat/completions` requests.
+
+    Every request sleeps `latency` seconds, then fails with `failure_status` and
+    `failure_message` with probability `failure_rate`, or answers with text that is not JSON with probability
+    `invalid_rate`; otherwise it answers with `extraction` as the model's JSON output.
+    `per_key` maps an API key to a dict overriding any of these settings for requests
+    made with that key, so one server can stand in for a slow and a healthy provider.
+    """
+
+    def __init__(self, port=0, latency=0.0, failure_rate=0.0, failure_status=500, invalid_rate=0.0,
+                 extraction=None, per_key=None, seed=None, failure_message="mock failure"):
+        self.defaults = {
+            'latency': latency,
+            'failure_rate': failure_rate,
+            'failure_status': failure_status,
+            'failure_message': failure_message,
+            'invalid_rate': invalid_rate,
+        }
+        self.per_key = per_key or {}
+        self.extraction = extraction or sample_extraction()
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def openrouter_url(self):
+        return f"{self.base_url}/api/v1/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def settings_for(self, api_key):
+        return {**self.defaults, **self.per_key.get(api_key, {})}
+
+    def _outcome(self, settings):
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+        if roll < settings['failure_rate']:
+            return 'fail'
+        if roll < settings['failure_rate'] + settings['invalid_rate']:
+            return 'invalid'
+        return 'ok'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so clients can keep connections alive between requests, and no
+            # Nagle delay on the body written after the headers of a kept-alive connection
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                api_key = self.headers.get('x-goog-api-key') or self.headers.get('Authorization', '').removeprefix('Bearer ')
+                settings = server.settings_for(api_key)
+                time.sleep(settings['latency'])
+                outcome = server._outcome(settings)
+                if outcome == 'fail':
+                    return self._send(settings['failure_status'], {"error": {"message": settings['failure_message']}})
+
+                text = "Sorry, I cannot help with that." if outcome == 'invalid' else json.dumps(server.extraction)
+                if ':generateContent' in self.path:
+                    body = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+                elif self.path.endswith('/chat/completions'):
+                    body = {"choices": [{"message": {"role": "assistant", "content": text}}]}
+                else:
+                    return self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+                self._send(200, body)
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-status', type=int, default=500)
+    parser.add_argument('--invalid-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockProviderServer(args.port, args.latency, args.failure_rate, args.failure_status, args.invalid_rate)
+    print(f"Mock Gemini/OpenRouter listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
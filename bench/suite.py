@@ -0,0 +1,409 @@
+"""
+End-to-end benchmark suite. Each scenario runs in a fresh process with its own data
+folder, and the results are written as JSON together with the commit they were
+measured at, so runs can be compared across commits with --baseline:
+
+- ocr: `extract_passport_data_local` and the MRZ-first fast mode on synthetic TD3
+  passports with known ground truth, at several resolutions and rotations, called from
+  --concurrency threads. Reports latency, throughput and field-level accuracy.
+- pdf: `create_cv_pdf` in a pool of --concurrency worker processes, the way batch
+  generation renders. Reports latency, throughput and PDF size, for the first render of
+  a candidate (cold: its image layer is built) and for renders that reuse it (warm).
+- generate: the full `/generate` route using the `ai` method against the mock
+  Gemini/OpenRouter server, from --concurrency clients that upload, poll the job and
+  download the CV. Reports end-to-end latency, throughput, success rate, PDF size and
+  the accuracy of the stored candidate against the mock's answer.
+
+Every scenario also reports its process's peak RSS, and that of the processes it
+started. The extraction cache is off.
+
+Usage: python -m bench.suite [--scenarios ocr,pdf,generate] [--concurrency N]
+                             [--output PATH] [--baseline PATH] [--fail-on-regression]
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+# Read by the app's modules on import; every extraction must reach the OCR or providers
+os.environ.update({
+    'EXTRACTION_CACHE': 'off', 'JOB_STORE': 'memory', 'STORAGE_CLEANUP_INTERVAL': '0', 'LOG_LEVEL': 'WARNING',
+})
+
+from bench.common import (
+    REPO_ROOT, TEMPLATE_PATH, local_ocr_ground_truth, make_passport_image, make_sample_images, random_passport,
+    sample_cv_data,
+)
+from bench.mock_providers import MockProviderServer
+
+# Synthetic passport scans: page widths in pixels and rotations in degrees
+SCAN_WIDTHS = (1200, 2000, 3000)
+SCAN_ROTATIONS = (0, 3)
+# Result keys for which a higher value is better; for every other metric lower is better
+HIGHER_IS_BETTER = {'throughput_per_s', 'accuracy', 'success_rate'}
+
+
+def latency_summary(latencies):
+    """Returns the p50, p95, p99 and maximum of a list of seconds, in milliseconds."""
+    ordered = sorted(latencies)
+
+    def percentile(q):
+        return round(ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] * 1000, 1)
+
+    return {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99), 'max': percentile(1.0)}
+
+
+def load_summary(latencies, wall_seconds):
+    return {
+        'requests': len(latencies),
+        'throughput_per_s': round(len(latencies) / wall_seconds, 3),
+        'latency_ms': latency_summary(latencies),
+    }
+
+
+def size_summary(sizes):
+    sizes = [size for size in sizes if size is not None]
+    if not sizes:
+        return None
+    return {'mean_kb': round(sum(sizes) / len(sizes) / 1024, 1), 'max_kb': round(max(sizes) / 1024, 1)}
+
+
+def field_accuracy(pairs):
+    """
+    Takes (expected fields, extracted fields or None) pairs and returns the share of
+    fields extracted correctly, overall and per field.
+    """
+    per_field = defaultdict(list)
+    for expected, actual in pairs:
+        for field, value in expected.items():
+            per_field[field].append(bool(actual) and actual.get(field) == value)
+    total = sum(len(results) for results in per_field.values())
+    return {
+        'overall': round(sum(sum(results) for results in per_field.values()) / total, 3) if total else None,
+        'fields': {field: round(sum(results) / len(results), 3) for field, results in per_field.items()},
+    }
+
+
+def run_concurrently(func, items, concurrency):
+    """
+    Calls `func` on every item from `concurrency` threads. Returns the results in item
+    order, the seconds each call took and the wall-clock seconds of the whole run.
+    """
+    def timed(item):
+        start = time.perf_counter()
+        result = func(item)
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, items))
+    wall_seconds = time.perf_counter() - start
+    return [result for result, _ in outcomes], [seconds for _, seconds in outcomes], wall_seconds
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        'peak_child_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1),
+    }
+
+
+def scenario_ocr(args, workdir):
+    import pytesseract
+    from local_ocr.ocr_engine import get_ocr_engine
+    from local_ocr.passport_ocr import (
+        extract_passport_data_local, extract_passport_data_local_fast, extract_passport_data_local_multi,
+    )
+
+    engine = get_ocr_engine()
+    if engine.name == 'pytesseract':
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            return {'skipped': 'tesseract is not installed'}
+
+    samples = []
+    for width in SCAN_WIDTHS:
+        for rotation in SCAN_ROTATIONS:
+            for _ in range(args.passports):
+                passport = random_passport(seed=len(samples))
+                path = os.path.join(workdir, f"passport_{len(samples)}.jpg")
+                make_passport_image(path, width, rotation, passport)
+                samples.append({'scan': f"{width}px{rotation:+d}deg", 'path': path, 'expected': local_ocr_ground_truth(passport)})
+
+    results = {'engine': engine.name, 'passports': len(samples)}
+    modes = [
+        ('local_ocr', extract_passport_data_local.__wrapped__),
+        ('mrz_ocr', extract_passport_data_local_fast.__wrapped__),
+        ('mrz_multi', extract_passport_data_local_multi.__wrapped__),
+    ]
+    for mode, extract in modes:
+        extract(samples[0]['path'])  # loads the OCR models
+        outputs, latencies, wall_seconds = run_concurrently(lambda sample: extract(sample['path']), samples, args.concurrency)
+        by_scan = {}
+        for scan in dict.fromkeys(sample['scan'] for sample in samples):
+            indices = [i for i, sample in enumerate(samples) if sample['scan'] == scan]
+            by_scan[scan] = {
+                'latency_ms': latency_summary([latencies[i] for i in indices]),
+                'accuracy': field_accuracy((samples[i]['expected'], outputs[i]) for i in indices)['overall'],
+            }
+        results[mode] = {
+            **load_summary(latencies, wall_seconds),
+            'accuracy': field_accuracy((sample['expected'], output) for sample, output in zip(samples, outputs)),
+            'by_scan': by_scan,
+        }
+    return results
+
+
+def load_cv_template():
+    """Compiles the CV template in a render worker, so the timed renders do not include it."""
+    from pdf_utils import get_cv_template
+    get_cv_template(TEMPLATE_PATH)
+
+
+def scenario_pdf(args, workdir):
+    from pdf_utils import create_cv_pdf
+
+    candidates = []
+    for i in range(args.candidates):
+        folder = os.path.join(workdir, f"candidate_{i}")
+        os.makedirs(folder)
+        candidates.append(make_sample_images(folder, seed=i))
+    data = sample_cv_data()
+
+    pool = ProcessPoolExecutor(max_workers=args.concurrency, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        for future in [pool.submit(load_cv_template) for _ in range(args.concurrency)]:
+            future.result()
+
+        def render(job):
+            index, images = job
+            output_path = os.path.join(workdir, f"cv_{index}.pdf")
+            created = pool.submit(
+                create_cv_pdf, output_path, data, TEMPLATE_PATH, images['face'], images['full_body'], images['passport']
+            ).result()
+            return os.path.getsize(output_path) if created else None
+
+        results = {}
+        jobs = {
+            'cold': list(enumerate(candidates)),
+            'warm': [(len(candidates) + i, candidates[i % len(candidates)]) for i in range(args.requests)],
+        }
+        for name, mode_jobs in jobs.items():
+            sizes, latencies, wall_seconds = run_concurrently(render, mode_jobs, args.concurrency)
+            results[name] = {
+                **load_summary(latencies, wall_seconds),
+                'success_rate': round(sum(size is not None for size in sizes) / len(sizes), 3),
+                'pdf_size': size_summary(sizes),
+            }
+    finally:
+        pool.shutdown()
+    return results
+
+
+def scenario_generate(args, workdir):
+    server = MockProviderServer(
+        latency=args.provider_latency, failure_rate=args.provider_failure_rate, seed=0
+    ).start()
+    os.environ.update({
+        'GEMINI_API_KEY_1': 'key-1', 'GEMINI_API_KEY_2': 'key-2', 'OPENROUTER_API_KEY': 'key-or',
+        'GEMINI_API_BASE': server.base_url, 'OPENROUTER_API_URL': server.openrouter_url,
+    })
+    try:
+        cv_app = importlib.import_module('app')
+        upload_folder = os.path.join(workdir, 'uploads')
+        os.makedirs(upload_folder)
+        cv_app.app.config['UPLOAD_FOLDER'] = upload_folder
+        cv_app.pdf_storage.folder = upload_folder
+
+        candidates = []
+        for i in range(args.candidates):
+            folder = os.path.join(workdir, f"candidate_{i}")
+            os.makedirs(folder)
+            candidates.append(make_sample_images(folder, seed=i))
+        # What the stored candidate should hold, given the mock's extraction
+        expected = {
+            field: value for field, value in server.extraction.items() if field not in ('mrzLine2', 'placeOfIssue')
+        }
+        expected['livingTown'] = expected['pob']
+
+        def generate(index):
+            client = cv_app.app.test_client()
+            images = candidates[index % len(candidates)]
+            files = {role: open(path, 'rb') for role, path in images.items()}
+            try:
+                response = client.post('/generate', data={
+                    # Unique names, as uploads are saved under their own filename
+                    **{role: (f, f"{role}_{index}.jpg") for role, f in files.items()},
+                    'extractionMethod': 'ai', 'experiences': '[]',
+                })
+            finally:
+                for f in files.values():
+                    f.close()
+            if response.status_code != 202:
+                return None
+            while True:
+                job = client.get(response.json['statusUrl']).json
+                if job['status'] in ('done', 'failed'):
+                    break
+                time.sleep(args.poll_interval)
+            if job['status'] != 'done':
+                return None
+            pdf = client.get(job['downloadUrl'])
+            return {'size': len(pdf.data), 'cv_data': cv_app.candidate_store.get(job['candidateId'])['cv_data']}
+
+        generate(-1)  # compiles the template and opens the provider connections
+        outcomes, latencies, wall_seconds = run_concurrently(generate, range(args.requests), args.concurrency)
+        return {
+            **load_summary(latencies, wall_seconds),
+            'success_rate': round(sum(outcome is not None for outcome in outcomes) / len(outcomes), 3),
+            'pdf_size': size_summary([outcome['size'] for outcome in outcomes if outcome]),
+            'accuracy': field_accuracy((expected, outcome and outcome['cv_data']) for outcome in outcomes),
+            'provider_requests': server.requests,
+        }
+    finally:
+        server.stop()
+
+
+SCENARIOS = {'ocr': scenario_ocr, 'pdf': scenario_pdf, 'generate': scenario_generate}
+
+
+def run_scenario(name, args):
+    """Runs one scenario. Called in a fresh process, so the peak RSS it reports is its own."""
+    with tempfile.TemporaryDirectory() as workdir:
+        # Derivatives, image layers and databases start empty for every scenario
+        os.environ['DATA_FOLDER'] = os.path.join(workdir, 'data')
+        logging.getLogger().setLevel(logging.WARNING)
+        result = SCENARIOS[name](args, workdir)
+    result.update(peak_rss())
+    return result
+
+
+def git_commit():
+    """Returns (commit hash, whether the tree has uncommitted changes), or (None, None) outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+def flatten(value, prefix=()):
+    """Yields (key path, number) for every number in a nested result dict."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, prefix + (key,))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, report, threshold):
+    """Prints every metric next to its baseline value and returns how many got worse by more than `threshold`."""
+    old = dict(flatten(baseline['scenarios']))
+    print(f"\nCompared with {(baseline.get('commit') or 'unknown')[:12]} ({baseline.get('timestamp')})")
+    regressions = 0
+    for path, new_value in flatten(report['scenarios']):
+        if path not in old or path[-1] == 'requests':
+            continue
+        old_value = old[path]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        higher_is_better = bool(HIGHER_IS_BETTER & set(path))
+        worse = change < -threshold if higher_is_better else change > threshold
+        regressions += worse
+        print(f"{'.'.join(map(str, path)):<52} {old_value:>10} {new_value:>10} {change:+8.1%}{'  REGRESSION' if worse else ''}")
+    print(f"{regressions} metric(s) regressed by more than {threshold:.0%}")
+    return regressions
+
+
+def print_summary(name, result, prefix=''):
+    if 'skipped' in result:
+        print(f"{name:>16}: skipped, {result['skipped']}")
+        return
+    if 'latency_ms' in result:
+        latency = result['latency_ms']
+        accuracy = result.get('accuracy')
+        accuracy = accuracy['overall'] if isinstance(accuracy, dict) else accuracy
+        print(f"{prefix + name:>16}: {result['requests']:>4} req {result['throughput_per_s']:7.2f}/s  "
+              f"p50 {latency['p50']:8.1f}ms p95 {latency['p95']:8.1f}ms p99 {latency['p99']:8.1f}ms"
+              + (f"  accuracy {accuracy:.1%}" if accuracy is not None else '')
+              + (f"  PDF {result['pdf_size']['mean_kb']:.0f} KB" if result.get('pdf_size') else ''))
+    for key, value in result.items():
+        if isinstance(value, dict) and key not in ('latency_ms', 'accuracy', 'pdf_size', 'by_scan'):
+            print_summary(key, value, prefix=f"{name}/")
+    if 'peak_rss_mb' in result:
+        print(f"{name:>16}: peak RSS {result['peak_rss_mb']:.0f} MB, child processes {result['peak_child_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20, help="renders or /generate requests per run")
+    parser.add_argument('--candidates', type=int, default=4, help="distinct sets of photos")
+    parser.add_argument('--passports', type=int, default=2, help="synthetic passports per resolution and rotation")
+    parser.add_argument('--provider-latency', type=float, default=0.5)
+    parser.add_argument('--provider-failure-rate', type=float, default=0.1)
+    parser.add_argument('--poll-interval', type=float, default=0.02)
+    parser.add_argument('--output', help="JSON file to write; defaults to bench/results/<time>-<commit>.json")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change reported as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    commit, dirty = git_commit()
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ('scenarios', 'output', 'baseline', 'threshold', 'fail_on_regression')}
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': settings,
+        'scenarios': {},
+    }
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            report['scenarios'][name] = executor.submit(run_scenario, name, args).result()
+        print_summary(name, report['scenarios'][name])
+
+    output = args.output or os.path.join(
+        REPO_ROOT, 'bench', 'results', f"{datetime.now():%Y%m%d-%H%M%S}-{(commit or 'nogit')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
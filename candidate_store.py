@@ -0,0 +1,144 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+CANDIDATE_FIELDS = ['id', 'passport_no', 'full_name', 'cv_data', 'pdf_path', 'created_at', 'updated_at']
+# Listings leave out the cv_data blob
+SUMMARY_FIELDS = ['id', 'passport_no', 'full_name', 'pdf_path', 'created_at', 'updated_at']
+
+
+class CandidateStore:
+    """
+    Keeps every generated candidate (the finalized cv_data, including the image paths,
+    and the path of the latest PDF) in a SQLite database, so the session only has to
+    carry a candidate id and past candidates can be reopened without re-extraction.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS candidates (
+                    id TEXT PRIMARY KEY,
+                    passport_no TEXT,
+                    full_name TEXT,
+                    cv_data TEXT NOT NULL,
+                    pdf_path TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            # A search also matches anywhere in the name, so it walks the updated_at index
+            # instead; a passport_no index would only slow down writes
+            conn.execute('DROP INDEX IF EXISTS idx_candidates_passport_no')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_candidates_updated_at ON candidates (updated_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_candidates_created_at ON candidates (created_at, id)')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _row_to_candidate(row):
+        candidate = dict(zip(CANDIDATE_FIELDS, row))
+        candidate['cv_data'] = json.loads(candidate['cv_data'])
+        return candidate
+
+    def create(self, cv_data, pdf_path):
+        """Stores a new candidate and returns its id."""
+        candidate_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO candidates ({', '.join(CANDIDATE_FIELDS)}) VALUES ({', '.join('?' for _ in CANDIDATE_FIELDS)})",
+                (candidate_id, cv_data.get('passportNo', ''), cv_data.get('fullName', ''),
+                 json.dumps(cv_data), pdf_path, now, now)
+            )
+        return candidate_id
+
+    def update(self, candidate_id, cv_data, pdf_path):
+        """Replaces a candidate's cv_data and PDF path after a regeneration."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE candidates SET passport_no = ?, full_name = ?, cv_data = ?, pdf_path = ?, updated_at = ? WHERE id = ?",
+                (cv_data.get('passportNo', ''), cv_data.get('fullName', ''), json.dumps(cv_data),
+                 pdf_path, time.time(), candidate_id)
+            )
+
+    def set_pdf_path(self, candidate_id, pdf_path, updated_at):
+        """
+        Points a candidate at a re-rendered PDF; its data and updated_at are left alone.
+        Only a candidate still at `updated_at`, the version the PDF was rendered from,
+        is changed. Returns False if the candidate was regenerated since.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE candidates SET pdf_path = ? WHERE id = ? AND updated_at = ?",
+                (pdf_path, candidate_id, updated_at)
+            )
+        return cursor.rowcount > 0
+
+    def get(self, candidate_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(CANDIDATE_FIELDS)} FROM candidates WHERE id = ?", (candidate_id,)
+            ).fetchone()
+        return self._row_to_candidate(row) if row else None
+
+    def list(self, query=None, limit=50, offset=0):
+        """
+        Returns candidate summaries (without cv_data), most recently updated first. A
+        `query` matches the start of the passport number or any part of the full name.
+        """
+        sql = f"SELECT {', '.join(SUMMARY_FIELDS)} FROM candidates"
+        params = []
+        if query:
+            query = query.strip()
+            sql += " WHERE passport_no LIKE ? ESCAPE '\\' OR full_name LIKE ? ESCAPE '\\'"
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params += [f"{escaped}%", f"%{escaped}%"]
+        sql += " ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(zip(SUMMARY_FIELDS, row)) for row in rows]
+
+    def iter_all(self, after=None, batch_size=500):
+        """
+        Yields every candidate in creation order, reading `batch_size` rows at a time.
+        With `after`, a (created_at, id) pair, starts after that candidate, so a long
+        pass over the store can be resumed.
+        """
+        after = tuple(after) if after else (-1.0, '')
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT {', '.join(CANDIDATE_FIELDS)} FROM candidates "
+                    "WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+                    (*after, batch_size)
+                ).fetchall()
+            for row in rows:
+                candidate = self._row_to_candidate(row)
+                yield candidate
+                after = (candidate['created_at'], candidate['id'])
+            if len(rows) < batch_size:
+                return
+
+    def referenced_paths(self):
+        """Returns every PDF and image path a stored candidate refers to."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT pdf_path, json_extract(cv_data, '$.face_image_path'), "
+                "json_extract(cv_data, '$.full_body_image_path'), json_extract(cv_data, '$.passport_image_path') "
+                "FROM candidates"
+            ).fetchall()
+        return {path for row in rows for path in row if path}
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
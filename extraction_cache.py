@@ -0,0 +1,202 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# EXTRACTION_CACHE=off disables the cache; TTL is in seconds
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE", "on").lower() not in ("off", "0", "false")
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH", os.path.join(os.getenv("DATA_FOLDER", "data"), "extraction_cache.sqlite3")
+)
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", str(30 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Hashes of the most recently used files, by (path, size, mtime); a few hundred bytes each
+CONTENT_HASH_MEMO_ENTRIES = 4096
+
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+def _hash_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _remember(key, file_hash):
+    with _hashes_lock:
+        _hashes[key] = file_hash
+        _hashes.move_to_end(key)
+        while len(_hashes) > CONTENT_HASH_MEMO_ENTRIES:
+            _hashes.popitem(last=False)
+
+
+def content_hash(path):
+    """
+    Hashes a file once per (path, size, mtime) so repeated lookups skip the read. The
+    CONTENT_HASH_MEMO_ENTRIES most recently used hashes are kept.
+    """
+    key = _hash_key(path)
+    with _hashes_lock:
+        file_hash = _hashes.get(key)
+        if file_hash is not None:
+            _hashes.move_to_end(key)
+            return file_hash
+    file_hash = hash_file(path)
+    _remember(key, file_hash)
+    return file_hash
+
+
+def remember_content_hash(path, file_hash):
+    """Records the hash of a file whose bytes were hashed as it was written, so content_hash does not read it."""
+    _remember(_hash_key(path), file_hash)
+
+
+class ExtractionCache:
+    """
+    Persistent cache of passport extraction results, keyed by the SHA-256 of the image
+    bytes and the extraction method, so re-uploading the same scan skips the extraction.
+
+    Entries older than `ttl` seconds are ignored and purged, and once the cache holds
+    more than `max_entries` the least recently used entries are evicted. Hit and miss
+    counters are kept per method for the lifetime of the process.
+    """
+
+    def __init__(self, db_path, ttl=EXTRACTION_CACHE_TTL, max_entries=EXTRACTION_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS extractions (
+                    image_hash TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (image_hash, method)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions (last_used)')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, image_hash, method):
+        """Returns the cached extraction result, or None on a miss."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT result FROM extractions WHERE image_hash = ? AND method = ? AND created_at > ?',
+                (image_hash, method, now - self.ttl)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    'UPDATE extractions SET last_used = ? WHERE image_hash = ? AND method = ?',
+                    (now, image_hash, method)
+                )
+        with self._lock:
+            (self.hits if row else self.misses)[method] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, image_hash, method, result):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO extractions (image_hash, method, result, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (image_hash, method, json.dumps(result), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM extractions WHERE created_at <= ?', (now - self.ttl,))
+        conn.execute('''
+            DELETE FROM extractions WHERE rowid IN (
+                SELECT rowid FROM extractions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def stats(self):
+        with self._connect() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM extractions').fetchone()[0]
+        with self._lock:
+            methods = sorted(set(self.hits) | set(self.misses))
+            per_method = {method: {"hits": self.hits[method], "misses": self.misses[method]} for method in methods}
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hitRate": hits / (hits + misses) if hits + misses else 0.0,
+            "methods": per_method,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Returns the process-wide ExtractionCache, or None if the cache is disabled."""
+    global _cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache(EXTRACTION_CACHE_PATH)
+    return _cache
+
+
+def cached_extraction(method):
+    """
+    Decorates an extraction function taking an image path so that results are looked up
+    in, and successful results stored to, the extraction cache under `method`.
+    """
+    def decorator(extract):
+        @functools.wraps(extract)
+        def wrapper(image_path, *args, **kwargs):
+            cache = get_extraction_cache()
+            if cache is None:
+                return extract(image_path, *args, **kwargs)
+            try:
+                image_hash = content_hash(image_path)
+                cached = cache.get(image_hash, method)
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Extraction cache lookup failed for {image_path}: {e}")
+                return extract(image_path, *args, **kwargs)
+            if cached is not None:
+                logging.info(f"Extraction cache hit for {method} ({image_hash[:12]})")
+                return cached
+
+            result = extract(image_path, *args, **kwargs)
+            if result:
+                try:
+                    cache.put(image_hash, method, result)
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not store {method} extraction in the cache: {e}")
+            return result
+        return wrapper
+    return decorator
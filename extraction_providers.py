@@ -0,0 +1,474 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+
+from image_context import shared
+from image_pipeline import ai_image
+from metrics import REGISTRY, record_span
+from provider_client import get_provider_session
+
+# Rolling metrics cover a provider's last PROVIDER_METRICS_WINDOW calls, and only those
+# from the last PROVIDER_METRICS_MAX_AGE seconds, so routing follows recent behaviour
+PROVIDER_METRICS_WINDOW = int(os.getenv("PROVIDER_METRICS_WINDOW", "50"))
+PROVIDER_METRICS_MAX_AGE = float(os.getenv("PROVIDER_METRICS_MAX_AGE", "900"))
+# A provider's circuit opens after this many consecutive failures, for CIRCUIT_OPEN_SECONDS
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "60"))
+# A rejected or out-of-quota API key opens the circuit at once, for longer; so do
+# CIRCUIT_FAILURE_THRESHOLD consecutive calls still rate-limited after their retries
+CIRCUIT_QUOTA_OPEN_SECONDS = float(os.getenv("CIRCUIT_QUOTA_OPEN_SECONDS", "600"))
+QUOTA_STATUSES = (401, 403)
+RATE_LIMIT_STATUS = 429
+# A 429 whose error message says this is out of quota rather than rate-limited
+QUOTA_MESSAGE = re.compile(r'quota', re.IGNORECASE)
+
+# Call outcomes recorded in the metrics
+OK = 'ok'                    # a result that passed validation
+INVALID = 'invalid'          # a JSON object that failed validation
+PARSE_ERROR = 'parse_error'  # an answer that was not a JSON object
+ERROR = 'error'              # an HTTP error, timeout or quota rejection
+SKIPPED = 'skipped'          # not called because the circuit was open
+
+# A provider that never succeeded still ranks by its latency, as if it succeeded this often
+MIN_ROUTING_SUCCESS_RATE = 0.05
+
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    'cv_extraction_seconds', 'Time spent in each extraction provider call, by outcome.', ['provider', 'outcome']
+)
+
+PASSPORT_EXTRACTION_PROMPT = '''You are an expert passport data extraction agent. I have provided you with an image of a passport.
+Your task is to accurately extract the required information and return it as a single, valid JSON object.
+
+For names, pay close attention to the Machine-Readable Zone (MRZ) format:
+  - The MRZ for Ethiopian passports is structured as SURNAME<<FIRSTNAME<FATHERNAME.
+  - The SURNAME is the grandfather's name.
+  - The FIRSTNAME is the person's first name.
+  - The FATHERNAME is the father's name.
+  - Example: If the MRZ is "ETHDOE<<JOHN<DOE", then:
+    - grandfatherName: "DOE"
+    - firstName: "JOHN"
+    - fatherName: "DOE"
+  - Extract the FIRST NAME, FATHER'S NAME, and GRANDFATHER'S NAME based on this structure.
+  - If any of these name components are not explicitly found in the MRZ, set their value to 'NOT_FOUND'.
+
+Prioritize the Machine-Readable Zone (MRZ) for the highest accuracy for fields like passport number, nationality, date of birth, sex, and expiry date.
+For fields not in the MRZ, like 'Place of Birth', 'Place of Issue' and 'Date of Issue', use the visually printed text.
+If the 'Place of Birth' is not explicitly found, set the value to 'NOT_FOUND'.
+The JSON object should have the following keys:
+firstName
+fatherName
+grandfatherName
+passportNo
+nationality
+dob (format as DD MMM YY, e.g., 23 OCT 91)
+sex (e.g., F or M)
+pob (Place of Birth)
+placeOfIssue
+dateOfIssue (format as DD MMM YY, e.g., 06 MAY 25)
+dateOfExpiry (format as DD MMM YY, e.g., 05 MAY 30)
+mrzLine2 (the second line of the MRZ exactly as printed: 44 characters, including every '<' filler)
+Respond ONLY with the single, valid JSON object.'''
+
+
+class ProviderError(Exception):
+    """Raised by a provider whose call failed."""
+
+
+class QuotaExceeded(ProviderError):
+    """Raised when a provider rejects the API key or its quota is used up."""
+
+
+class RateLimited(ProviderError):
+    """Raised when a provider still answers 429 (too many requests) after the retries."""
+
+
+class ResponseParseError(ProviderError):
+    """Raised when a provider answers with something other than a JSON object."""
+
+
+def parse_json_response(content_string):
+    """Parses the JSON object in a model response, stripping a ``` or ```json fence if present."""
+    content_string = content_string.strip()
+    if content_string.startswith("```"):
+        content_string = content_string[3:].removeprefix("json")
+        content_string = content_string.strip().removesuffix("```")
+    try:
+        extracted_data = json.loads(content_string)
+    except json.JSONDecodeError as e:
+        raise ResponseParseError(f"Response is not valid JSON: {e}") from e
+    if not isinstance(extracted_data, dict):
+        raise ResponseParseError("Response is not a JSON object.")
+    return extracted_data
+
+
+def _encode_ai_image(image_path):
+    with open(ai_image(image_path), "rb") as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def encoded_ai_image(image_path):
+    """
+    Returns the base64 of the size-bounded passport image sent to the AI providers,
+    encoded once per request inside an image context however many providers send it.
+    """
+    return shared(image_path, 'ai_base64', _encode_ai_image)
+
+
+def post_json(url, headers, body, timeout):
+    """
+    POSTs a JSON request on the pooled provider session and returns the decoded JSON
+    answer, raising QuotaExceeded, RateLimited, ProviderError or ResponseParseError on
+    failure.
+    """
+    try:
+        response = get_provider_session().post(url=url, headers=headers, json=body, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        raise ProviderError(str(e)) from e
+    if response.status_code in QUOTA_STATUSES:
+        raise QuotaExceeded(f"HTTP {response.status_code}: {response.text[:200]}")
+    if response.status_code == RATE_LIMIT_STATUS:
+        if QUOTA_MESSAGE.search(response.text):
+            raise QuotaExceeded(f"HTTP {response.status_code}: {response.text[:200]}")
+        raise RateLimited(f"HTTP {response.status_code}: {response.text[:200]}")
+    if not response.ok:
+        raise ProviderError(f"HTTP {response.status_code}: {response.text[:200]}")
+    try:
+        answer = response.json()
+    except ValueError as e:
+        raise ResponseParseError(f"Response body is not JSON: {e}") from e
+    # Only serialise the (large) response when it is actually going to be logged
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Full response from %s: %s", url, json.dumps(answer, indent=2))
+    return answer
+
+
+class ExtractionProvider:
+    """
+    One way of extracting passport data from an image. `extract` returns the extracted
+    fields as a dict and raises ProviderError (or any other exception) on failure.
+    """
+
+    name = None
+
+    def available(self):
+        """False if the provider is not configured, e.g. its API key is not set."""
+        return True
+
+    def extract(self, image_path):
+        raise NotImplementedError
+
+
+class GeminiProvider(ExtractionProvider):
+    """Calls the Gemini generateContent REST endpoint with one API key."""
+
+    def __init__(self, name, api_key, api_base, model, timeout):
+        self.name = name
+        self.api_key = api_key
+        self.api_base = api_base
+        self.model = model
+        self.timeout = timeout
+
+    def available(self):
+        return bool(self.api_key)
+
+    def extract(self, image_path):
+        answer = post_json(
+            f"{self.api_base}/v1beta/models/{self.model}:generateContent",
+            headers={"x-goog-api-key": self.api_key, "Content-Type": "application/json"},
+            body={
+                "contents": [{
+                    "parts": [
+                        {"text": PASSPORT_EXTRACTION_PROMPT},
+                        {"inline_data": {"mime_type": "image/jpeg", "data": encoded_ai_image(image_path)}}
+                    ]
+                }]
+            },
+            timeout=self.timeout
+        )
+        try:
+            parts = answer['candidates'][0]['content']['parts']
+        except (KeyError, IndexError, TypeError) as e:
+            raise ResponseParseError(f"Unexpected Gemini response: {e!r}") from e
+        return parse_json_response("".join(part.get('text', '') for part in parts))
+
+
+class OpenRouterProvider(ExtractionProvider):
+    """Calls the OpenRouter chat completions endpoint."""
+
+    name = 'openrouter'
+
+    def __init__(self, api_key, api_url, model, timeout):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.timeout = timeout
+
+    def available(self):
+        return bool(self.api_key)
+
+    def extract(self, image_path):
+        answer = post_json(
+            self.api_url,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "http://localhost:5000",
+                "X-Title": "CV Generator"
+            },
+            body={
+                "model": self.model,
+                "messages": [{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": PASSPORT_EXTRACTION_PROMPT},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded_ai_image(image_path)}"}}
+                    ]
+                }]
+            },
+            timeout=self.timeout
+        )
+        try:
+            content_string = answer['choices'][0]['message']['content'] or ''
+        except (KeyError, IndexError, TypeError) as e:
+            raise ResponseParseError(f"Unexpected OpenRouter response: {e!r}") from e
+        if not content_string.strip():
+            raise ResponseParseError("OpenRouter response content is empty.")
+        return parse_json_response(content_string)
+
+
+class LocalProvider(ExtractionProvider):
+    """Runs an in-process extraction function, such as local OCR, that returns a dict or None."""
+
+    def __init__(self, name, extract_function):
+        self.name = name
+        self._extract = extract_function
+
+    def extract(self, image_path):
+        extracted_data = self._extract(image_path)
+        if not extracted_data:
+            raise ProviderError("No data extracted.")
+        return extracted_data
+
+
+class ProviderMetrics:
+    """
+    Rolling latency and outcome record of a provider's recent calls, plus lifetime
+    counts per outcome.
+    """
+
+    def __init__(self, window=PROVIDER_METRICS_WINDOW, max_age=PROVIDER_METRICS_MAX_AGE):
+        self.max_age = max_age
+        self._calls = deque(maxlen=window)
+        self._totals = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, latency, outcome):
+        with self._lock:
+            self._totals[outcome] += 1
+            if outcome != SKIPPED:
+                self._calls.append((time.monotonic(), latency, outcome))
+
+    def snapshot(self):
+        """
+        Returns the recent call count, success, JSON-parse failure and error rates, the
+        p50/p95/p99 latency in seconds (None without recent calls) and the lifetime totals.
+        """
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._calls and self._calls[0][0] < cutoff:
+                self._calls.popleft()
+            calls = list(self._calls)
+            totals = dict(self._totals)
+        outcomes = Counter(outcome for _, _, outcome in calls)
+        latencies = sorted(latency for _, latency, _ in calls)
+        count = len(calls)
+
+        def percentile(q):
+            return latencies[min(count - 1, int(q * count))] if count else None
+
+        return {
+            'calls': count,
+            'success_rate': outcomes[OK] / count if count else None,
+            'parse_failure_rate': outcomes[PARSE_ERROR] / count if count else None,
+            'invalid_rate': outcomes[INVALID] / count if count else None,
+            'error_rate': outcomes[ERROR] / count if count else None,
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'totals': totals,
+        }
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing provider. After `failure_threshold` consecutive failures the
+    circuit opens for `open_seconds`. A quota rejection opens it at once for
+    `quota_open_seconds`, and so do `failure_threshold` consecutive rate-limited calls;
+    calls are skipped while it is open. Once that time has passed a
+    single trial call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, open_seconds=CIRCUIT_OPEN_SECONDS,
+                 quota_open_seconds=CIRCUIT_QUOTA_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.quota_open_seconds = quota_open_seconds
+        self._failures = 0
+        self._rate_limited = 0
+        self._open_until = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._open_until is None:
+                return 'closed'
+            return 'open' if time.monotonic() < self._open_until or self._trial_running else 'half_open'
+
+    def allow(self):
+        """True if a call may go ahead; claims the trial call of a half-open circuit."""
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if time.monotonic() < self._open_until or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._rate_limited = 0
+            self._open_until = None
+            self._trial_running = False
+
+    def record_failure(self, quota=False, rate_limited=False):
+        with self._lock:
+            self._failures += 1
+            self._rate_limited = self._rate_limited + 1 if rate_limited else 0
+            self._trial_running = False
+            if quota or self._rate_limited >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.quota_open_seconds
+            elif self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.open_seconds
+
+
+class ProviderRegistry:
+    """
+    The extraction providers by name, each with its rolling metrics and circuit breaker.
+    Every call made through the registry is timed and classified; a result counts as a
+    success only if it passes `validate`.
+    """
+
+    def __init__(self, validate):
+        self.validate = validate
+        self._providers = {}
+        self._metrics = {}
+        self._breakers = {}
+
+    def register(self, provider):
+        self._providers[provider.name] = provider
+        self._metrics[provider.name] = ProviderMetrics()
+        self._breakers[provider.name] = CircuitBreaker()
+
+    def get(self, name):
+        return self._providers.get(name)
+
+    def call(self, name, image_path):
+        """
+        Runs one provider on an image, unless it is not configured or its circuit is open.
+        Returns the extracted fields (valid or not), or None if the call failed or was skipped.
+        """
+        provider = self._providers[name]
+        if not provider.available():
+            return None
+        breaker = self._breakers[name]
+        if not breaker.allow():
+            logging.info(f"Provider {name} skipped: its circuit is open.")
+            self._metrics[name].record(0.0, SKIPPED)
+            EXTRACTION_SECONDS.observe(0.0, provider=name, outcome=SKIPPED)
+            return None
+
+        start = time.monotonic()
+        extracted_data = None
+        try:
+            extracted_data = provider.extract(image_path)
+            outcome = OK if self.validate(extracted_data) else INVALID
+            breaker.record_success()
+        except QuotaExceeded as e:
+            logging.error(f"Provider {name} rejected the request, pausing it: {e}")
+            outcome = ERROR
+            breaker.record_failure(quota=True)
+        except RateLimited as e:
+            logging.warning(f"Provider {name} is rate-limiting requests: {e}")
+            outcome = ERROR
+            breaker.record_failure(rate_limited=True)
+        except ResponseParseError as e:
+            logging.error(f"Provider {name} returned an unparseable response: {e}")
+            outcome = PARSE_ERROR
+            breaker.record_failure()
+        except Exception as e:
+            logging.error(f"Provider {name} failed: {e}")
+            outcome = ERROR
+            breaker.record_failure()
+        latency = time.monotonic() - start
+        self._metrics[name].record(latency, outcome)
+        EXTRACTION_SECONDS.observe(latency, provider=name, outcome=outcome)
+        record_span(f"extract_{name}", latency)
+        logging.info(f"Provider {name} finished in {latency:.2f}s: {outcome}")
+        return extracted_data
+
+    def extract_first(self, names, image_path, require_valid=False):
+        """
+        Calls the providers in order until one returns data. With `require_valid`, an
+        invalid result moves on to the next provider and is only returned if no provider
+        produces a valid one.
+        """
+        fallback = None
+        for name in names:
+            extracted_data = self.call(name, image_path)
+            if extracted_data is None:
+                continue
+            if not require_valid or self.validate(extracted_data):
+                return extracted_data
+            fallback = fallback or extracted_data
+        return fallback
+
+    def route(self, names):
+        """
+        Orders the configured providers among `names` by their expected time to a valid
+        result, recent p50 latency divided by recent success rate. Providers without
+        recent calls come first, in the given order, so they get measured; providers
+        with an open circuit come last.
+        """
+        ranked = []
+        for index, name in enumerate(names):
+            provider = self._providers.get(name)
+            if provider is None or not provider.available():
+                continue
+            snapshot = self._metrics[name].snapshot()
+            if snapshot['calls']:
+                cost = snapshot['p50'] / max(snapshot['success_rate'], MIN_ROUTING_SUCCESS_RATE)
+            else:
+                cost = 0.0
+            ranked.append((self._breakers[name].state == 'open', cost, index, name))
+        return [name for *_, name in sorted(ranked)]
+
+    def stats(self):
+        """Returns each provider's metrics snapshot, circuit state and whether it is configured."""
+        return {
+            name: {
+                'available': provider.available(),
+                'circuit': self._breakers[name].state,
+                **self._metrics[name].snapshot(),
+            }
+            for name, provider in self._providers.items()
+        }
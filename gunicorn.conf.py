@@ -0,0 +1,47 @@
+"""
+Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master process and warmed up (PDF and OCR modules, the
+compiled CV template and an OCR model) before the workers are forked, so the workers
+share that memory copy-on-write and start serving at once. Background jobs run in the
+worker that accepted them; with several workers JOB_STORE must be 'sqlite' so that any
+worker can report a job's status.
+"""
+import logging
+import os
+
+# Address to listen on
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Worker processes; OCR and PDF rendering are CPU-bound, so one per CPU
+cpus = os.cpu_count() or 1
+workers = int(os.getenv("WEB_WORKERS", str(cpus)))
+# Every worker starts its own render pool; together they get one process per CPU
+os.environ.setdefault("RENDER_WORKERS", str(max(1, cpus // workers)))
+# Threads per worker, so that job status polls and downloads are served while a
+# worker's other threads upload or regenerate
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "4"))
+# Seconds a request may take; generating CVs runs in background jobs, so no request
+# waits for an extraction
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+# Import and warm up the app in the master; 'off' lets a HUP reload changed code
+preload_app = os.getenv("PRELOAD_APP", "on") == "on"
+
+# The workers resume jobs and clean up storage themselves, see post_worker_init
+raw_env = ["BACKGROUND_TASKS=off"]
+
+
+def when_ready(server):
+    # Runs in the master once the app is preloaded, before any worker is forked
+    if server.cfg.preload_app:
+        import app
+        app.warm_up()
+    if server.cfg.workers > 1 and os.getenv("JOB_STORE") == "memory":
+        logging.warning("JOB_STORE=memory with several workers: a job's status is only known to the worker running it.")
+
+
+def post_worker_init(worker):
+    import app
+    # Only the first worker of this server start resumes the jobs a previous run left
+    # unfinished; every worker starts a storage cleaner, of which one runs at a time
+    app.start_background_tasks(resume_jobs=worker.age == 1)
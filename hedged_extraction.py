@@ -0,0 +1,108 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+
+from local_ocr.mrz import td3_line2_check_results
+
+
+def parse_hedged_providers(spec):
+    """
+    Parses a `name:delay,name:delay` provider spec into (name, delay seconds) pairs.
+    A provider without a delay starts immediately.
+    """
+    providers = []
+    for item in spec.split(','):
+        name, _, delay = item.strip().partition(':')
+        if name:
+            providers.append((name, float(delay) if delay else 0.0))
+    return providers
+
+
+def is_valid_extraction(extracted_data):
+    """
+    True if a provider returned a JSON object whose `mrzLine2` has valid ICAO 9303
+    check digits and whose passport number agrees with the MRZ.
+    """
+    if not isinstance(extracted_data, dict):
+        return False
+    mrz_line2 = str(extracted_data.get('mrzLine2') or '').replace(' ', '').upper()
+    checks = td3_line2_check_results(mrz_line2)
+    if not checks or not (checks['passportNo'] and checks['dob'] and checks['dateOfExpiry'] and checks['composite']):
+        return False
+    passport_no = str(extracted_data.get('passportNo') or '').replace(' ', '').upper()
+    return passport_no == mrz_line2[0:9].replace('<', '')
+
+
+def run_hedged(image_path, providers, validate, timeout):
+    """
+    Runs extraction providers concurrently and returns the first acceptable result.
+
+    Each provider is a (name, delay, extract) triple. A provider starts `delay` seconds
+    after the race begins, or as soon as every provider started before it has returned
+    an unacceptable result, so a fast failure does not leave the next provider idling.
+    Once a result passes `validate`, providers that have not started yet never start;
+    calls already in flight cannot be interrupted and their results are discarded.
+
+    Returns:
+        tuple: (provider name, extracted data), or (None, None) if no provider produced
+        an acceptable result within `timeout` seconds.
+    """
+    if not providers:
+        return None, None
+
+    results = queue.Queue()
+    finished = threading.Event()
+    start_signals = [threading.Event() for _ in providers]
+    started = [threading.Event() for _ in providers]
+    race_start = time.monotonic()
+
+    def attempt(index, name, delay, extract):
+        start_signals[index].wait(delay)
+        if finished.is_set():
+            return
+        started[index].set()
+        start_time = time.monotonic()
+        logging.info(f"Hedged provider {name} starting at +{start_time - race_start:.2f}s")
+        try:
+            extracted_data = extract(image_path)
+        except Exception as e:
+            logging.warning(f"Hedged provider {name} failed: {e}")
+            extracted_data = None
+        results.put((index, name, extracted_data, time.monotonic() - start_time))
+
+    for index, (name, delay, extract) in enumerate(providers):
+        # Run in a copy of the caller's context so the providers' timings join its spans
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(attempt, index, name, delay, extract),
+            name=f"hedged-{name}", daemon=True
+        ).start()
+
+    deadline = race_start + timeout
+    rejected = set()
+    try:
+        while len(rejected) < len(providers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                index, name, extracted_data, elapsed = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if validate(extracted_data):
+                logging.info(f"Hedged provider {name} returned a valid result in {elapsed:.2f}s")
+                return name, extracted_data
+            logging.warning(f"Hedged provider {name} returned an invalid result after {elapsed:.2f}s")
+            rejected.add(index)
+            # Start the next waiting provider now instead of after its delay
+            for next_index, signal in enumerate(start_signals):
+                if not started[next_index].is_set() and not signal.is_set():
+                    signal.set()
+                    break
+        logging.error(f"No hedged provider succeeded within {timeout}s")
+        return None, None
+    finally:
+        finished.set()
+        for signal in start_signals:
+            signal.set()
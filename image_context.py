@@ -0,0 +1,69 @@
+"""
+Per-request sharing of what is decoded or derived from the uploaded images.
+
+A request reads its passport several times: the OCR modes decode the page (and the fast
+modes fall back to the full pass on the same page), the hedged and auto modes run
+several providers on it, and rendering reads every image's header. Inside an
+`image_context()` block each of these is computed once per image and handed to every
+later caller, including threads started in a copy of the context, such as the hedged
+providers. Outside one, every call computes its value as before.
+"""
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
+# The ImageContext `image_context` opened in the current context, if any
+_current = contextvars.ContextVar('image_context', default=None)
+
+
+class ImageContext:
+    """
+    Values computed from images, by (image path, kind). Concurrent callers asking for
+    the same value wait for the first one to compute it instead of computing it again.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.reused = 0
+
+    def get(self, image_path, kind, compute):
+        key = (os.path.abspath(image_path), kind)
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    self.reused += 1
+                    return self._values[key]
+            value = compute(image_path)
+            with self._lock:
+                self._values[key] = value
+                self.computed += 1
+        return value
+
+
+@contextmanager
+def image_context():
+    """Shares the values computed from images inside the `with` block; yields the ImageContext."""
+    context = ImageContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def shared(image_path, kind, compute):
+    """
+    Returns `compute(image_path)`, computed once per image and `kind` in the current
+    image context, or on every call outside one. Shared values are handed to every
+    caller, so they must not be modified.
+    """
+    context = _current.get()
+    if context is None:
+        return compute(image_path)
+    return context.get(image_path, kind, compute)
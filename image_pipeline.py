@@ -0,0 +1,170 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from extraction_cache import content_hash
+from image_context import shared
+from storage import touch
+
+# Derivatives are rebuilt on demand, so they live with the other server-side data
+DERIVATIVE_FOLDER = os.getenv(
+    "DERIVATIVE_FOLDER", os.path.join(os.getenv("DATA_FOLDER", "data"), "derivatives")
+)
+# Rendered CV image layers (the template with the candidate's photos, before any text) are
+# cached here so regenerating a CV after a text edit does not re-embed the images
+IMAGE_LAYER_FOLDER = os.getenv(
+    "IMAGE_LAYER_FOLDER", os.path.join(os.getenv("DATA_FOLDER", "data"), "image_layers")
+)
+# Long side of the passport image sent to the AI providers; keeps the MRZ legible
+AI_IMAGE_MAX_SIDE = int(os.getenv("AI_IMAGE_MAX_SIDE", "2000"))
+# Resolution of the images embedded in the CV, relative to their slot on the page
+PDF_IMAGE_DPI = int(os.getenv("PDF_IMAGE_DPI", "200"))
+DERIVATIVE_JPEG_QUALITY = int(os.getenv("DERIVATIVE_JPEG_QUALITY", "85"))
+# The derivatives embedded in CVs are also kept in memory, parsed and ready to be written
+# into a PDF as they are, up to this many bytes; 0 turns the cache off
+PDF_IMAGE_CACHE_BYTES = int(os.getenv("PDF_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION_TAG = 0x0112
+
+# PDF colour spaces of the JPEG modes that are embedded as they are
+_PDF_COLORSPACES = {'RGB': 'DeviceRGB', 'L': 'DeviceGray'}
+
+_pdf_images = OrderedDict()
+_pdf_images_bytes = 0
+_pdf_images_lock = threading.Lock()
+
+
+def _read_oriented_size(image_path):
+    with Image.open(image_path) as img:
+        width, height = img.size
+        if img.getexif().get(_EXIF_ORIENTATION_TAG) in _TRANSPOSED_ORIENTATIONS:
+            return height, width
+    return width, height
+
+
+def oriented_size(image_path):
+    """
+    Returns an image's (width, height) as displayed, i.e. after its EXIF orientation is
+    applied. Only the image header is read, once per request inside an image context.
+    """
+    return shared(image_path, 'oriented_size', _read_oriented_size)
+
+
+def _render_derivative(image_path, max_size, quality):
+    """Decodes, orients, downsizes (never upsizes) and re-encodes an image as JPEG bytes."""
+    with Image.open(image_path) as img:
+        # Let the JPEG decoder downscale by a power of two while decoding; the request is
+        # square because the image may still be rotated by its EXIF orientation
+        draft_side = max(max_size) * 2
+        img.draft('RGB', (draft_side, draft_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail(max_size, Image.BICUBIC)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _derivative_name(image_path, max_size, quality):
+    return f"{content_hash(image_path)}_{max_size[0]}x{max_size[1]}_q{quality}.jpg"
+
+
+def get_derivative(image_path, max_size, quality=DERIVATIVE_JPEG_QUALITY):
+    """
+    Returns the path of a JPEG derivative of `image_path` that fits within `max_size`
+    (width, height) pixels, with EXIF orientation applied. Derivatives are cached on disk
+    by the upload's content hash and the requested size, so every upload is decoded and
+    re-encoded at most once per size.
+    """
+    max_size = (max(1, int(max_size[0])), max(1, int(max_size[1])))
+    derivative_path = os.path.join(DERIVATIVE_FOLDER, _derivative_name(image_path, max_size, quality))
+    if os.path.exists(derivative_path):
+        # The storage cleanup evicts the derivatives that have not been used for longest
+        touch(derivative_path)
+        return derivative_path
+
+    os.makedirs(DERIVATIVE_FOLDER, exist_ok=True)
+    jpeg_bytes = _render_derivative(image_path, max_size, quality)
+    # Write to a temporary file first so concurrent readers never see a partial image
+    fd, temp_path = tempfile.mkstemp(dir=DERIVATIVE_FOLDER, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(jpeg_bytes)
+    os.replace(temp_path, derivative_path)
+    logging.info(f"Created {max_size[0]}x{max_size[1]} derivative of {image_path} ({len(jpeg_bytes)} bytes)")
+    return derivative_path
+
+
+def ai_image(image_path):
+    """Returns the path of the size-bounded passport image sent to the AI providers."""
+    return get_derivative(image_path, (AI_IMAGE_MAX_SIDE, AI_IMAGE_MAX_SIDE))
+
+
+def load_pdf_image(jpeg_path):
+    """
+    Reads a JPEG for embedding in a PDF as it is, without decoding or re-encoding it.
+
+    Returns:
+        dict: the JPEG bytes and its pixel `width`, `height` and PDF `colorspace`, which
+        is None for JPEGs that cannot be embedded as they are (e.g. CMYK)
+    """
+    with open(jpeg_path, 'rb') as f:
+        jpeg_bytes = f.read()
+    # Only the header is parsed
+    with Image.open(io.BytesIO(jpeg_bytes)) as img:
+        width, height = img.size
+        colorspace = _PDF_COLORSPACES.get(img.mode) if img.format == 'JPEG' else None
+    return {"jpeg": jpeg_bytes, "width": width, "height": height, "colorspace": colorspace}
+
+
+def pdf_image(image_path, slot_rect):
+    """
+    Returns (image, displayed size of the original) for embedding an image in a PDF slot.
+    The image, see load_pdf_image, is a derivative with just enough pixels for the slot
+    at PDF_IMAGE_DPI; the original's size keeps the slot placement identical to
+    embedding the original.
+
+    Images are kept in memory by the upload's content hash and the derivative size, so
+    embedding the same photo again (another CV with it, another template) reads
+    nothing from disk.
+    """
+    max_size = (slot_rect.width / 72 * PDF_IMAGE_DPI, slot_rect.height / 72 * PDF_IMAGE_DPI)
+    max_size = (max(1, int(max_size[0])), max(1, int(max_size[1])))
+    key = _derivative_name(image_path, max_size, DERIVATIVE_JPEG_QUALITY)
+    with _pdf_images_lock:
+        cached = _pdf_images.get(key)
+        if cached is not None:
+            _pdf_images.move_to_end(key)
+            return cached
+
+    image = load_pdf_image(get_derivative(image_path, max_size))
+    cached = (image, oriented_size(image_path))
+    _cache_pdf_image(key, cached)
+    return cached
+
+
+def _cache_pdf_image(key, cached):
+    global _pdf_images_bytes
+    size = len(cached[0]["jpeg"])
+    if size > PDF_IMAGE_CACHE_BYTES:
+        return
+    with _pdf_images_lock:
+        if key in _pdf_images:
+            return
+        _pdf_images[key] = cached
+        _pdf_images_bytes += size
+        while _pdf_images_bytes > PDF_IMAGE_CACHE_BYTES:
+            _, (evicted, _) = _pdf_images.popitem(last=False)
+            _pdf_images_bytes -= len(evicted["jpeg"])
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATUSES = {DONE, FAILED}
+
+UNEXPECTED_ERROR_MESSAGE = "An unexpected server error occurred. Please try again later."
+
+JOB_FIELDS = ['id', 'kind', 'status', 'stage', 'progress', 'payload', 'result', 'error', 'created_at', 'updated_at']
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail the job with a message that is safe to show users."""
+
+
+class JobStore:
+    """
+    Persistence for job records. Subclasses store each job as a dict with the keys in
+    JOB_FIELDS; `payload` and `result` are JSON-serialisable values.
+    """
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def unfinished(self):
+        """Returns the jobs that were queued or running, oldest first."""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Keeps jobs in a dict; jobs are lost when the process exits."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def unfinished(self):
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if job['status'] not in FINISHED_STATUSES]
+        return sorted(jobs, key=lambda job: job['created_at'])
+
+
+class SQLiteJobStore(JobStore):
+    """Keeps jobs in a SQLite database so queued work survives a restart."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(zip(JOB_FIELDS, row))
+        job['payload'] = json.loads(job['payload']) if job['payload'] else None
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def create(self, job):
+        row = dict(job, payload=json.dumps(job.get('payload')), result=json.dumps(job.get('result')))
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                [row.get(field) for field in JOB_FIELDS]
+            )
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        for key in ('payload', 'result'):
+            if key in fields:
+                fields[key] = json.dumps(fields[key])
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def unfinished(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+
+class JobQueue:
+    """
+    Runs jobs on an in-process thread pool and records their progress in a JobStore.
+
+    Job handlers are registered per kind and called as `handler(payload, report)`, where
+    `report(stage, progress)` updates the job's stage name and 0-100 progress. Whatever
+    the handler returns becomes the job result; an exception marks the job failed, with
+    the message of a JobFailed and a generic message for anything else.
+    """
+
+    def __init__(self, store, workers=4):
+        self.store = store
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        """Queues a job and returns its id immediately."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'.")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.store.create({
+            'id': job_id, 'kind': kind, 'status': QUEUED, 'stage': 'queued', 'progress': 0,
+            'payload': payload, 'result': None, 'error': None, 'created_at': now, 'updated_at': now,
+        })
+        self._executor.submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def resume(self):
+        """Re-queues jobs a previous process left queued or running. Returns their number."""
+        jobs = [job for job in self.store.unfinished() if job['kind'] in self._handlers]
+        for job in jobs:
+            self.store.update(job['id'], status=QUEUED, stage='queued', progress=0)
+            self._executor.submit(self._run, job['id'], job['kind'], job['payload'])
+        return len(jobs)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _run(self, job_id, kind, payload):
+        def report(stage, progress):
+            self.store.update(job_id, stage=stage, progress=int(progress))
+
+        self.store.update(job_id, status=RUNNING, stage='started', progress=0)
+        try:
+            result = self._handlers[kind](payload, report)
+        except JobFailed as e:
+            logging.warning(f"Job {job_id} ({kind}) failed: {e}")
+            self.store.update(job_id, status=FAILED, stage='failed', error=str(e))
+            return
+        except Exception as e:
+            logging.error(f"Job {job_id} ({kind}) failed: {e}", exc_info=True)
+            self.store.update(job_id, status=FAILED, stage='failed', error=UNEXPECTED_ERROR_MESSAGE)
+            return
+        self.store.update(job_id, status=DONE, stage='done', progress=100, result=result)
@@ -0,0 +1,106 @@
+import re
+
+# ICAO 9303 check digit weights, repeated over the field
+CHECK_DIGIT_WEIGHTS = (7, 3, 1)
+TD3_LINE_LENGTH = 44
+# Fields of the second TD3 line that have their own check digit: (start, end, check digit position)
+TD3_LINE2_CHECKED_FIELDS = {
+    "passportNo": (0, 9, 9),
+    "dob": (13, 19, 19),
+    "dateOfExpiry": (21, 27, 27),
+    "personalNumber": (28, 42, 42),
+}
+
+
+def _char_value(char):
+    if char.isdigit():
+        return int(char)
+    if 'A' <= char <= 'Z':
+        return ord(char) - ord('A') + 10
+    if char == '<':
+        return 0
+    raise ValueError(f"Invalid MRZ character: {char!r}")
+
+
+def mrz_check_digit(field):
+    """Computes the ICAO 9303 check digit of an MRZ field, as a single-character string."""
+    total = sum(_char_value(char) * CHECK_DIGIT_WEIGHTS[i % 3] for i, char in enumerate(field))
+    return str(total % 10)
+
+
+def check_field(field, digit):
+    """True if `digit` is the check digit of the MRZ `field`."""
+    # A filler in the check digit position is allowed for an empty (all filler) field
+    if digit == '<':
+        return set(field) == {'<'}
+    return mrz_check_digit(field) == digit
+
+
+def td3_line2_check_results(line):
+    """
+    Checks the check digits of the second line of a TD3 (passport) MRZ.
+
+    Returns:
+        dict: passportNo, dob, dateOfExpiry, personalNumber and composite mapped to
+        whether their check digit validates, or None if the line is not 44 valid MRZ
+        characters.
+    """
+    if not line or len(line) != TD3_LINE_LENGTH or not re.fullmatch(r'[A-Z0-9<]+', line):
+        return None
+    results = {
+        name: check_field(line[start:end], line[digit])
+        for name, (start, end, digit) in TD3_LINE2_CHECKED_FIELDS.items()
+    }
+    results["composite"] = check_field(line[0:10] + line[13:20] + line[21:43], line[43])
+    return results
+
+
+def is_valid_td3_line2(line):
+    """True if every check digit of a TD3 MRZ second line validates."""
+    results = td3_line2_check_results(line)
+    return bool(results) and all(results.values())
+
+
+# Positions of the second TD3 line that can only hold digits (dates and check digits)
+# or a digit/filler (passport number check digit, personal number check digit)
+_TD3_LINE2_DIGIT_POSITIONS = set(range(13, 20)) | set(range(21, 28))
+_TD3_LINE2_DIGIT_OR_FILLER_POSITIONS = {9, 42, 43}
+# Letters OCR commonly reads in place of the digit that was printed
+_DIGIT_LOOKALIKES = str.maketrans({
+    'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'G': '6', 'B': '8',
+})
+
+
+def normalize_td3_line2(line):
+    """
+    Replaces letters that OCR read in the digit-only positions of a TD3 second line with
+    the digits they resemble (O -> 0, I -> 1, ...). Other positions are left alone, so the
+    check digits still decide whether the line was read correctly.
+    """
+    if not line or len(line) != TD3_LINE_LENGTH:
+        return line
+    chars = list(line)
+    for i, char in enumerate(chars):
+        if i in _TD3_LINE2_DIGIT_POSITIONS or (i in _TD3_LINE2_DIGIT_OR_FILLER_POSITIONS and char != '<'):
+            chars[i] = char.translate(_DIGIT_LOOKALIKES)
+    return ''.join(chars)
+
+
+def pick_td3_lines(text):
+    """
+    Picks the two TD3 MRZ lines out of OCR text: the first 44-character line pair whose
+    second line validates, else the first pair of MRZ-looking lines.
+
+    Returns:
+        tuple: (line1, line2), normalized and cut to 44 characters, or ('', '').
+    """
+    lines = []
+    for line in text.upper().splitlines():
+        cleaned = re.sub(r'[^A-Z0-9<]', '', line)
+        if len(cleaned) >= 30 and cleaned.count('<') > 2:
+            lines.append(cleaned[:TD3_LINE_LENGTH])
+    pairs = [(lines[i], normalize_td3_line2(lines[i + 1])) for i in range(len(lines) - 1)]
+    for line1, line2 in pairs:
+        if is_valid_td3_line2(line2):
+            return line1, line2
+    return pairs[0] if pairs else ('', '')
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+# The band is searched for on a copy scaled to this width, which keeps the morphology cheap
+LOCATE_WIDTH = 600
+# Wider MRZ crops are scaled down before OCR: Tesseract reads 44 characters most reliably
+# at about this width, starts inserting characters on much wider crops, and its run time
+# grows with the pixel count
+MRZ_BAND_MAX_WIDTH = 1000
+# OCR settings for the band: one uniform block of text limited to the MRZ alphabet
+MRZ_OCR_CONFIG = r'--oem 1 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'
+
+_RECT_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+_SQUARE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 21))
+
+
+def locate_mrz_band(gray):
+    """
+    Locates the machine readable zone of a grayscale passport scan.
+
+    Dark text on a light background is isolated with a blackhat transform, the strong
+    horizontal gradients of the MRZ characters are closed into one blob per text block,
+    and the widest blob with the elongated shape of the two MRZ lines wins.
+
+    Returns:
+        tuple: (x, y, w, h, angle) of the band in `gray` coordinates, where `angle` is its
+        skew in degrees, or None if no MRZ-shaped region was found.
+    """
+    (H, W) = gray.shape[:2]
+    scale = LOCATE_WIDTH / W
+    small = cv2.resize(gray, (LOCATE_WIDTH, max(1, int(H * scale))), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (3, 3), 0)
+
+    blackhat = cv2.morphologyEx(small, cv2.MORPH_BLACKHAT, _RECT_KERNEL)
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype('uint8')
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, _RECT_KERNEL)
+    _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _SQUARE_KERNEL)
+    thresh = cv2.erode(thresh, None, iterations=4)
+    # Blobs touching the left and right borders are scan edges, not text
+    border = int(LOCATE_WIDTH * 0.05)
+    thresh[:, :border] = 0
+    thresh[:, LOCATE_WIDTH - border:] = 0
+
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        (cx, cy), (rw, rh), angle = cv2.minAreaRect(contour)
+        if rw < rh:
+            rw, rh = rh, rw
+            angle -= 90
+        # The angle is only defined up to a half turn; fold it into [-90, 90)
+        angle = (angle + 90) % 180 - 90
+        if rh == 0 or rw / rh < 5 or rw < LOCATE_WIDTH * 0.6:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        # Pad the band so the first and last characters and the descenders are not cut off
+        pad_x = int((x + w) * 0.03)
+        pad_y = int((y + h) * 0.03)
+        x, y = max(0, x - pad_x), max(0, y - pad_y)
+        w = min(LOCATE_WIDTH - x, w + 2 * pad_x)
+        h = min(small.shape[0] - y, h + 2 * pad_y)
+        return (int(x / scale), int(y / scale), int(w / scale), int(h / scale), angle)
+    return None
+
+
+def crop_mrz_band(gray, band):
+    """Cuts the band found by locate_mrz_band out of `gray`, levelled and scaled for OCR."""
+    x, y, w, h, angle = band
+    roi = gray[y:y + h, x:x + w]
+    if abs(angle) > 0.5:
+        M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        roi = cv2.warpAffine(roi, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    if w > MRZ_BAND_MAX_WIDTH:
+        roi = cv2.resize(roi, (MRZ_BAND_MAX_WIDTH, int(h * MRZ_BAND_MAX_WIDTH / w)), interpolation=cv2.INTER_AREA)
+    return roi
@@ -0,0 +1,159 @@
+from collections import Counter, defaultdict
+
+import cv2
+
+from local_ocr.mrz import TD3_LINE2_CHECKED_FIELDS, TD3_LINE_LENGTH, check_field, td3_line2_check_results
+from local_ocr.mrz_band import MRZ_BAND_MAX_WIDTH, crop_mrz_band
+from local_ocr.skew import estimate_skew_angle
+
+# Fixed crops tried as well as the located band, as the fraction of the page height
+# they start at: the MRZ normally sits in the bottom quarter of the page, and higher on photos
+# with table or hand below the page
+BOTTOM_CROPS = (0.7, 0.55)
+# Extra rotations, in degrees, tried on the band for a skew the locator misjudged
+BAND_ROTATIONS = (1.5, -1.5)
+
+
+def _band(gray, band):
+    return crop_mrz_band(gray, band)
+
+
+def _band_adaptive(gray, band):
+    # Evens out shadows and uneven lighting across the band
+    roi = crop_mrz_band(gray, band)
+    block = max(3, roi.shape[0] // 4 | 1)
+    return cv2.adaptiveThreshold(roi, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 10)
+
+
+def _band_padded(gray, band):
+    # A band cut too tight loses the tops of line 1 or the bottoms of line 2
+    x, y, w, h, angle = band
+    pad = h // 3
+    top = max(0, y - pad)
+    return crop_mrz_band(gray, (x, top, w, min(gray.shape[0] - top, h + 2 * pad), angle))
+
+
+def _band_widened(gray, band):
+    # The locator can stop short of line ends that are faint, shadowed or out of focus
+    x, y, w, h, angle = band
+    return _flatten(crop_mrz_band(gray, (0, y, gray.shape[1], h, angle)))
+
+
+def _band_upscaled(gray, band):
+    # Small scans give a band too narrow for Tesseract to separate the characters
+    roi = crop_mrz_band(gray, band)
+    if roi.shape[1] >= MRZ_BAND_MAX_WIDTH:
+        return None
+    scale = MRZ_BAND_MAX_WIDTH / roi.shape[1]
+    return cv2.resize(roi, (MRZ_BAND_MAX_WIDTH, int(roi.shape[0] * scale)), interpolation=cv2.INTER_CUBIC)
+
+
+def _band_rotated(rotation):
+    def build(gray, band):
+        x, y, w, h, angle = band
+        return crop_mrz_band(gray, (x, y, w, h, angle + rotation))
+    return build
+
+
+def _flatten(gray):
+    """Divides out the page's background, estimated by closing the text away, to even out shadows."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (gray.shape[0] // 8 | 1, gray.shape[0] // 8 | 1))
+    background = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
+    flat = cv2.divide(gray, background, scale=255)
+    _, flat = cv2.threshold(flat, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return flat
+
+
+def _bottom_crop(start):
+    def build(gray, band):
+        (H, W) = gray.shape[:2]
+        roi = gray[int(H * start):, :]
+        angle = estimate_skew_angle(roi)
+        (h, w) = roi.shape[:2]
+        if abs(angle) > 0.5:
+            M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+            roi = cv2.warpAffine(roi, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        if w > MRZ_BAND_MAX_WIDTH:
+            roi = cv2.resize(roi, (MRZ_BAND_MAX_WIDTH, int(h * MRZ_BAND_MAX_WIDTH / w)), interpolation=cv2.INTER_AREA)
+        return _flatten(roi)
+    return build
+
+
+# The preprocessing variants of the MRZ, most likely to read a typical scan first.
+# Each takes the grayscale page and the band found by locate_mrz_band and returns the
+# image to OCR, or None when it does not apply; the band variants need a band.
+MRZ_VARIANTS = [
+    ("band", _band, True),
+    ("band_adaptive", _band_adaptive, True),
+    ("band_padded", _band_padded, True),
+    ("band_widened", _band_widened, True),
+    ("band_upscaled", _band_upscaled, True),
+] + [
+    (f"band_rotated_{rotation:+g}", _band_rotated(rotation), True) for rotation in BAND_ROTATIONS
+] + [
+    (f"bottom_{int(start * 100)}", _bottom_crop(start), False) for start in BOTTOM_CROPS
+]
+
+
+def mrz_variants(band):
+    """Returns the (name, build) pairs of the variants that apply to a page where `band` was (or was not) found."""
+    return [(name, build) for name, build, needs_band in MRZ_VARIANTS if band is not None or not needs_band]
+
+
+def read_confidence(line2):
+    """Weighs a read by how many check digits of its second line validate: 1 to 6."""
+    results = td3_line2_check_results(line2)
+    return 1 + sum(results.values()) if results else 1
+
+
+def _vote_line(lines, weights):
+    """Votes each character position of equally long `lines`, every line counting its weight."""
+    voted = []
+    for chars in zip(*lines):
+        tally = defaultdict(float)
+        for char, weight in zip(chars, weights):
+            tally[char] += weight
+        voted.append(max(tally, key=tally.get))
+    return ''.join(voted)
+
+
+def vote_td3_lines(reads):
+    """
+    Combines the MRZ lines read from several variants of one passport, none of which
+    validated on its own.
+
+    Every 44-character line votes per character position, weighted by read_confidence.
+    Each check-digit field of the voted second line that does not validate is then
+    replaced by the field, with its check digit, that the most weight read validly,
+    which also fixes characters that a majority of the reads got wrong.
+
+    Args:
+        reads: (line1, line2) pairs.
+
+    Returns:
+        tuple: (line1, line2), or ('', '') if no read has a 44-character second line.
+    """
+    reads = [(line1, line2) for line1, line2 in reads if len(line2) == TD3_LINE_LENGTH]
+    if not reads:
+        return '', ''
+    weights = [read_confidence(line2) for _, line2 in reads]
+    line2 = _vote_line([line2 for _, line2 in reads], weights)
+
+    for start, end, digit in TD3_LINE2_CHECKED_FIELDS.values():
+        if check_field(line2[start:end], line2[digit]):
+            continue
+        valid = Counter()
+        for (_, read_line2), weight in zip(reads, weights):
+            if check_field(read_line2[start:end], read_line2[digit]):
+                valid[read_line2[start:digit + 1]] += weight
+        if valid:
+            line2 = line2[:start] + valid.most_common(1)[0][0] + line2[digit + 1:]
+
+    line1_reads = [(line1, weight) for (line1, _), weight in zip(reads, weights) if len(line1) == TD3_LINE_LENGTH]
+    if line1_reads:
+        line1 = _vote_line([line1 for line1, _ in line1_reads], [weight for _, weight in line1_reads])
+    else:
+        # Keep the first line of the most confident read
+        line1 = max(zip(reads, weights), key=lambda item: item[1])[0][0]
+    return line1, line2
+
@@ -0,0 +1,170 @@
+import logging
+import os
+import shlex
+import threading
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Number of OCR calls that may run at once; with tesserocr each one keeps a model loaded
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# 'tesserocr' runs Tesseract in-process, 'pytesseract' runs the tesseract binary for every
+# call, and 'auto' uses tesserocr when it is installed and can load its language data
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Tesseract's defaults when a config string does not set them
+DEFAULT_OEM = 3
+DEFAULT_PSM = 3
+# Engine mode local OCR runs with (--oem 1, LSTM only), loaded when the engine starts
+PRELOAD_OEM = 1
+
+
+def parse_tesseract_config(config):
+    """
+    Parses a tesseract command line config such as `--oem 1 --psm 6 -c name=value`.
+
+    Returns:
+        tuple: (oem, psm, variables dict)
+    """
+    oem, psm, variables = DEFAULT_OEM, DEFAULT_PSM, {}
+    args = shlex.split(config or '')
+    i = 0
+    while i < len(args):
+        if args[i] == '--oem' and i + 1 < len(args):
+            oem = int(args[i + 1])
+            i += 2
+        elif args[i] == '--psm' and i + 1 < len(args):
+            psm = int(args[i + 1])
+            i += 2
+        elif args[i] == '-c' and i + 1 < len(args):
+            name, _, value = args[i + 1].partition('=')
+            variables[name] = value
+            i += 2
+        else:
+            raise ValueError(f"Unsupported tesseract option {args[i]!r} in config {config!r}")
+    return oem, psm, variables
+
+
+class TesseractCLIEngine:
+    """
+    Runs the tesseract binary through pytesseract for every call, which writes the image
+    to a temporary file and loads the language model each time. At most `workers` calls
+    run at once, so concurrent requests queue instead of forking without bound.
+    """
+
+    name = 'pytesseract'
+
+    def __init__(self, workers=OCR_WORKERS, lang=OCR_LANG):
+        self.workers = workers
+        self.lang = lang
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def image_to_string(self, image, config=''):
+        with self._slots:
+            return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+
+class TesserocrEngine:
+    """
+    Runs Tesseract in-process through tesserocr with a pool of long-lived API instances,
+    each keeping its language model loaded. Tesserocr releases the GIL while recognising,
+    so `workers` threads OCR in parallel; further callers wait for a free instance.
+    Instances are created on first use, one pool per OCR engine mode.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, workers=OCR_WORKERS, lang=OCR_LANG):
+        self.workers = workers
+        self.lang = lang
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle = {}
+        self._lock = threading.Lock()
+        # Load one model up front so a missing language pack fails here, not mid-request
+        self._release(PRELOAD_OEM, self._create(PRELOAD_OEM))
+
+    def _create(self, oem):
+        kwargs = {'lang': self.lang, 'oem': oem}
+        # tesserocr otherwise only looks in the data path it was built with
+        if os.getenv('TESSDATA_PREFIX'):
+            kwargs['path'] = os.getenv('TESSDATA_PREFIX')
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        logging.info(f"Loaded Tesseract model '{self.lang}' (oem {oem}) in-process.")
+        return api
+
+    def _acquire(self, oem):
+        with self._lock:
+            idle = self._idle.setdefault(oem, [])
+            if idle:
+                return idle.pop()
+        return self._create(oem)
+
+    def _release(self, oem, api):
+        with self._lock:
+            self._idle.setdefault(oem, []).append(api)
+
+    def image_to_string(self, image, config=''):
+        oem, psm, variables = parse_tesseract_config(config)
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        with self._slots:
+            api = self._acquire(oem)
+            previous = {name: api.GetVariableAsString(name) for name in variables}
+            try:
+                api.SetPageSegMode(psm)
+                for name, value in variables.items():
+                    api.SetVariable(name, value)
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            finally:
+                # Later callers must not inherit this call's whitelist or other settings
+                for name, value in previous.items():
+                    api.SetVariable(name, value or '')
+                api.Clear()
+                self._release(oem, api)
+
+
+def create_ocr_engine(engine=OCR_ENGINE, workers=OCR_WORKERS, lang=OCR_LANG):
+    """Creates the OCR engine named by `engine`, falling back to pytesseract for 'auto'."""
+    if engine == 'pytesseract':
+        return TesseractCLIEngine(workers, lang)
+    if engine not in ('auto', 'tesserocr'):
+        raise ValueError(f"Unknown OCR engine {engine!r}; expected auto, tesserocr or pytesseract.")
+    if tesserocr is None:
+        if engine == 'tesserocr':
+            raise RuntimeError("OCR_ENGINE is 'tesserocr' but the tesserocr package is not installed.")
+        return TesseractCLIEngine(workers, lang)
+    try:
+        return TesserocrEngine(workers, lang)
+    except RuntimeError as e:
+        if engine == 'tesserocr':
+            raise
+        logging.warning(f"Could not load Tesseract in-process ({e}); running the tesseract binary instead.")
+        return TesseractCLIEngine(workers, lang)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Returns the process-wide OCR engine configured by OCR_ENGINE and OCR_WORKERS."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_ocr_engine()
+                logging.info(f"Local OCR uses {_engine.name} with {_engine.workers} workers.")
+    return _engine
+
+
+def image_to_string(image, config=''):
+    """Drop-in for pytesseract.image_to_string that runs on the process-wide OCR engine."""
+    return get_ocr_engine().image_to_string(image, config=config)
@@ -1,34 +1,57 @@
-import pytesseract
 from PIL import Image
-import json
 import re
 import logging
 from datetime import datetime
 import numpy as np
 import cv2
-import imutils
-import sys
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from extraction_cache import cached_extraction
+from image_context import shared
+from metrics import stage_timer
+from local_ocr import ocr_engine
+from local_ocr.mrz import is_valid_td3_line2, pick_td3_lines
+from local_ocr.mrz_band import MRZ_OCR_CONFIG, crop_mrz_band, locate_mrz_band
+from local_ocr.mrz_variants import BOTTOM_CROPS, mrz_variants, vote_td3_lines
+from local_ocr.skew import estimate_skew_angle
+
+# Fields the fast mode reads from the printed page, because the MRZ does not carry them
+VISUAL_FIELDS = [f.strip() for f in os.getenv("LOCAL_OCR_VISUAL_FIELDS", "pob,placeOfIssue,dateOfIssue").split(',') if f.strip()]
+# The fast mode's visual pass is run on a copy of the page at most this wide
+VISUAL_MAX_WIDTH = int(os.getenv("LOCAL_OCR_VISUAL_MAX_WIDTH", "2000"))
+# Threads the multi-variant mode preprocesses and OCRs MRZ variants on; the OCR itself
+# is further limited by the OCR engine's own workers
+VARIANT_WORKERS = int(os.getenv("LOCAL_OCR_VARIANT_WORKERS", str(ocr_engine.OCR_WORKERS)))
+
+def _decode_gray(image_path):
+    with Image.open(image_path) as img:
+        if img.format == 'JPEG':
+            # libjpeg converts to grayscale while decoding, so no RGB page is allocated
+            img.draft('L', img.size)
+        if img.mode != 'L':
+            img = img.convert('L')
+        gray = np.asarray(img)
+    gray.flags.writeable = False
+    return gray
+
+
+def load_gray(image_path):
+    """
+    Returns the page as a read-only grayscale array (EXIF orientation is not applied),
+    decoded once per request inside an image context and shared by every OCR pass.
+    """
+    return shared(image_path, 'gray', _decode_gray)
 
-logging.basicConfig(level=logging.INFO)
 
 def deskew(image):
     # Convert to grayscale if not already
     if len(image.shape) == 3:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    # Calculate skew angle using moments
-    coords = np.column_stack(np.where(image > 0))
-    
-    # Check if coords is empty
-    if coords.size == 0:
-        return image # Return original image if no text/pixels found
-
-    angle = cv2.minAreaRect(coords)[-1]
-
-    if angle < -45:
-        angle = -(90 + angle)
-    else:
-        angle = -angle
+    angle = estimate_skew_angle(image)
+    if abs(angle) < 0.05:
+        return image # Already level; skip the full-resolution rotation
 
     # Rotate the image to deskew
     (h, w) = image.shape[:2]
@@ -44,36 +67,144 @@ def clean_name(name):
     cleaned = re.sub(r'\s+', ' ', cleaned)
     return cleaned if cleaned else "NOT_FOUND" # Return NOT_FOUND if empty after cleaning
 
+def empty_passport_data():
+    return {
+        "firstName": "NOT_FOUND",
+        "fatherName": "NOT_FOUND",
+        "grandfatherName": "NOT_FOUND",
+        "passportNo": "NOT_FOUND",
+        "nationality": "NOT_FOUND",
+        "dob": "NOT_FOUND",
+        "sex": "NOT_FOUND",
+        "pob": "NOT_FOUND",
+        "placeOfIssue": "NOT_FOUND", # Added this field
+        "dateOfIssue": "NOT_FOUND",
+        "dateOfExpiry": "NOT_FOUND",
+    }
+
+def parse_mrz_lines(mrz_line1, mrz_line2, data):
+    """Fills `data` with the names, passport number, nationality, sex and dates of a TD3 MRZ."""
+    # --- Parse MRZ Line 1 (TD3 format) for Names ---
+    # The prompt specifies: "MRZ line 1 begins with the document code, followed by a
+    # three-letter country code (ETH), then the surname. Your task is to extract the
+    # letters immediately after ETH—in other words, parse out the surname starting
+    # just after the 'ETH' in the MRZ"
+
+    # Find the start of the surname after 'ETH'
+    surname_start_index = mrz_line1.find('ETH')
+    surname_mrz = ""
+    if surname_start_index != -1 and len(mrz_line1) > surname_start_index + 3:
+        # The surname is between 'ETH' and the first '<<'
+        surname_end_delimiter_index = mrz_line1.find('<<', surname_start_index + 3)
+        if surname_end_delimiter_index != -1:
+            surname_mrz = mrz_line1[surname_start_index + 3:surname_end_delimiter_index].replace('<', '').strip()
+        else:
+            # Fallback if '<<' not found after ETH, take till end of line (unlikely for standard MRZ)
+            surname_mrz = mrz_line1[surname_start_index + 3:].replace('<', '').strip()
+
+    # Extract given names part (after the first '<<')
+    given_names_part_raw = ""
+    first_double_chevron_index = mrz_line1.find('<<')
+    if first_double_chevron_index != -1 and len(mrz_line1) > first_double_chevron_index + 2:
+        given_names_part_raw = mrz_line1[first_double_chevron_index + 2:]
+
+    given_names_from_mrz = " ".join(given_names_part_raw.replace('<', ' ').strip().split())
+
+    # Initialize all name fields to NOT_FOUND
+    data["firstName"] = "NOT_FOUND"
+    data["fatherName"] = "NOT_FOUND"
+    data["grandfatherName"] = "NOT_FOUND"
+
+    # Extract first and father's name from given_names_from_mrz
+    given_names_parts = given_names_from_mrz.split(' ')
+    if len(given_names_parts) > 0 and given_names_parts[0]:
+        data["firstName"] = clean_name(given_names_parts[0])
+    if len(given_names_parts) > 1 and given_names_parts[1]:
+        data["fatherName"] = clean_name(given_names_parts[1])
+    if len(given_names_parts) > 2 and given_names_parts[2]:
+        # If there are more than two given names, the rest are grandfather's name
+        data["grandfatherName"] = clean_name(" ".join(given_names_parts[2:]))
+
+    # --- Parse MRZ Line 2 (TD3 format) ---
+    if len(mrz_line2) >= 44:
+        # Kept so callers can validate the extraction against the check digits
+        data["mrzLine2"] = mrz_line2[:44]
+        data["passportNo"] = mrz_line2[0:9].replace('<', '')
+        data["nationality"] = mrz_line2[10:13]
+
+        dob_str = mrz_line2[13:19]
+        sex_char = mrz_line2[20]
+        expiry_str = mrz_line2[21:27]
+
+        data["sex"] = sex_char if sex_char in ['M', 'F'] else "NOT_FOUND"
+
+        try:
+            dob_date = datetime.strptime(dob_str, '%y%m%d')
+            # Handle century ambiguity
+            if dob_date.year > datetime.now().year:
+                dob_date = dob_date.replace(year=dob_date.year - 100)
+            data["dob"] = dob_date.strftime('%d %b %y').upper()
+        except ValueError:
+            data["dob"] = "NOT_FOUND" # Set to NOT_FOUND on error
+
+        try:
+            expiry_date = datetime.strptime(expiry_str, '%y%m%d')
+            # Handle century ambiguity
+            if expiry_date.year < datetime.now().year - 50:
+                 expiry_date = expiry_date.replace(year=expiry_date.year + 100)
+            data["dateOfExpiry"] = expiry_date.strftime('%d %b %y').upper()
+
+        except ValueError:
+            data["dateOfExpiry"] = "NOT_FOUND" # Set to NOT_FOUND on error
+
+def parse_visual_fields(full_image_text, data):
+    """Fills `data` with the place of birth, place of issue and date of issue read from the printed page."""
+    # Place of Birth
+    pob_match = re.search(r'(PLACE\s*OF\s*BIRTH|POB)\s*[:\-]?\s*([A-Z\s.,-]+)', full_image_text, re.IGNORECASE)
+    if pob_match:
+        data["pob"] = pob_match.group(2).strip().replace('\n', ' ')
+    else:
+        data["pob"] = "NOT_FOUND" # Ensure it's set to NOT_FOUND if not found
+
+    # Place of Issue (New field)
+    place_of_issue_match = re.search(r'(PLACE\s*OF\s*ISSUE|ISSUING\s*AUTHORITY|AUTHORITY)\s*[:\-]?\s*([A-Z\s.,-]+)', full_image_text, re.IGNORECASE)
+    if place_of_issue_match:
+        data["placeOfIssue"] = place_of_issue_match.group(2).strip().replace('\n', ' ')
+    else:
+        data["placeOfIssue"] = "NOT_FOUND" # Ensure it's set to NOT_FOUND if not found
+
+    # Date of Issue
+    # Look for patterns like DD MMM YY or DD MMM YYYY
+    issue_date_match = re.search(r'(\d{1,2}\s*[A-Z]{3}\s*\d{2,4})', full_image_text, re.IGNORECASE)
+    if issue_date_match:
+        date_str = issue_date_match.group(1).upper()
+        parts = date_str.split(' ')
+        if len(parts[0]) == 1: # Pad day with leading zero if single digit
+            parts[0] = '0' + parts[0]
+        # Ensure year is 2 digits
+        year_part = parts[2]
+        if len(year_part) == 4:
+            parts[2] = year_part[2:] # Take last two digits for YY format
+        data["dateOfIssue"] = ' '.join(parts)
+    else:
+        data["dateOfIssue"] = "NOT_FOUND" # Set to NOT_FOUND if not found
+
+@cached_extraction('local_ocr')
 def extract_passport_data_local(image_path):
     try:
-        img_pil = Image.open(image_path)
-        image = np.array(img_pil)
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-
-        data = {
-            "firstName": "NOT_FOUND",
-            "fatherName": "NOT_FOUND",
-            "grandfatherName": "NOT_FOUND",
-            "passportNo": "NOT_FOUND",
-            "nationality": "NOT_FOUND",
-            "dob": "NOT_FOUND",
-            "sex": "NOT_FOUND",
-            "pob": "NOT_FOUND",
-            "placeOfIssue": "NOT_FOUND", # Added this field
-            "dateOfIssue": "NOT_FOUND",
-            "dateOfExpiry": "NOT_FOUND",
-        }
+        data = empty_passport_data()
 
         # --- MRZ (Machine Readable Zone) Detection and OCR ---
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = load_gray(image_path)
         (H, W) = gray.shape
         # Crop the bottom 25% of the image where the MRZ is typically located
         mrz_roi = gray[int(H * 0.75):, :]
 
         # OCR the MRZ region of interest using Tesseract
-        mrzText = pytesseract.image_to_string(mrz_roi, config=r'--oem 1 --psm 4')
+        with stage_timer('ocr_mrz_read'):
+            mrzText = ocr_engine.image_to_string(mrz_roi, config=r'--oem 1 --psm 4')
         mrzText = mrzText.replace(" ", "") # Remove spaces for easier parsing
-        logging.info(f"OCR extracted MRZ text:\n{mrzText}")
+        logging.debug(f"OCR extracted MRZ text:\n{mrzText}")
 
         # --- MRZ Parsing from extracted mrzText ---
         lines = mrzText.upper().splitlines()
@@ -110,122 +241,189 @@ def extract_passport_data_local(image_path):
 
 
         if mrz_line1 and mrz_line2:
-            logging.info(f"Detected MRZ Line 1: {mrz_line1}")
-            logging.info(f"Detected MRZ Line 2: {mrz_line2}")
-
-            # --- Parse MRZ Line 1 (TD3 format) for Names ---
-            # The prompt specifies: "MRZ line 1 begins with the document code, followed by a
-            # three-letter country code (ETH), then the surname. Your task is to extract the
-            # letters immediately after ETH—in other words, parse out the surname starting
-            # just after the 'ETH' in the MRZ"
-            
-            # Find the start of the surname after 'ETH'
-            surname_start_index = mrz_line1.find('ETH')
-            surname_mrz = ""
-            if surname_start_index != -1 and len(mrz_line1) > surname_start_index + 3:
-                # The surname is between 'ETH' and the first '<<'
-                surname_end_delimiter_index = mrz_line1.find('<<', surname_start_index + 3)
-                if surname_end_delimiter_index != -1:
-                    surname_mrz = mrz_line1[surname_start_index + 3:surname_end_delimiter_index].replace('<', '').strip()
-                else:
-                    # Fallback if '<<' not found after ETH, take till end of line (unlikely for standard MRZ)
-                    surname_mrz = mrz_line1[surname_start_index + 3:].replace('<', '').strip()
-
-            # Extract given names part (after the first '<<')
-            given_names_part_raw = ""
-            first_double_chevron_index = mrz_line1.find('<<')
-            if first_double_chevron_index != -1 and len(mrz_line1) > first_double_chevron_index + 2:
-                given_names_part_raw = mrz_line1[first_double_chevron_index + 2:]
-            
-            given_names_from_mrz = " ".join(given_names_part_raw.replace('<', ' ').strip().split())
-
-            # Initialize all name fields to NOT_FOUND
-            data["firstName"] = "NOT_FOUND"
-            data["fatherName"] = "NOT_FOUND"
-            data["grandfatherName"] = "NOT_FOUND"
-
-            # Extract first and father's name from given_names_from_mrz
-            given_names_parts = given_names_from_mrz.split(' ')
-            if len(given_names_parts) > 0 and given_names_parts[0]:
-                data["firstName"] = clean_name(given_names_parts[0])
-            if len(given_names_parts) > 1 and given_names_parts[1]:
-                data["fatherName"] = clean_name(given_names_parts[1])
-            if len(given_names_parts) > 2 and given_names_parts[2]:
-                # If there are more than two given names, the rest are grandfather's name
-                data["grandfatherName"] = clean_name(" ".join(given_names_parts[2:]))
-            
-            # --- Parse MRZ Line 2 (TD3 format) ---
-            if len(mrz_line2) >= 44:
-                data["passportNo"] = mrz_line2[0:9].replace('<', '')
-                data["nationality"] = mrz_line2[10:13]
-                
-                dob_str = mrz_line2[13:19]
-                sex_char = mrz_line2[20]
-                expiry_str = mrz_line2[21:27]
-
-                data["sex"] = sex_char if sex_char in ['M', 'F'] else "NOT_FOUND"
-
-                try:
-                    dob_date = datetime.strptime(dob_str, '%y%m%d')
-                    # Handle century ambiguity
-                    if dob_date.year > datetime.now().year:
-                        dob_date = dob_date.replace(year=dob_date.year - 100)
-                    data["dob"] = dob_date.strftime('%d %b %y').upper()
-                except ValueError:
-                    data["dob"] = "NOT_FOUND" # Set to NOT_FOUND on error
+            logging.debug(f"Detected MRZ Line 1: {mrz_line1}")
+            logging.debug(f"Detected MRZ Line 2: {mrz_line2}")
 
-                try:
-                    expiry_date = datetime.strptime(expiry_str, '%y%m%d')
-                    # Handle century ambiguity
-                    if expiry_date.year < datetime.now().year - 50:
-                         expiry_date = expiry_date.replace(year=expiry_date.year + 100)
-                    data["dateOfExpiry"] = expiry_date.strftime('%d %b %y').upper()
-                    
-                except ValueError:
-                    data["dateOfExpiry"] = "NOT_FOUND" # Set to NOT_FOUND on error
+            parse_mrz_lines(mrz_line1, mrz_line2, data)
 
         # --- Other Fields (less reliable, rely on visual OCR) ---
         # Perform OCR on the full image with a general PSM for other fields
         # This is done after MRZ extraction to avoid interference
-        gray_full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred_full = cv2.medianBlur(gray_full, 3)
-        deskewed_full = deskew(blurred_full)
+        blurred_full = cv2.medianBlur(gray, 3)
+        with stage_timer('ocr_deskew'):
+            deskewed_full = deskew(blurred_full)
         _, thresh_full = cv2.threshold(deskewed_full, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        full_image_text = pytesseract.image_to_string(Image.fromarray(thresh_full), config=r'--oem 1 --psm 11')
-        logging.info(f"OCR extracted full image text for other fields:\n{full_image_text}")
+        with stage_timer('ocr_full_page'):
+            full_image_text = ocr_engine.image_to_string(Image.fromarray(thresh_full), config=r'--oem 1 --psm 11')
+        logging.debug(f"OCR extracted full image text for other fields:\n{full_image_text}")
 
-        # Place of Birth
-        pob_match = re.search(r'(PLACE\s*OF\s*BIRTH|POB)\s*[:\-]?\s*([A-Z\s.,-]+)', full_image_text, re.IGNORECASE)
-        if pob_match:
-            data["pob"] = pob_match.group(2).strip().replace('\n', ' ')
-        else:
-            data["pob"] = "NOT_FOUND" # Ensure it's set to NOT_FOUND if not found
+        parse_visual_fields(full_image_text, data)
 
-        # Place of Issue (New field)
-        place_of_issue_match = re.search(r'(PLACE\s*OF\s*ISSUE|ISSUING\s*AUTHORITY|AUTHORITY)\s*[:\-]?\s*([A-Z\s.,-]+)', full_image_text, re.IGNORECASE)
-        if place_of_issue_match:
-            data["placeOfIssue"] = place_of_issue_match.group(2).strip().replace('\n', ' ')
-        else:
-            data["placeOfIssue"] = "NOT_FOUND" # Ensure it's set to NOT_FOUND if not found
-
-        # Date of Issue
-        # Look for patterns like DD MMM YY or DD MMM YYYY
-        issue_date_match = re.search(r'(\d{1,2}\s*[A-Z]{3}\s*\d{2,4})', full_image_text, re.IGNORECASE)
-        if issue_date_match:
-            date_str = issue_date_match.group(1).upper()
-            parts = date_str.split(' ')
-            if len(parts[0]) == 1: # Pad day with leading zero if single digit
-                parts[0] = '0' + parts[0]
-            # Ensure year is 2 digits
-            year_part = parts[2]
-            if len(year_part) == 4:
-                parts[2] = year_part[2:] # Take last two digits for YY format
-            data["dateOfIssue"] = ' '.join(parts)
+        return data
+
+    except Exception as e:
+        logging.error(f"Error during local passport data extraction: {e}", exc_info=True)
+        return None
+
+def _read_visual_fields(gray, data, mrz_top, angle):
+    """
+    Reads the VISUAL_FIELDS that the MRZ left NOT_FOUND in `data` from the printed page
+    above row `mrz_top`, levelled by `angle` degrees (the MRZ's own skew).
+    """
+    missing_fields = [field for field in VISUAL_FIELDS if data.get(field, "NOT_FOUND") == "NOT_FOUND"]
+    page = gray[:mrz_top, :]
+    if not missing_fields or page.shape[0] == 0:
+        return
+    if page.shape[1] > VISUAL_MAX_WIDTH:
+        page = cv2.resize(page, (VISUAL_MAX_WIDTH, int(page.shape[0] * VISUAL_MAX_WIDTH / page.shape[1])), interpolation=cv2.INTER_AREA)
+    if abs(angle) > 0.5:
+        (ph, pw) = page.shape[:2]
+        M = cv2.getRotationMatrix2D((pw // 2, ph // 2), angle, 1.0)
+        page = cv2.warpAffine(page, M, (pw, ph), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    page = cv2.medianBlur(page, 3)
+    _, thresh = cv2.threshold(page, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    with stage_timer('ocr_visual_fields'):
+        page_text = ocr_engine.image_to_string(Image.fromarray(thresh), config=r'--oem 1 --psm 11')
+    logging.debug(f"OCR extracted page text for {', '.join(missing_fields)}:\n{page_text}")
+    visual_data = {}
+    parse_visual_fields(page_text, visual_data)
+    for field in missing_fields:
+        data[field] = visual_data.get(field, "NOT_FOUND")
+
+
+@cached_extraction('local_ocr_fast')
+def extract_passport_data_local_fast(image_path):
+    """
+    MRZ-first local extraction. The MRZ band is located with a blackhat/contour search and
+    only that band is OCR'd, restricted to the MRZ alphabet. If its check digits validate,
+    the fields the MRZ cannot carry (VISUAL_FIELDS) are read from the printed page above
+    the band, levelled by the band's own skew; otherwise this falls back to the full
+    two-pass extraction.
+    """
+    try:
+        gray = load_gray(image_path)
+
+        with stage_timer('ocr_mrz_locate'):
+            band = locate_mrz_band(gray)
+        if band is None:
+            logging.info("No MRZ band found; falling back to the full local OCR pass.")
+            return extract_passport_data_local.__wrapped__(image_path)
+
+        with stage_timer('ocr_mrz_read'):
+            mrz_text = ocr_engine.image_to_string(crop_mrz_band(gray, band), config=MRZ_OCR_CONFIG)
+        logging.debug(f"OCR extracted MRZ band text:\n{mrz_text}")
+        mrz_line1, mrz_line2 = pick_td3_lines(mrz_text.replace(" ", ""))
+        if not is_valid_td3_line2(mrz_line2):
+            logging.info("MRZ band check digits do not validate; falling back to the full local OCR pass.")
+            return extract_passport_data_local.__wrapped__(image_path)
+
+        data = empty_passport_data()
+        parse_mrz_lines(mrz_line1, mrz_line2, data)
+
+        _read_visual_fields(gray, data, band[1], band[4])
+        return data
+
+    except Exception as e:
+        logging.error(f"Error during fast local passport data extraction: {e}", exc_info=True)
+        return None
+
+
+_variant_pool = None
+_variant_pool_lock = threading.Lock()
+
+
+def get_variant_pool():
+    """Returns the thread pool shared by all multi-variant MRZ reads, created on first use."""
+    global _variant_pool
+    if _variant_pool is None:
+        with _variant_pool_lock:
+            if _variant_pool is None:
+                _variant_pool = ThreadPoolExecutor(max_workers=VARIANT_WORKERS, thread_name_prefix='mrz-variant')
+    return _variant_pool
+
+
+def _read_mrz_variant(gray, band, build):
+    """Builds one MRZ variant and OCRs it; returns its (line1, line2), or ('', '')."""
+    image = build(gray, band)
+    if image is None or image.size == 0:
+        return '', ''
+    mrz_text = ocr_engine.image_to_string(image, config=MRZ_OCR_CONFIG)
+    return pick_td3_lines(mrz_text.replace(" ", ""))
+
+
+def read_mrz_variants(gray, band):
+    """
+    OCRs every preprocessing variant of the MRZ that applies (see mrz_variants) at once
+    on the variant pool. As soon as one variant's second line validates, it is returned
+    and the variants that have not started yet are cancelled; reads already running
+    cannot be interrupted and are discarded. If none validates, the reads are combined
+    by a check-digit-weighted vote.
+
+    Returns:
+        tuple: (line1, line2, name of the variant that validated or 'vote')
+    """
+    pool = get_variant_pool()
+    futures = {
+        pool.submit(_read_mrz_variant, gray, band, build): name
+        for name, build in mrz_variants(band)
+    }
+    reads = []
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    mrz_line1, mrz_line2 = future.result()
+                except Exception as e:
+                    logging.warning(f"MRZ variant {futures[future]} failed: {e}")
+                    continue
+                if is_valid_td3_line2(mrz_line2):
+                    return mrz_line1, mrz_line2, futures[future]
+                if mrz_line2:
+                    reads.append((mrz_line1, mrz_line2))
+    finally:
+        for future in futures:
+            future.cancel()
+    mrz_line1, mrz_line2 = vote_td3_lines(reads)
+    return mrz_line1, mrz_line2, 'vote'
+
+
+@cached_extraction('local_ocr_multi')
+def extract_passport_data_local_multi(image_path):
+    """
+    MRZ-first local extraction for poor scans. Several preprocessing variants of the MRZ
+    (the located band thresholded, padded, upscaled and re-rotated, and fixed crops of
+    the bottom of the page) are OCR'd in parallel; the first that validates wins, else
+    the reads are voted per character. The visual fields are then read as in the fast
+    mode. If no variant reads any MRZ lines this falls back to the full two-pass
+    extraction.
+    """
+    try:
+        gray = load_gray(image_path)
+
+        with stage_timer('ocr_mrz_locate'):
+            band = locate_mrz_band(gray)
+        with stage_timer('ocr_mrz_read'):
+            mrz_line1, mrz_line2, variant = read_mrz_variants(gray, band)
+        if not mrz_line1 or not mrz_line2:
+            logging.info("No MRZ variant read any MRZ lines; falling back to the full local OCR pass.")
+            return extract_passport_data_local.__wrapped__(image_path)
+        if variant == 'vote':
+            valid = is_valid_td3_line2(mrz_line2)
+            logging.info(f"No MRZ variant validated on its own; the voted MRZ {'validates' if valid else 'does not validate'}.")
         else:
-            data["dateOfIssue"] = "NOT_FOUND" # Set to NOT_FOUND if not found
+            logging.debug(f"MRZ variant {variant} validated.")
+
+        data = empty_passport_data()
+        parse_mrz_lines(mrz_line1, mrz_line2, data)
 
+        if band is not None:
+            _read_visual_fields(gray, data, band[1], band[4])
+        else:
+            _read_visual_fields(gray, data, int(gray.shape[0] * BOTTOM_CROPS[-1]), estimate_skew_angle(gray))
         return data
 
     except Exception as e:
-        logging.error(f"Error during local passport data extraction: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        logging.error(f"Error during multi-variant local passport data extraction: {e}", exc_info=True)
+        return None
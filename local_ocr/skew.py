@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+# Skew is estimated on a copy of the page at most this many pixels on its long side
+SKEW_ESTIMATE_MAX_SIDE = 1000
+# Largest skew, in degrees either way, the skew search considers
+SKEW_MAX_ANGLE = 15
+
+def estimate_skew_angle(gray, max_angle=SKEW_MAX_ANGLE):
+    """
+    Estimates the angle, in degrees counter-clockwise, that levels the text lines of a
+    grayscale page.
+
+    Dark text is binarised with an adaptive threshold on a copy of the page at most
+    SKEW_ESTIMATE_MAX_SIDE pixels on its long side, and the foreground pixels are projected
+    onto the vertical axis at candidate angles: the angle whose row profile is sharpest,
+    i.e. has the most ink concentrated on the fewest rows, levels the lines. The search
+    runs in 0.5 degree steps and is then refined in 0.05 degree steps, so memory stays
+    bounded by the small copy whatever the resolution of the scan.
+    """
+    (h, w) = gray.shape[:2]
+    scale = SKEW_ESTIMATE_MAX_SIDE / max(h, w)
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+    ys, xs = np.nonzero(binary)
+    if ys.size == 0:
+        return 0.0
+    ys = ys.astype(np.float32) - gray.shape[0] / 2
+    xs = xs.astype(np.float32) - gray.shape[1] / 2
+
+    def sharpness(angle):
+        theta = np.deg2rad(angle)
+        rows = ys * np.float32(np.cos(theta)) + xs * np.float32(np.sin(theta))
+        profile = np.bincount((rows - rows.min()).astype(np.int32))
+        return int(np.dot(profile, profile))
+
+    best = max(np.arange(-max_angle, max_angle + 0.25, 0.5), key=sharpness)
+    best = max(np.arange(best - 0.5, best + 0.525, 0.05), key=sharpness)
+    return -float(best)
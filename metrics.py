@@ -0,0 +1,218 @@
+"""
+In-process metrics, exposed in the Prometheus text format on the app's /metrics route.
+Nothing is pushed anywhere: a Prometheus server, or curl, scrapes the route when it
+wants the numbers, so the app runs the same with or without a collector.
+
+Stage timings are recorded with `stage_timer`/`record_stage`. Besides feeding the
+cv_stage_seconds histogram, every stage recorded while `request_spans` is collecting
+in the current context is appended to its span list, which is how one request or job
+reports where its own time went.
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds, in bytes, of the size histogram buckets
+SIZE_BUCKETS = (25e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} takes labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self, key, value):
+        raise NotImplementedError
+
+    def expose(self):
+        """Returns the metric's lines in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            series = {key: list(value) if isinstance(value, list) else value for key, value in self._series.items()}
+        for key, value in sorted(series.items()):
+            for suffix, extra_labels, sample in self._samples(key, value):
+                labels = list(zip(self.labelnames, key)) + extra_labels
+                lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(sample)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [('_total', [], value)]
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets per label combination, with their sum and count."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Bucket i counts the observations in (buckets[i-1], buckets[i]]; the last one is +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the `with` block took, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total = value[:-1], value[-1]
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(('_bucket', [('le', _format_value(bound))], cumulative))
+        samples.append(('_sum', [], total))
+        samples.append(('_count', [], cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """The metrics of one process. Asking for a metric that exists returns the existing one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def expose(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return ''.join(line + '\n' for metric in metrics for line in metric.expose())
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'cv_stage_seconds', 'Time spent in each stage of generating a CV.', ['stage']
+)
+
+# The span list `request_spans` is collecting into in the current context, if any
+_spans = contextvars.ContextVar('metrics_spans', default=None)
+
+
+def record_span(name, seconds):
+    """Adds a span to the current context's span list, if one is collecting."""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def record_stage(stage, seconds):
+    """Records a stage's duration in cv_stage_seconds and in the current span list."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_span(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Records how long the `with` block took as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def start_spans():
+    """
+    Starts collecting the spans recorded in the current context. Returns (spans, token):
+    the list the spans are appended to, and the token `stop_spans` takes.
+    """
+    spans = []
+    return spans, _spans.set(spans)
+
+
+def stop_spans(token):
+    _spans.reset(token)
+
+
+@contextmanager
+def request_spans():
+    """Collects the spans recorded inside the `with` block; yields their (name, seconds) list."""
+    spans, token = start_spans()
+    try:
+        yield spans
+    finally:
+        stop_spans(token)
+
+
+def format_spans(spans):
+    """Returns a span list as a short log-friendly summary, e.g. 'extraction=1.20s, pdf_save=0.01s'."""
+    return ', '.join(f"{name}={seconds:.3f}s" for name, seconds in spans)
+
+
+def server_timing(spans):
+    """Returns a span list as a Server-Timing header value, with durations in milliseconds."""
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans)
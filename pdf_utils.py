@@ -1,8 +1,534 @@
+import copy
 import fitz  # PyMuPDF
-from PIL import Image
+import hashlib
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
+from image_pipeline import DERIVATIVE_JPEG_QUALITY, IMAGE_LAYER_FOLDER, PDF_IMAGE_DPI, content_hash, pdf_image
+from metrics import REGISTRY, SIZE_BUCKETS, record_stage, stage_timer
+from storage import touch
+from text_fit import FIT_MODES, fit_text, text_width
+
+# Every template has a layout file next to it (template.pdf -> template.layout.json) with
+# the rectangles of its text fields, experience slots and image slots
+LAYOUT_SUFFIX = ".layout.json"
+# Seconds between checks of a loaded template and its layout file for changes, which are
+# then reloaded without a restart; 0 turns reloading off
+TEMPLATE_RELOAD_INTERVAL = float(os.getenv("TEMPLATE_RELOAD_INTERVAL", "2"))
+
+# Layout defaults for text: left-aligned text starts this far right of its rectangle's
+# left edge, the baseline is baseline_offset above the rectangle's bottom, and text too
+# wide for its rectangle is shrunk down to DEFAULT_MIN_FONT_SIZE
+DEFAULT_FONT = "helv"
+DEFAULT_FONT_SIZE = 9
+DEFAULT_MIN_FONT_SIZE = 6
+DEFAULT_FIT = "shrink"
+DEFAULT_PADDING = 5
+TEXT_ALIGNMENTS = ("left", "center")
+IMAGE_SLOT_NAMES = ("face", "full_body", "passport")
+
+
+PDF_SIZE_BYTES = REGISTRY.histogram('cv_pdf_size_bytes', 'Size of the generated CV PDFs.', buckets=SIZE_BUCKETS)
+
+# MuPDF is not thread-safe, so the PyMuPDF calls of a process run one at a time. Only
+# the calls themselves hold it: the images are decoded and files read and written
+# outside. Taken after _templates_lock, never before it.
+_pymupdf_lock = threading.Lock()
+
+
+def fit_image_rect(slot_rect, image_size):
+    """
+    Returns the rectangle an image of `image_size` (width, height) occupies when it is
+    fitted into `slot_rect` while keeping its aspect ratio, centered within the slot.
+    """
+    field_width = slot_rect.width
+    field_height = slot_rect.height
+    original_width, original_height = image_size
+
+    # Calculate aspect ratios to maintain image proportions
+    aspect_ratio = original_width / original_height
+    field_aspect_ratio = field_width / field_height
+
+    # Determine new dimensions to fit within the field while maintaining aspect ratio
+    if aspect_ratio > field_aspect_ratio:
+        new_width = field_width
+        new_height = new_width / aspect_ratio
+    else:
+        new_height = field_height
+        new_width = new_height * aspect_ratio
+
+    # Ensure image doesn't exceed its original size if it's smaller than the field
+    if new_width > original_width or new_height > original_height:
+        new_width = original_width
+        new_height = original_height
+
+    # Calculate offsets to center the image within its field (PyMuPDF y is from top)
+    x_offset = slot_rect.x0 + (field_width - new_width) / 2
+    y_offset = slot_rect.y0 + (field_height - new_height) / 2
+    return fitz.Rect(x_offset, y_offset, x_offset + new_width, y_offset + new_height)
+
+
+def layout_path_for(template_path):
+    """Returns the path of the layout file of the template at `template_path`."""
+    return os.path.splitext(template_path)[0] + LAYOUT_SUFFIX
+
+
+class CVLayout:
+    """
+    Where a template's text and images go, compiled once from its layout file.
+
+    The layout file is a JSON object:
+
+        {
+          "font": "helv", "font_size": 9,
+          "fields": {"fullName": {"page": 0, "rect": [x0, y0, x1, y1]}, ...},
+          "experiences": {"align": "center", "baseline_offset": 3,
+                          "slots": [{"country": {...}, "year": {...}}, ...]},
+          "images": {"face": {"page": 0, "rect": [x0, y0, x1, y1]}, ...}
+        }
+
+    A text field or experience slot may set its own `font_size`, `align` ('left' or
+    'center'), `padding`, `baseline_offset`, `fit` ('none', 'shrink' or 'wrap', see
+    text_fit.fit_text) and `min_font_size`; the `experiences` object sets them for all
+    its slots. Pages count from 0 and rectangles are in PDF points from the top left.
+    """
+
+    def __init__(self, spec, source="<layout>"):
+        self.source = source
+        try:
+            self.font_name = spec.get("font", DEFAULT_FONT)
+            defaults = {"font_size": spec.get("font_size", DEFAULT_FONT_SIZE)}
+            self.fields = {
+                field_name: self._text_slot(field, defaults)
+                for field_name, field in spec.get("fields", {}).items()
+            }
+            experiences = spec.get("experiences", {})
+            experience_defaults = {**defaults, **{k: v for k, v in experiences.items() if k != "slots"}}
+            self.experience_slots = [
+                {key: self._text_slot(field, experience_defaults) for key, field in slot.items()}
+                for slot in experiences.get("slots", [])
+            ]
+            self.image_slots = {
+                slot_name: (int(slot.get("page", 0)), fitz.Rect(slot["rect"]))
+                for slot_name, slot in spec.get("images", {}).items()
+            }
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid CV layout {source}: {e!r}") from e
+        unknown = set(self.image_slots) - set(IMAGE_SLOT_NAMES)
+        if unknown:
+            raise ValueError(f"Invalid CV layout {source}: unknown image slots {sorted(unknown)}.")
+        # Fails early if the font is not one of the base-14 fonts used for stamping
+        text_width("X", self.font_name, DEFAULT_FONT_SIZE)
+        # Pages that get text, each overlaid with its own text page
+        self.text_pages = sorted({slot["page"] for slot in self.text_slots()})
+
+    def _text_slot(self, field, defaults):
+        def setting(name, default):
+            return field.get(name, defaults.get(name, default))
+
+        rect = fitz.Rect(field["rect"])
+        align = setting("align", "left")
+        if align not in TEXT_ALIGNMENTS:
+            raise ValueError(f"unknown text alignment {align!r}")
+        fit = setting("fit", DEFAULT_FIT)
+        if fit not in FIT_MODES:
+            raise ValueError(f"unknown text fit {fit!r}")
+        x = rect.x0 + setting("padding", DEFAULT_PADDING)
+        font_size = setting("font_size", DEFAULT_FONT_SIZE)
+        return {
+            "page": int(setting("page", 0)),
+            "rect": rect,
+            "font_size": font_size,
+            "min_font_size": min(setting("min_font_size", DEFAULT_MIN_FONT_SIZE), font_size),
+            "fit": fit,
+            "align": align,
+            # Left-aligned text starts at x; centered text is positioned per text
+            "x": x,
+            "max_width": rect.x1 - x if align == "left" else rect.width,
+            # PyMuPDF inserts text at its baseline
+            "y": rect.y1 - setting("baseline_offset", 0),
+        }
+
+    def text_slots(self):
+        yield from self.fields.values()
+        for slot in self.experience_slots:
+            yield from slot.values()
+
+    def validate(self, page_rects):
+        """Raises ValueError unless every slot lies within its page of a template with `page_rects`."""
+        slots = [(slot["page"], slot["rect"]) for slot in self.text_slots()]
+        slots += list(self.image_slots.values())
+        for page_num, rect in slots:
+            if not 0 <= page_num < len(page_rects):
+                raise ValueError(f"Layout {self.source} uses page {page_num + 1}, but the CV template has {len(page_rects)} pages.")
+            if not rect.is_valid or not page_rects[page_num].contains(rect):
+                raise ValueError(f"Layout rectangle {tuple(rect)} lies outside page {page_num + 1} {tuple(page_rects[page_num])} of the CV template.")
+
+
+def load_layout(layout_path):
+    """Reads and compiles the layout file at `layout_path`."""
+    with open(layout_path, 'rb') as f:
+        try:
+            spec = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"Invalid CV layout {layout_path}: {e}") from e
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid CV layout {layout_path}: expected a JSON object.")
+    return CVLayout(spec, layout_path)
+
+
+def _file_stamp(path):
+    """Returns what identifies the current version of a file: its modification time and size."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CVTemplate:
+    """
+    A CV template that is loaded, validated and compiled once per process.
+
+    Every page of the template PDF is converted into a Form XObject on an otherwise empty
+    page. The original page content streams are large, and PyMuPDF re-parses a page's
+    whole content stream on every `insert_text`/`insert_image` call to balance its
+    graphics state; a compiled page only contains a single `Do` operator, so stamping a
+    candidate onto it is cheap. The compiled document is kept as a byte buffer and each
+    render opens a private in-memory copy of it.
+
+    A render is split in two layers: the image layer, the compiled template with the
+    candidate's three photos embedded, which is cached on disk by the template and image
+    contents; and the text fields, which are stamped on a copy of the image layer.
+
+    Where the text and images go comes from the template's CVLayout.
+    """
+
+    def __init__(self, template_path, layout_path=None):
+        self.template_path = template_path
+        self.layout_path = layout_path or layout_path_for(template_path)
+        # Stamped before reading, so that a change made while loading is picked up by the next check
+        self.pdf_stamp = _file_stamp(template_path)
+        self.layout_stamp = _file_stamp(self.layout_path)
+        self.layout = load_layout(self.layout_path)
+        self._template_bytes = self._compile()
+        self.fingerprint = hashlib.sha256(self._template_bytes).hexdigest()
+        self.checked_at = time.monotonic()
+
+    def with_layout(self, layout, layout_stamp):
+        """Returns a copy of this template with another layout, sharing the compiled PDF."""
+        layout.validate(self.page_rects)
+        template = copy.copy(self)
+        template.layout = layout
+        template.layout_stamp = layout_stamp
+        return template
+
+    def _compile(self):
+        source_doc = fitz.open(self.template_path)
+        try:
+            self._validate(source_doc)
+            # Sizes of the pages the text fields are stamped on
+            self.page_rects = [page.rect for page in source_doc]
+            compiled_doc = fitz.open()
+            for page in source_doc:
+                compiled_page = compiled_doc.new_page(width=page.rect.width, height=page.rect.height)
+                compiled_page.show_pdf_page(compiled_page.rect, source_doc, page.number)
+            compiled_doc.set_metadata(source_doc.metadata)
+            # Without a new random /ID, so that the fingerprint is the same in every process
+            template_bytes = compiled_doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+            compiled_doc.close()
+        finally:
+            source_doc.close()
+        logging.info(f"Compiled CV template {self.template_path} ({len(template_bytes)} bytes).")
+        return template_bytes
+
+    def _validate(self, source_doc):
+        for page in source_doc:
+            if page.rotation:
+                raise ValueError(f"CV template {self.template_path} page {page.number + 1} is rotated; rotated templates are not supported.")
+            if page.first_annot or page.first_widget:
+                raise ValueError(f"CV template {self.template_path} page {page.number + 1} has annotations or form fields, which compiling would drop.")
+        self.layout.validate([page.rect for page in source_doc])
+
+    def new_document(self):
+        """Returns a fresh in-memory copy of the compiled template."""
+        return fitz.open(stream=self._template_bytes, filetype="pdf")
+
+    def image_layer_name(self, face_image_path, full_body_image_path, passport_image_path):
+        """
+        Returns the file name an image layer is cached under: the first 16 hex digits of
+        the three images' content hashes, which the storage cleanup matches against the
+        uploads still present, and a digest of the template, image contents and
+        embedding settings.
+        """
+        image_hashes = {
+            "face": content_hash(face_image_path),
+            "full_body": content_hash(full_body_image_path),
+            "passport": content_hash(passport_image_path),
+        }
+        digest = hashlib.sha256(f"{self.fingerprint}:{PDF_IMAGE_DPI}:{DERIVATIVE_JPEG_QUALITY}".encode())
+        for slot_name, (page_num, slot_rect) in self.layout.image_slots.items():
+            digest.update(f":{slot_name}={image_hashes[slot_name]}@{page_num}{tuple(slot_rect)}".encode())
+        sources = '-'.join(image_hashes[slot_name][:16] for slot_name in IMAGE_SLOT_NAMES)
+        return f"{sources}_{digest.hexdigest()}.pdf"
+
+    def image_layer(self, face_image_path, full_body_image_path, passport_image_path):
+        """
+        Returns the PDF bytes of the template with the three images embedded and no
+        text, rendering and caching them in IMAGE_LAYER_FOLDER on first use.
+        """
+        name = self.image_layer_name(face_image_path, full_body_image_path, passport_image_path)
+        layer_path = os.path.join(IMAGE_LAYER_FOLDER, name)
+        start = time.perf_counter()
+        try:
+            with open(layer_path, 'rb') as f:
+                layer_bytes = f.read()
+            # The storage cleanup evicts the layers that have not been used for longest
+            touch(layer_path)
+            record_stage('pdf_image_layer_read', time.perf_counter() - start)
+            return layer_bytes
+        except FileNotFoundError:
+            pass
+
+        with stage_timer('pdf_image_embed'):
+            images = slot_images(self.layout, face_image_path, full_body_image_path, passport_image_path)
+            with _pymupdf_lock:
+                doc = self.new_document()
+                try:
+                    stamp_images(doc, images)
+                    # Layers are kept until evicted, so they are written as compactly as CVs
+                    layer_bytes = doc.tobytes(garbage=4, deflate=True)
+                finally:
+                    doc.close()
+            os.makedirs(IMAGE_LAYER_FOLDER, exist_ok=True)
+            # Write to a temporary file first so concurrent readers never see a partial layer
+            fd, temp_path = tempfile.mkstemp(dir=IMAGE_LAYER_FOLDER, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(layer_bytes)
+            os.replace(temp_path, layer_path)
+        logging.info(f"Cached image layer {name} ({len(layer_bytes)} bytes).")
+        return layer_bytes
+
+    def text_layer(self, data):
+        """
+        Returns a blank document with the candidate's text stamped on the pages of the
+        layout's text pages. Looking up the font before every insert scans the fonts of the
+        whole page, which on a template page includes every font the template uses, so
+        the text is stamped on pages of its own and overlaid as Form XObjects.
+        """
+        text_doc = fitz.open()
+        for page_rect in self.page_rects[:self.layout.text_pages[-1] + 1]:
+            text_doc.new_page(width=page_rect.width, height=page_rect.height)
+        stamp_text(text_doc, self.layout, data)
+        return text_doc
+
+    def render(self, data, face_image_path, full_body_image_path, passport_image_path):
+        """Overlays the candidate's text on a copy of its image layer and returns the open document."""
+        layer_bytes = self.image_layer(face_image_path, full_body_image_path, passport_image_path)
+        with _pymupdf_lock:
+            with stage_timer('pdf_template_open'):
+                doc = fitz.open(stream=layer_bytes, filetype="pdf")
+            if not self.layout.text_pages:
+                return doc
+            try:
+                with stage_timer('pdf_text_stamp'):
+                    text_doc = self.text_layer(data)
+                    for page_num in self.layout.text_pages:
+                        doc[page_num].show_pdf_page(doc[page_num].rect, text_doc, page_num)
+                    text_doc.close()
+            except Exception:
+                doc.close()
+                raise
+        return doc
+
+
+def stamp_text(doc, layout, data):
+    """Inserts the candidate's text fields and experiences into `doc` at the text slots of `layout`."""
+    # One shape per page for all its fields, so each page's content is rewritten once instead of per field
+    shapes = {}
+    for field_name, slot in layout.fields.items():
+        if field_name in data:
+            text_to_insert = data[field_name]
+            if text_to_insert is None or text_to_insert == 'NOT_FOUND':
+                text_to_insert = ""
+            _insert_text(doc, shapes, layout, slot, text_to_insert)
+            logging.debug(f"Inserted text '{text_to_insert}' for {field_name} at {slot['rect']} on page {slot['page'] + 1}.")
+
+    if 'experiences' in data and data['experiences']:
+        for i, exp in enumerate(data['experiences']):
+            if i < len(layout.experience_slots):
+                country_text = exp.get('country', '')
+                period_text = exp.get('period', '')
+                if period_text:
+                    period_text += " Year" if period_text == "1" else " Years"
+
+                _insert_text(doc, shapes, layout, layout.experience_slots[i]["country"], country_text)
+                logging.debug(f"Inserted experience country '{country_text}' at {layout.experience_slots[i]['country']['rect']}.")
+                _insert_text(doc, shapes, layout, layout.experience_slots[i]["year"], period_text)
+                logging.debug(f"Inserted experience period '{period_text}' at {layout.experience_slots[i]['year']['rect']}.")
+    for shape in shapes.values():
+        shape.commit()
+
+
+def slot_images(layout, face_image_path, full_body_image_path, passport_image_path):
+    """
+    Returns the candidate's face, full body and passport images for the image slots of
+    `layout`, as (slot name, page number, image rect, image) for stamp_images.
+    """
+    image_paths = {
+        "face": face_image_path,
+        "full_body": full_body_image_path,
+        "passport": passport_image_path,
+    }
+    images = []
+    for slot_name, (page_num, slot_rect) in layout.image_slots.items():
+        # Embed a derivative sized for the slot instead of the full-resolution upload
+        image, original_size = pdf_image(image_paths[slot_name], slot_rect)
+        images.append((slot_name, page_num, fit_image_rect(slot_rect, original_size), image))
+    return images
+
+
+def stamp_images(doc, images):
+    """Embeds the images returned by slot_images into `doc`."""
+    for slot_name, page_num, image_rect, image in images:
+        embed_image(doc[page_num], image_rect, image)
+        logging.debug(f"{slot_name} image drawn at {image_rect} on page {page_num + 1}.")
+
+
+def embed_image(page, rect, image):
+    """
+    Draws `image`, a JPEG loaded by image_pipeline.load_pdf_image, stretched over `rect`.
+
+    The JPEG is written into the document as an image XObject as it is and drawn by a
+    content stream of its own. `page.insert_image` parses the image again, hashes all of
+    it and scans every resource of the page, including the whole template behind a
+    compiled page, just to name it; that used to take most of building an image layer.
+    """
+    if image["colorspace"] is None:
+        page.insert_image(rect, stream=image["jpeg"], keep_proportion=False)
+        return
+    doc = page.parent
+    xref = doc.get_new_xref()
+    doc.update_object(
+        xref,
+        f"<</Type/XObject/Subtype/Image/Width {image['width']}/Height {image['height']}"
+        f"/ColorSpace/{image['colorspace']}/BitsPerComponent 8>>",
+    )
+    doc.update_stream(xref, image["jpeg"], new=True, compress=False)
+    # Set after the stream, which update_stream writes as unfiltered
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    name = f"CVImage{xref}"
+    _add_xobject(doc, page, name, xref)
+
+    # Keep the page's own graphics state changes from moving the image
+    if not page.is_wrapped:
+        page.wrap_contents()
+    # PDF space has its origin at the bottom left of the media box
+    pdf_rect = rect * page.transformation_matrix
+    _append_contents(
+        doc, page,
+        f"q {pdf_rect.width:.3f} 0 0 {pdf_rect.height:.3f} {pdf_rect.x0:.3f} {pdf_rect.y0:.3f} cm /{name} Do Q".encode(),
+    )
+
+
+def _add_xobject(doc, page, name, xref):
+    """Adds `xref` to the XObject resources of `page` under `name`."""
+    holder, key = page.xref, "Resources"
+    for next_key in ("XObject", name):
+        kind, value = doc.xref_get_key(holder, key)
+        if kind == "xref":
+            # Keys cannot be set through an indirect object, so continue from that object
+            holder, key = int(value.split()[0]), next_key
+        else:
+            key = f"{key}/{next_key}"
+    doc.xref_set_key(holder, key, f"{xref} 0 R")
+
+
+def _append_contents(doc, page, content):
+    """Appends a content stream of its own to `page`."""
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, content, new=True, compress=False)
+    kind, contents = doc.xref_get_key(page.xref, "Contents")
+    if kind == "array":
+        contents = f"{contents[1:-1]} {xref} 0 R"
+    elif kind == "xref":
+        contents = f"{contents} {xref} 0 R"
+    else:
+        contents = f"{xref} 0 R"
+    doc.xref_set_key(page.xref, "Contents", f"[{contents}]")
+
+
+def _insert_text(doc, shapes, layout, slot, text):
+    """Inserts `text` into a text slot of `layout`, on the shape of the slot's page in `shapes`."""
+    shape = shapes.get(slot["page"])
+    if shape is None:
+        shape = shapes[slot["page"]] = doc[slot["page"]].new_shape()
+    font_size, lines = fit_text(text, slot, layout.font_name)
+    for x, y, line in lines:
+        shape.insert_text((x, y), line, fontsize=font_size, fontname=layout.font_name)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_cv_template(template_path):
+    """
+    Returns the process-wide compiled CVTemplate for `template_path`, loading it on first
+    use and reloading it when the template PDF or its layout file has changed.
+    """
+    key = os.path.abspath(template_path)
+    template = _templates.get(key)
+    if template is None or _reload_due(template):
+        with _templates_lock:
+            template = _templates.get(key)
+            if template is None:
+                with stage_timer('pdf_template_compile'), _pymupdf_lock:
+                    template = CVTemplate(template_path)
+                _templates[key] = template
+            elif _reload_due(template):
+                template = _templates[key] = _reload_template(template)
+    return template
+
+
+def _reload_due(template):
+    return TEMPLATE_RELOAD_INTERVAL > 0 and time.monotonic() - template.checked_at >= TEMPLATE_RELOAD_INTERVAL
+
+
+def _reload_template(template):
+    """
+    Returns `template`, or a reloaded copy of it if its PDF or layout file changed since
+    it was loaded. A changed layout reuses the compiled PDF; renders already in progress
+    finish with the template they started with.
+    """
+    template.checked_at = time.monotonic()
+    try:
+        pdf_stamp = _file_stamp(template.template_path)
+        layout_stamp = _file_stamp(template.layout_path)
+    except OSError as e:
+        # A file is being replaced; check again later
+        logging.warning(f"Could not check CV template {template.template_path} for changes: {e}")
+        return template
+    if pdf_stamp == template.pdf_stamp and layout_stamp == template.layout_stamp:
+        return template
+    try:
+        if pdf_stamp != template.pdf_stamp:
+            with stage_timer('pdf_template_compile'), _pymupdf_lock:
+                reloaded = CVTemplate(template.template_path, template.layout_path)
+        else:
+            # Loading a layout measures its font with PyMuPDF
+            with _pymupdf_lock:
+                reloaded = template.with_layout(load_layout(template.layout_path), layout_stamp)
+    except (OSError, ValueError) as e:
+        # Keep rendering with the last good template; this version is not retried
+        logging.error(f"Could not reload CV template {template.template_path}, keeping the previous version: {e}")
+        template.pdf_stamp, template.layout_stamp = pdf_stamp, layout_stamp
+        return template
+    reloaded.checked_at = time.monotonic()
+    logging.info(f"Reloaded CV template {template.template_path} with layout {template.layout_path}.")
+    return reloaded
 
-logging.basicConfig(level=logging.WARNING)
 
 def create_cv_pdf(output_path, data, template_path, face_image_path, full_body_image_path, passport_image_path):
     """
@@ -20,166 +546,65 @@ def create_cv_pdf(output_path, data, template_path, face_image_path, full_body_i
         bool: True if the PDF was created successfully, False otherwise.
     """
     try:
-        template_doc = fitz.open(template_path)
-        for page_num, page in enumerate(template_doc):
-            if page_num == 0:
-                # Define field coordinates for the first page (x_left, y_top, x_right, y_bottom)
-                field_coords = {
-                    "fullName": {"rect": (240, 197, 476, 207), "font_size": 9},
-                    "passportNo": {"rect": (375, 225, 508, 235), "font_size": 9},
-                    "dob": {"rect": (140, 248, 258, 261), "font_size": 9},
-                    "age": {"rect": (140, 264, 258, 281), "font_size": 9},
-                    "pob": {"rect": (140, 282, 258, 292), "font_size": 9},
-                    "livingTown": {"rect": (140, 298, 258, 308), "font_size": 9},
-                    "dateOfIssue": {"rect": (375, 236, 508, 246), "font_size": 9},
-                    "placeOfIssue": {"rect": (375, 247, 508, 261), "font_size": 9},
-                    "dateOfExpiry": {"rect": (375, 263, 508, 281), "font_size": 9},
-                    "cvCreationDate": {"rect": (349, 123, 481, 131), "font_size": 9},
-                    "contactPhone": {"rect": (284, 133, 482, 142), "font_size": 9},
-                    "religion": {"rect": (140, 237, 258, 246), "font_size": 9},
-                }
-
-                for field_name, field_data in field_coords.items():
-                    if field_name in data:
-                        text_to_insert = data[field_name]
-                        if text_to_insert is None or text_to_insert == 'NOT_FOUND':
-                            text_to_insert = ""
-
-                        # PyMuPDF uses (x, y) for the bottom-left corner of the text.
-                        # We use the bottom of the rectangle (y_bottom) as the baseline for text.
-                        x_coord = field_data["rect"][0] + 5  # Small offset from left edge
-                        y_coord = field_data["rect"][3]     # Use y_bottom of the rect for text baseline
-                        font_size = field_data["font_size"]
-                        
-                        page.insert_text((x_coord, y_coord), text_to_insert, fontsize=font_size, fontname="helv")
-                        logging.info(f"Inserted text '{text_to_insert}' for {field_name} at ({x_coord}, {y_coord}) on page {page_num + 1}.")
-
-                if 'experiences' in data and data['experiences']:
-                    # Coordinates for experience fields on the PDF
-                    experience_coords = [
-                        {"country": (140, 562, 258, 574), "year": (140, 578, 258, 590)},
-                        {"country": (140, 596, 257, 608), "year": (140, 613, 259, 625)},
-                        {"country": (140, 630, 258, 642), "year": (140, 647, 259, 659)}
-                    ]
-                    experience_font_size = 9
-                    font_name = "helv"
-
-                    for i, exp in enumerate(data['experiences']):
-                        if i < len(experience_coords):
-                            country_text = exp.get('country', '')
-                            period_text = exp.get('period', '')
-                            if period_text:
-                                period_text += " Year" if period_text == "1" else " Years"
-
-                            def insert_centered_text(rect_coords, text):
-                                """
-                                Helper function to insert text centered within a given rectangle.
-                                """
-                                rect = fitz.Rect(rect_coords)
-                                text_length = fitz.get_text_length(text, fontname=font_name, fontsize=experience_font_size)
-                                rect_width = rect.x1 - rect.x0
-                                # Calculate x-coordinate for centering
-                                x = rect.x0 + (rect_width - text_length) / 2
-                                # Calculate y-coordinate for baseline, with a small offset from the bottom of the rect
-                                y = rect.y1 - 3
-                                page.insert_text((x, y), text, fontsize=experience_font_size, fontname=font_name)
-
-                            insert_centered_text(experience_coords[i]["country"], country_text)
-                            logging.info(f"Inserted experience country '{country_text}' at {fitz.Rect(experience_coords[i]['country'])} on page {page_num + 1}.")
-                            insert_centered_text(experience_coords[i]["year"], period_text)
-                            logging.info(f"Inserted experience period '{period_text}' at {fitz.Rect(experience_coords[i]['year'])} on page {page_num + 1}.")
-
-                # Image insertion logic for Face and Full-Body images
-                # Face Image
-                face_img_x, face_img_y_top, face_img_x2, face_img_y2 = 30, 122, 172, 196
-                face_field_width = face_img_x2 - face_img_x
-                face_field_height = face_img_y2 - face_img_y_top
-                
-                original_face_width, original_face_height = Image.open(face_image_path).size
-
-                # Calculate aspect ratios to maintain image proportions
-                face_aspect_ratio = original_face_width / original_face_height
-                face_field_aspect_ratio = face_field_width / face_field_height
-
-                # Determine new dimensions to fit within the field while maintaining aspect ratio
-                if face_aspect_ratio > face_field_aspect_ratio:
-                    new_face_width = face_field_width
-                    new_face_height = new_face_width / face_aspect_ratio
-                else:
-                    new_face_height = face_field_height
-                    new_face_width = new_face_height * face_aspect_ratio
-
-                # Ensure image doesn't exceed its original size if it's smaller than the field
-                if new_face_width > original_face_width or new_face_height > original_face_height:
-                    new_face_width = original_face_width
-                    new_face_height = original_face_height
-
-                # Calculate offsets to center the image within its field
-                face_x_offset = face_img_x + (face_field_width - new_face_width) / 2
-                face_y_offset = face_img_y_top + (face_field_height - new_face_height) / 2 # PyMuPDF y is from top
-
-                page.insert_image(fitz.Rect(face_x_offset, face_y_offset, face_x_offset + new_face_width, face_y_offset + new_face_height), filename=face_image_path)
-                logging.info(f"Face image drawn at ({face_x_offset}, {face_y_offset}) with size ({new_face_width}, {new_face_height}).")
-
-                # Full-Body Image (similar logic as Face Image)
-                full_body_img_x, full_body_img_y_top, full_body_img_x2, full_body_img_y2 = 312, 283, 552, 684
-                full_body_field_width = full_body_img_x2 - full_body_img_x
-                full_body_field_height = full_body_img_y2 - full_body_img_y_top
-
-                original_full_body_width, original_full_body_height = Image.open(full_body_image_path).size
-
-                full_body_aspect_ratio = original_full_body_width / original_full_body_height
-                full_body_field_aspect_ratio = full_body_field_width / full_body_field_height
-
-                if full_body_aspect_ratio > full_body_field_aspect_ratio:
-                    new_full_body_width = full_body_field_width
-                    new_full_body_height = new_full_body_width / full_body_aspect_ratio
-                else:
-                    new_full_body_height = full_body_field_height
-                    new_full_body_width = new_full_body_height * full_body_aspect_ratio
-
-                if new_full_body_width > original_full_body_width or new_full_body_height > original_full_body_height:
-                    new_full_body_width = original_full_body_width
-                    new_full_body_height = original_full_body_height
-
-                full_body_x_offset = full_body_img_x + (full_body_field_width - new_full_body_width) / 2
-                full_body_y_offset = full_body_img_y_top + (full_body_field_height - new_full_body_height) / 2
-
-                page.insert_image(fitz.Rect(full_body_x_offset, full_body_y_offset, full_body_x_offset + new_full_body_width, full_body_y_offset + new_full_body_height), filename=full_body_image_path)
-                logging.info(f"Full-body image drawn at ({full_body_x_offset}, {full_body_y_offset}) with size ({new_full_body_width}, {new_full_body_height}).")
-
-            if page_num == 1:
-                # Passport Image insertion logic
-                passport_img_x, passport_img_y_top, passport_img_x2, passport_img_y2 = 30, 130, 550, 750
-                passport_field_width = passport_img_x2 - passport_img_x
-                passport_field_height = passport_img_y2 - passport_img_y_top
-
-                original_passport_width, original_passport_height = Image.open(passport_image_path).size
-
-                passport_aspect_ratio = original_passport_width / original_passport_height
-                passport_field_aspect_ratio = passport_field_width / passport_field_height
-
-                if passport_aspect_ratio > passport_field_aspect_ratio:
-                    new_passport_width = passport_field_width
-                    new_passport_height = new_passport_width / passport_aspect_ratio
-                else:
-                    new_passport_height = passport_field_height
-                    new_passport_width = new_passport_height * passport_aspect_ratio
-
-                if new_passport_width > original_passport_width or new_passport_height > original_passport_height:
-                    new_passport_width = original_passport_width
-                    new_passport_height = original_passport_height
-
-                passport_x_offset = passport_img_x + (passport_field_width - new_passport_width) / 2
-                passport_y_offset = passport_img_y_top + (passport_field_height - new_passport_height) / 2
-
-                page.insert_image(fitz.Rect(passport_x_offset, passport_y_offset, passport_x_offset + new_passport_width, passport_y_offset + new_passport_height), filename=passport_image_path)
-                logging.info(f"Passport image drawn at ({passport_x_offset}, {passport_y_offset}) with size ({new_passport_width}, {new_passport_height}).")
-
-        template_doc.save(output_path)
-        template_doc.close()
+        template = get_cv_template(template_path)
+        doc = template.render(data, face_image_path, full_body_image_path, passport_image_path)
+        with stage_timer('pdf_save'), _pymupdf_lock:
+            doc.save(output_path)
+            doc.close()
+        PDF_SIZE_BYTES.observe(os.path.getsize(output_path))
         logging.info(f"PyMuPDF PDF saved to: {output_path}")
         return True
     except Exception as e:
         logging.error(f"Error creating PDF: {e}")
         return False
+
+
+def render_cv_pdf(data, template_path, face_image_path, full_body_image_path, passport_image_path):
+    """
+    Generates a CV like `create_cv_pdf`, but in memory instead of to a file.
+
+    Args:
+        data (dict): A dictionary containing all the text data to be inserted into the PDF.
+        template_path (str): The path to the base PDF template.
+        face_image_path (str): The path to the candidate's face image.
+        full_body_image_path (str): The path to the candidate's full body image.
+        passport_image_path (str): The path to the candidate's passport image.
+
+    Returns:
+        bytes: The PDF, or None if it could not be created.
+    """
+    try:
+        template = get_cv_template(template_path)
+        doc = template.render(data, face_image_path, full_body_image_path, passport_image_path)
+        # Dropping unused objects and compressing the text streams is both the smallest
+        # and the fastest way to serialise a rendered CV
+        with stage_timer('pdf_save'), _pymupdf_lock:
+            pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+            doc.close()
+        PDF_SIZE_BYTES.observe(len(pdf_bytes))
+        return pdf_bytes
+    except Exception as e:
+        logging.error(f"Error creating PDF: {e}")
+        return None
+
+
+def lower_process_priority(niceness):
+    """Render pool initializer: lowers the worker's scheduling priority, where the OS supports it."""
+    if hasattr(os, 'nice'):
+        os.nice(niceness)
+
+
+def build_image_layer(template_path, face_image_path, full_body_image_path, passport_image_path):
+    """
+    Builds and caches a candidate's image layer ahead of rendering, so that rendering
+    the CV later only has to stamp the text.
+
+    Returns:
+        bool: True if the image layer is cached, False otherwise.
+    """
+    try:
+        get_cv_template(template_path).image_layer(face_image_path, full_body_image_path, passport_image_path)
+        return True
+    except Exception as e:
+        logging.error(f"Error creating PDF image layer: {e}")
+        return False
@@ -0,0 +1,71 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connection pool and retry settings for calls to the AI providers
+PROVIDER_POOL_SIZE = int(os.getenv("PROVIDER_POOL_SIZE", "10"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "2"))
+PROVIDER_BACKOFF_FACTOR = float(os.getenv("PROVIDER_BACKOFF_FACTOR", "0.5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest a retry waits for a Retry-After header, in seconds, so that a rate-limited
+# provider cannot hold an extraction up for long
+PROVIDER_MAX_RETRY_AFTER = float(os.getenv("PROVIDER_MAX_RETRY_AFTER", "2"))
+
+
+class CappedRetry(Retry):
+    """
+    Retry that waits at most PROVIDER_MAX_RETRY_AFTER seconds for a Retry-After header,
+    and only retries the statuses it is given, even with a Retry-After header.
+    """
+
+    # urllib3 retries these whenever they carry Retry-After, whatever status_forcelist says
+    RETRY_AFTER_STATUS_CODES = frozenset(RETRY_STATUSES)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, PROVIDER_MAX_RETRY_AFTER)
+
+
+def create_provider_session(pool_size=PROVIDER_POOL_SIZE, max_retries=PROVIDER_MAX_RETRIES,
+                            backoff_factor=PROVIDER_BACKOFF_FACTOR):
+    """
+    Creates a requests.Session that keeps up to `pool_size` connections per host alive,
+    so consecutive provider calls skip the TCP and TLS handshakes, and that retries 429
+    and 5xx responses with exponential backoff, honouring Retry-After up to
+    PROVIDER_MAX_RETRY_AFTER seconds.
+    """
+    retry = CappedRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,  # a timed-out extraction is not retried; it already cost a full timeout
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'POST'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_provider_session():
+    """Returns the process-wide pooled session used for every provider call."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_provider_session()
+    return _session
@@ -0,0 +1,202 @@
+"""
+Re-renders the CV of every stored candidate with the current template, e.g. after
+template.pdf or its layout changed. Only the stored cv_data and image paths are used;
+nothing is extracted again.
+
+CVs are rendered like the app renders them (see app.save_cv), each directly in one of
+a pool of worker processes. Progress is checkpointed, so an interrupted run continues where it
+stopped when started again, as long as the template did not change in between.
+Throughput and the estimated time left are reported as it goes.
+
+Usage: python rerender.py [--workers N] [--limit N] [--restart]
+"""
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# A maintenance command must never resume the server's jobs or clean its storage
+os.environ['BACKGROUND_TASKS'] = 'off'
+
+import app
+
+# Candidates queued per worker, so workers never wait for the next one
+QUEUED_PER_WORKER = 4
+# Completed candidates between checkpoint writes
+CHECKPOINT_EVERY = 50
+# Seconds between progress reports
+PROGRESS_INTERVAL = 10
+
+IMAGE_PATH_KEYS = ('face_image_path', 'full_body_image_path', 'passport_image_path')
+
+
+def template_version():
+    """Identifies the current template and its layout, which a checkpoint is only valid for."""
+    from pdf_utils import get_cv_template
+    template = get_cv_template(app.TEMPLATE_PDF_PATH)
+    digest = hashlib.sha256(template.fingerprint.encode())
+    with open(template.layout_path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_checkpoint(path, version):
+    """Returns the checkpoint saved at `path` for this template version, or a fresh one."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        checkpoint = None
+    if not checkpoint or checkpoint.get('template') != version:
+        checkpoint = {'template': version, 'after': None, 'done': 0, 'failed': []}
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    # Written to a temporary file first, so an interrupted write never loses the last checkpoint
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def rerender_candidate(cv_data):
+    """
+    Renders a candidate's CV again in a pool worker.
+
+    Returns:
+        tuple: (created, new PDF path or None, error message or None)
+    """
+    missing = [key for key in IMAGE_PATH_KEYS if not os.path.exists(cv_data.get(key) or '')]
+    if missing:
+        return False, None, f"Missing image(s): {', '.join(missing)}"
+    try:
+        # Already in a worker process, so not through the app's own render pool
+        created, pdf_path = app.save_cv(cv_data, run=lambda func, *args: func(*args))
+    except Exception as e:
+        return False, None, str(e)
+    return created, pdf_path, None if created else "Failed to create the PDF"
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def rerender_all(store, checkpoint_path, workers, limit=None, restart=False, report=print):
+    """
+    Re-renders the stored candidates not yet done according to the checkpoint, in
+    creation order, and points each at its new PDF.
+
+    The checkpoint records the last candidate up to which every candidate is done, so
+    candidates still rendering when the run is interrupted are rendered again on the
+    next run, and the ids of the candidates that failed.
+
+    The server may keep running: a candidate regenerated while its re-render is in
+    flight keeps the PDF of its regeneration.
+
+    Returns:
+        dict: candidates rendered, failed and skipped (regenerated meanwhile) in this
+        run, seconds taken and the total number of candidates done for this template
+    """
+    version = template_version()
+    checkpoint = {'template': version, 'after': None, 'done': 0, 'failed': []} if restart \
+        else load_checkpoint(checkpoint_path, version)
+    total = store.count()
+    if checkpoint['done']:
+        report(f"Resuming after {checkpoint['done']} of {total} candidates")
+
+    rendered = failed = skipped = since_checkpoint = 0
+    start = last_report = time.monotonic()
+    candidates = store.iter_all(after=checkpoint['after'])
+    # (created_at, id, updated_at) and future of every submitted candidate, in submission order
+    in_flight = collections.deque()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        while True:
+            while len(in_flight) < workers * QUEUED_PER_WORKER and (limit is None or rendered + failed + skipped + len(in_flight) < limit):
+                candidate = next(candidates, None)
+                if candidate is None:
+                    break
+                future = pool.submit(rerender_candidate, candidate['cv_data'])
+                in_flight.append((candidate['created_at'], candidate['id'], candidate['updated_at'], future))
+            if not in_flight:
+                break
+            wait([in_flight[0][3]], return_when=FIRST_COMPLETED)
+            # Results are taken in submission order, so everything up to the checkpoint is done
+            while in_flight and in_flight[0][3].done():
+                created_at, candidate_id, updated_at, future = in_flight.popleft()
+                try:
+                    created, pdf_path, error = future.result()
+                except Exception as e:
+                    created, pdf_path, error = False, None, str(e)
+                if created and pdf_path and not store.set_pdf_path(candidate_id, pdf_path, updated_at):
+                    # Regenerated in the app while this render ran; its new PDF already uses
+                    # the current template, and this one is left for the storage cleanup
+                    app.app.logger.info(f"Candidate {candidate_id} changed while re-rendering; keeping its new PDF")
+                    skipped += 1
+                elif created:
+                    rendered += 1
+                else:
+                    app.app.logger.error(f"Re-rendering candidate {candidate_id} failed: {error}")
+                    checkpoint['failed'].append(candidate_id)
+                    failed += 1
+                checkpoint['after'] = [created_at, candidate_id]
+                checkpoint['done'] += 1
+                since_checkpoint += 1
+            if since_checkpoint >= CHECKPOINT_EVERY:
+                save_checkpoint(checkpoint_path, checkpoint)
+                since_checkpoint = 0
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL:
+                rate = (rendered + failed + skipped) / (now - start)
+                left = (total - checkpoint['done']) / rate if rate else 0
+                report(f"{checkpoint['done']}/{total} done, {failed} failed, {skipped} changed meanwhile, "
+                       f"{rate:.1f} candidates/s, {format_duration(left)} left")
+                last_report = now
+    finally:
+        # Candidates still queued are dropped; they are after the checkpoint
+        pool.shutdown(wait=True, cancel_futures=True)
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    return {
+        'rendered': rendered,
+        'failed': failed,
+        'skipped': skipped,
+        'seconds': time.monotonic() - start,
+        'done': checkpoint['done'],
+        'total': total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=app.BATCH_WORKERS, help="render processes (default BATCH_WORKERS)")
+    parser.add_argument('--limit', type=int, help="stop after this many candidates, e.g. to measure throughput")
+    parser.add_argument('--restart', action='store_true', help="ignore the checkpoint and re-render every candidate")
+    parser.add_argument('--checkpoint', default=os.path.join(app.DATA_FOLDER, 'rerender.checkpoint.json'))
+    args = parser.parse_args()
+
+    try:
+        result = rerender_all(app.candidate_store, args.checkpoint, args.workers, args.limit, args.restart)
+    except KeyboardInterrupt:
+        sys.exit("Interrupted; run again to continue from the checkpoint.")
+    processed = result['rendered'] + result['failed'] + result['skipped']
+    rate = processed / result['seconds'] if result['seconds'] else 0
+    print(f"Re-rendered {result['rendered']} candidates ({result['failed']} failed, "
+          f"{result['skipped']} regenerated meanwhile) in "
+          f"{format_duration(result['seconds'])} with {args.workers} workers: {rate:.2f} candidates/s")
+    print(f"{result['done']}/{result['total']} candidates done for this template")
+    if rate:
+        print(f"At this rate 10,000 candidates take {format_duration(10000 / rate)}")
+
+
+if __name__ == '__main__':
+    main()
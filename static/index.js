@@ -200,6 +200,73 @@ const addExperience = (experience = {}) => {
     }
 };
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_STAGE_LABELS = {
+    queued: 'Waiting for a free worker...',
+    started: 'Starting...',
+    extracting: 'Extracting passport data...',
+    rendering: 'Creating the PDF...',
+    done: 'Done!'
+};
+
+/**
+ * Reads the error message from a failed response, falling back to a generic message.
+ * @param {Response} response - The non-OK fetch response.
+ * @returns {Promise<string>} The message to show the user.
+ */
+const getErrorMessage = async (response) => {
+    let errorMessage = `An unexpected error occurred (HTTP ${response.status}). Please try again.`;
+    try {
+        const errorData = await response.json();
+        errorMessage = errorData.message || errorMessage;
+    } catch (e) {
+        // Ignore if the response is not JSON
+    }
+    return errorMessage;
+};
+
+/**
+ * Shows a job's stage and progress in the generating indicator.
+ * @param {object} job - The job status returned by the backend.
+ */
+const updateJobProgress = (job) => {
+    dom.generatingStatus.textContent = JOB_STAGE_LABELS[job.stage] || 'Generating CV... Please wait.';
+    dom.generatingProgress.classList.remove('w-full', 'animate-pulse');
+    dom.generatingProgress.style.width = `${Math.max(job.progress, 5)}%`;
+};
+
+/**
+ * Resets the generating indicator to its initial state.
+ */
+const resetJobProgress = () => {
+    dom.generatingStatus.textContent = 'Generating CV... Please wait.';
+    dom.generatingProgress.classList.add('w-full', 'animate-pulse');
+    dom.generatingProgress.style.width = '';
+};
+
+/**
+ * Polls a background job until it finishes, updating the progress indicator on the way.
+ * @param {string} statusUrl - The job status URL returned by /generate.
+ * @returns {Promise<object>} The finished job, including the generated CV's details.
+ */
+const waitForJob = async (statusUrl) => {
+    while (true) {
+        const response = await fetch(statusUrl);
+        if (!response.ok) {
+            throw new Error(await getErrorMessage(response));
+        }
+        const job = await response.json();
+        updateJobProgress(job);
+        if (job.status === 'done') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.message || 'Generating the CV failed. Please try again.');
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+};
+
 /**
  * Handles the form submission, sends data to the backend, and updates the UI based on the response.
  * @param {Event} e - The submit event object.
@@ -229,17 +296,11 @@ const handleSubmit = async (e) => {
         });
 
         if (!response.ok) {
-            let errorMessage = `An unexpected error occurred (HTTP ${response.status}). Please try again.`;
-            try {
-                const errorData = await response.json();
-                errorMessage = errorData.message || errorMessage;
-            } catch (e) {
-                // Ignore if the response is not JSON
-            }
-            throw new Error(errorMessage);
+            throw new Error(await getErrorMessage(response));
         }
 
-        const result = await response.json();
+        const job = await response.json();
+        const result = await waitForJob(job.statusUrl);
 
         populateResultPage(result.fullName, result.downloadUrl, result.editUrl);
         showPopupMessage("CV generated successfully!");
@@ -253,6 +314,7 @@ const handleSubmit = async (e) => {
     } finally {
         dom.formActions.classList.remove('hidden');
         dom.generatingIndicator.classList.add('hidden');
+        resetJobProgress();
     }
 };
 
@@ -331,6 +393,8 @@ document.addEventListener('DOMContentLoaded', () => {
         errorContainer: document.getElementById('error-container'),
         errorMessage: document.getElementById('error-message'),
         generatingIndicator: document.getElementById('generating-indicator'),
+        generatingStatus: document.getElementById('generating-status'),
+        generatingProgress: document.getElementById('generating-progress'),
         formActions: document.getElementById('form-actions'),
         extractionMethodInput: document.getElementById('extractionMethod'),
         result: {
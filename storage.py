@@ -0,0 +1,265 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 'local' keeps a copy of every generated CV in the upload folder; 'none' keeps no copy
+# and renders the CV in memory from the stored candidate whenever it is downloaded
+PDF_STORAGE = os.getenv("PDF_STORAGE", "local")
+# Stored CVs older than this are deleted and rendered again on their next download;
+# 0 keeps them forever
+PDF_RETENTION_DAYS = float(os.getenv("PDF_RETENTION_DAYS", "30"))
+# Uploads and PDFs that no candidate or unfinished job refers to (superseded
+# regenerations, failed jobs, batch archives) are deleted after this many hours
+ORPHAN_RETENTION_HOURS = float(os.getenv("ORPHAN_RETENTION_HOURS", "24"))
+# Cached image layers and derivatives, which are rebuilt on demand, are deleted once
+# unused for this many days, and the least recently used first beyond CACHE_MAX_MB per cache
+CACHE_RETENTION_DAYS = float(os.getenv("CACHE_RETENTION_DAYS", "30"))
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "2048"))
+# Seconds between cleanup runs; 0 disables the background cleanup
+STORAGE_CLEANUP_INTERVAL = float(os.getenv("STORAGE_CLEANUP_INTERVAL", "3600"))
+
+
+class PDFStorage:
+    """
+    Persistence for generated CVs. `save` returns the path a CV can later be served
+    from, or None if the backend keeps no copy; callers then render the CV again.
+    `persistent` tells whether the backend keeps copies at all.
+    """
+
+    persistent = False
+
+    def save(self, filename, pdf_bytes):
+        raise NotImplementedError
+
+    def exists(self, path):
+        raise NotImplementedError
+
+
+class LocalPDFStorage(PDFStorage):
+    """Keeps generated CVs as files in `folder`."""
+
+    persistent = True
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def save(self, filename, pdf_bytes):
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, filename)
+        # Write to a temporary file first so a concurrent download never sees a partial PDF
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(temp_path, path)
+        return path
+
+    def exists(self, path):
+        return bool(path) and os.path.exists(path)
+
+
+class NoPDFStorage(PDFStorage):
+    """Keeps no copy of generated CVs; every download renders the CV in memory."""
+
+    persistent = False
+
+    def save(self, filename, pdf_bytes):
+        return None
+
+    def exists(self, path):
+        return False
+
+
+def create_pdf_storage(name, folder):
+    """Creates the PDF storage backend named by `name` ('local' or 'none')."""
+    if name == 'local':
+        return LocalPDFStorage(folder)
+    if name == 'none':
+        return NoPDFStorage()
+    raise ValueError(f"Unknown PDF storage {name!r}; expected local or none.")
+
+
+# Uploads saved under their SHA-256 (see upload_stream), whose hash is their name
+_CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}\.')
+# Cache files are named after the first 16 hex digits of the content hashes of the
+# uploads they are built from, joined by '-' and followed by '_'
+SOURCE_HASH_LENGTH = 16
+
+
+def touch(path):
+    """Marks a cached file as just used; cache eviction goes by modification time."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def cache_sources(filename):
+    """Returns the upload hash prefixes a cache file's name starts with, or None."""
+    prefix, separator, _ = filename.partition('_')
+    if not separator:
+        return None
+    sources = prefix.split('-')
+    if not all(len(source) >= SOURCE_HASH_LENGTH for source in sources):
+        return None
+    return [source[:SOURCE_HASH_LENGTH] for source in sources]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class StorageCleaner:
+    """
+    Applies the retention policy to the upload folder, once per `interval` seconds on
+    a background thread:
+
+    - files that no candidate or unfinished job refers to are deleted once they are
+      older than `orphan_retention_hours`;
+    - referenced PDFs are deleted once they are older than `pdf_retention_days`, since
+      a candidate's CV can always be rendered again from its data and images;
+    - referenced uploads are kept, as regenerating a CV needs them.
+
+    Then it applies it to the `cache_folders` (image layers, derivatives), whose files
+    are rebuilt on demand:
+
+    - files built from uploads that are gone are deleted once they are older than
+      `orphan_retention_hours`;
+    - files not used for `cache_retention_days` are deleted (a cache hit refreshes a
+      file's modification time);
+    - beyond `cache_max_mb` per folder, the least recently used files are deleted.
+
+    `referenced_paths` is called on every run and returns the set of absolute paths
+    that are in use. With a `lock_path`, the background thread first takes an exclusive
+    lock on that file, so when several server processes start a cleaner only one runs
+    and another takes over when its process exits.
+    """
+
+    def __init__(self, folder, referenced_paths, pdf_retention_days=PDF_RETENTION_DAYS,
+                 orphan_retention_hours=ORPHAN_RETENTION_HOURS, interval=STORAGE_CLEANUP_INTERVAL, lock_path=None,
+                 cache_folders=(), cache_retention_days=CACHE_RETENTION_DAYS, cache_max_mb=CACHE_MAX_MB):
+        self.folder = folder
+        self.referenced_paths = referenced_paths
+        self.pdf_retention = pdf_retention_days * 24 * 3600
+        self.orphan_retention = orphan_retention_hours * 3600
+        self.cache_folders = cache_folders
+        self.cache_retention = cache_retention_days * 24 * 3600
+        self.cache_max_bytes = cache_max_mb * 1024 * 1024
+        self.interval = interval
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._thread = None
+
+    def _expired(self, path, referenced, age):
+        if path not in referenced:
+            return age > self.orphan_retention
+        return path.lower().endswith('.pdf') and self.pdf_retention > 0 and age > self.pdf_retention
+
+    def run_once(self):
+        """Deletes the expired files once. Returns (files deleted, bytes freed)."""
+        referenced = {os.path.abspath(path) for path in self.referenced_paths()}
+        now = time.time()
+        deleted, freed = 0, 0
+        # Hash prefixes of the uploads that are kept, which cache files may be built from
+        upload_hashes = set()
+        for directory, _, filenames in os.walk(self.folder, topdown=False):
+            for filename in filenames:
+                path = os.path.abspath(os.path.join(directory, filename))
+                try:
+                    stat = os.stat(path)
+                    if not self._expired(path, referenced, now - stat.st_mtime):
+                        if not filename.lower().endswith('.pdf'):
+                            upload_hashes.add(self._upload_hash(path, filename)[:SOURCE_HASH_LENGTH])
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                deleted += 1
+                freed += stat.st_size
+            # Batch folders are left empty once all their files expired; a folder that
+            # was only just created may be about to receive a new batch
+            if directory != self.folder:
+                try:
+                    if not os.listdir(directory) and now - os.stat(directory).st_mtime > self.orphan_retention:
+                        os.rmdir(directory)
+                except OSError:
+                    pass
+        for cache_folder in self.cache_folders:
+            cache_deleted, cache_freed = self._clean_cache(cache_folder, upload_hashes, now)
+            deleted += cache_deleted
+            freed += cache_freed
+        if deleted:
+            logging.info(f"Storage cleanup deleted {deleted} file(s), {freed / 1e6:.1f} MB.")
+        return deleted, freed
+
+    def _upload_hash(self, path, filename):
+        if _CONTENT_ADDRESSED_NAME.match(filename):
+            return filename[:64]
+        from extraction_cache import content_hash
+        return content_hash(path)
+
+    def _clean_cache(self, cache_folder, upload_hashes, now):
+        """Applies the cache retention to one cache folder. Returns (files deleted, bytes freed)."""
+        try:
+            filenames = os.listdir(cache_folder)
+        except FileNotFoundError:
+            return 0, 0
+        kept = []
+        deleted, freed = 0, 0
+        for filename in filenames:
+            path = os.path.join(cache_folder, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            age = now - stat.st_mtime
+            sources = cache_sources(filename)
+            # Names without sources are temporary files of writes in progress, or left by
+            # an interrupted one
+            orphaned = sources is None or not upload_hashes.issuperset(sources)
+            if (orphaned and age > self.orphan_retention) or age > self.cache_retention:
+                if _remove(path):
+                    deleted += 1
+                    freed += stat.st_size
+            elif sources is not None:
+                kept.append((stat.st_mtime, path, stat))
+        total = sum(stat.st_size for _, _, stat in kept)
+        for _, path, stat in sorted(kept):
+            if total <= self.cache_max_bytes:
+                break
+            total -= stat.st_size
+            if _remove(path):
+                deleted += 1
+                freed += stat.st_size
+        return deleted, freed
+
+    def _run_forever(self):
+        if self.lock_path and fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+            # Held until the process exits; the OS releases it even if the process is killed
+            self._lock_file = open(self.lock_path, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Storage cleanup failed: {e}", exc_info=True)
+            time.sleep(self.interval)
+
+    def start(self):
+        """Starts the background cleanup thread, unless the interval is 0."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_forever, name='storage-cleanup', daemon=True)
+        self._thread.start()
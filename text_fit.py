@@ -0,0 +1,113 @@
+import logging
+import math
+
+import fitz  # PyMuPDF
+
+# How text that is too wide for its field is fitted: 'none' lets it overflow, 'shrink'
+# lowers the font size down to the field's minimum, and 'wrap' also breaks it over
+# several lines when shrinking alone is not enough
+FIT_MODES = ("none", "shrink", "wrap")
+# Distance between the baselines of wrapped lines, relative to the font size
+LINE_HEIGHT = 1.15
+# Font size decrements tried when wrapping
+WRAP_STEP = 0.5
+
+# Width of every character measured so far, per font, at font size 1
+_glyph_widths = {}
+
+
+def text_width(text, font_name, font_size):
+    """
+    Returns the width of `text` set in the base-14 font `font_name` at `font_size`.
+
+    Each character is measured by MuPDF once per font and process and then looked up,
+    so measuring a string costs a dictionary lookup per character. Base-14 text is set
+    without kerning, so the widths of its characters add up.
+    """
+    widths = _glyph_widths.setdefault(font_name, {})
+    try:
+        return sum(map(widths.__getitem__, text)) * font_size
+    except KeyError:
+        for char in set(text) - widths.keys():
+            widths[char] = fitz.get_text_length(char, fontname=font_name, fontsize=1)
+        return sum(map(widths.__getitem__, text)) * font_size
+
+
+def fit_text(text, slot, font_name):
+    """
+    Lays out `text` in a compiled text slot of a CV layout.
+
+    The text is set on one line at the slot's font size if it fits. Otherwise it is
+    shrunk until it fits on one line, down to the slot's `min_font_size`. Otherwise, if
+    the slot wraps, it is broken over as many lines as the slot's height allows at the
+    largest font size that fits. Text that still does not fit is set on one line at
+    `min_font_size` and overflows.
+
+    Returns:
+        tuple: (font size, list of (x, y, line) with the baseline origin of every line)
+    """
+    font_size = slot["font_size"]
+    width = text_width(text, font_name, font_size)
+    if width <= slot["max_width"] or slot["fit"] == "none":
+        return font_size, [_line_origin(slot, text, width, slot["y"])]
+
+    # Widths scale with the font size; round down so that the shrunk text never overflows
+    shrunk_size = math.floor(font_size * slot["max_width"] / width * 100) / 100
+    if shrunk_size >= slot["min_font_size"]:
+        return shrunk_size, [_line_origin(slot, text, width * shrunk_size / font_size, slot["y"])]
+
+    if slot["fit"] == "wrap":
+        wrapped = _wrap_to_fit(text, slot, font_name)
+        if wrapped:
+            return wrapped
+
+    font_size = slot["min_font_size"]
+    logging.warning(f"Text of {len(text)} characters overflows the field at {tuple(slot['rect'])} on page {slot['page'] + 1}.")
+    return font_size, [_line_origin(slot, text, text_width(text, font_name, font_size), slot["y"])]
+
+
+def _wrap_to_fit(text, slot, font_name):
+    """Returns the (font size, lines) of `text` wrapped at the largest font size whose lines fit the slot, or None."""
+    words = text.split()
+    if len(words) < 2:
+        return None
+    # Widths at font size 1, scaled for every size tried
+    word_widths = [text_width(word, font_name, 1) for word in words]
+    space_width = text_width(" ", font_name, 1)
+    # The lines stack upwards from the slot's baseline, each LINE_HEIGHT tall, and the
+    # first must stay below the top of the slot
+    height = slot["y"] - slot["rect"].y0
+    font_size = min(slot["font_size"], height / (2 * LINE_HEIGHT))
+    font_size = math.floor(font_size / WRAP_STEP) * WRAP_STEP
+    while font_size >= slot["min_font_size"]:
+        lines = _wrap_words(words, word_widths, space_width, slot["max_width"] / font_size)
+        if lines and len(lines) * LINE_HEIGHT * font_size <= height:
+            first_baseline = slot["y"] - (len(lines) - 1) * LINE_HEIGHT * font_size
+            return font_size, [
+                _line_origin(slot, line, line_width * font_size, first_baseline + i * LINE_HEIGHT * font_size)
+                for i, (line, line_width) in enumerate(lines)
+            ]
+        font_size -= WRAP_STEP
+    return None
+
+
+def _wrap_words(words, word_widths, space_width, max_width):
+    """Greedily breaks `words` into lines no wider than `max_width`; returns [(line, width)], or None if a word is wider."""
+    lines = []
+    line, line_width = [], 0.0
+    for word, word_width in zip(words, word_widths):
+        if word_width > max_width:
+            return None
+        if line and line_width + space_width + word_width > max_width:
+            lines.append((" ".join(line), line_width))
+            line, line_width = [], 0.0
+        line_width += (space_width if line else 0.0) + word_width
+        line.append(word)
+    lines.append((" ".join(line), line_width))
+    return lines
+
+
+def _line_origin(slot, line, width, y):
+    if slot["align"] == "center":
+        return slot["rect"].x0 + (slot["rect"].width - width) / 2, y, line
+    return slot["x"], y, line
@@ -0,0 +1,269 @@
+"""
+Streams a multipart image upload, or a batch of them or a batch ZIP, straight to disk,
+checking it as it arrives instead of after the whole request has been spooled.
+
+Each file's type is sniffed from its first bytes, the per-file and per-request byte
+limits are enforced as the bytes arrive, and the file is hashed while it is written. Once
+the whole request is accepted each file is moved to a name made from its content hash,
+so identical uploads share one file and the extraction cache and image derivatives get
+the hash without reading the file again. Until then it keeps a temporary name of its
+own, so a rejected request never removes a file another request shares. As soon as a
+file is complete its image header is read and checked, while the next file is still
+arriving.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from extraction_cache import remember_content_hash
+
+# Largest image accepted, and largest upload request, in bytes
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(40 * 1024 * 1024)))
+# Bytes read from the request at a time
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# Form fields other than files are kept in memory, up to this many bytes each
+UPLOAD_MAX_FIELD_BYTES = 256 * 1024
+
+# Accepted image types by their leading bytes, with the extension and Pillow format
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'PNG'),
+]
+# Accepted archive type (a batch ZIP), which has no Pillow format
+ARCHIVE_SIGNATURES = [
+    (b'PK\x03\x04', 'zip', None),
+]
+_SIGNATURE_LENGTH = max(len(signature) for signature, _, _ in IMAGE_SIGNATURES + ARCHIVE_SIGNATURES)
+
+
+class UploadError(ValueError):
+    """Raised when an upload is rejected; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_image_type(head, signatures=IMAGE_SIGNATURES):
+    """Returns the (extension, Pillow format) of an image from its first bytes, or None."""
+    for signature, extension, image_format in signatures:
+        if head.startswith(signature):
+            return extension, image_format
+    return None
+
+
+class _FileWriter:
+    """Writes one uploaded image to a temporary file in `destination`, sniffing and hashing it on the way."""
+
+    signatures = IMAGE_SIGNATURES
+    kind = "image"
+    description = "a JPEG or PNG image"
+
+    def __init__(self, field, destination, max_bytes=UPLOAD_MAX_FILE_BYTES):
+        self.field = field
+        self.destination = destination
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b''
+        self.image_type = None
+        self.digest = hashlib.sha256()
+        fd, self.temp_path = tempfile.mkstemp(dir=destination, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadError(f"The {self.field} {self.kind} is larger than {self.max_bytes // (1024 * 1024)} MB.", 413)
+        if self.image_type is None:
+            self.head += data[:_SIGNATURE_LENGTH - len(self.head)]
+            if len(self.head) >= _SIGNATURE_LENGTH:
+                self._sniff()
+        self.digest.update(data)
+        self.file.write(data)
+
+    def _sniff(self):
+        self.image_type = sniff_image_type(self.head, self.signatures)
+        if self.image_type is None:
+            raise UploadError(f"The {self.field} file is not {self.description}.", 415)
+
+    def finish(self):
+        """Checks the complete file; returns the upload, still under its temporary name."""
+        self.file.close()
+        if self.image_type is None:
+            self._sniff()
+        extension, image_format = self.image_type
+        width = height = None
+        if image_format:
+            width, height = _check_image_header(self.temp_path, image_format, self.field)
+        file_hash = self.digest.hexdigest()
+        return {
+            "path": os.path.join(self.destination, f"{file_hash}.{extension}"), "sha256": file_hash,
+            "size": self.size, "format": image_format, "width": width, "height": height,
+            "temp_path": self.temp_path,
+        }
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class _ArchiveWriter(_FileWriter):
+    """Writes one uploaded ZIP archive like _FileWriter writes an image."""
+
+    signatures = ARCHIVE_SIGNATURES
+    kind = "archive"
+    description = "a ZIP file"
+
+
+def _check_image_header(path, image_format, field):
+    """Reads an image's header only; returns its (width, height) or raises UploadError."""
+    try:
+        with Image.open(path) as img:
+            if img.format != image_format:
+                raise UploadError(f"The {field} file is not a valid {image_format} image.", 415)
+            width, height = img.size
+    except (OSError, Image.DecompressionBombError) as e:
+        logging.warning(f"Could not read the uploaded {field} image: {e}")
+        raise UploadError(f"The {field} file is not a readable image.", 415)
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        raise UploadError(f"The {field} image has too many pixels ({width}x{height}).", 413)
+    return width, height
+
+
+def stream_upload(stream, boundary, content_length, destination, file_fields, archive_fields=(), text_fields=(),
+                  max_request_bytes=UPLOAD_MAX_REQUEST_BYTES, max_files_per_field=1):
+    """
+    Reads a multipart/form-data request body from `stream` and saves the images sent in
+    `file_fields` and the ZIP archives sent in `archive_fields` to `destination` as they
+    arrive. Files sent in `text_fields` are kept in memory like form fields.
+
+    Files in other fields are read and dropped. A rejected upload leaves no new files
+    behind.
+
+    Args:
+        stream: the request body, e.g. Flask's `request.stream`.
+        boundary (bytes): the multipart boundary from the Content-Type header.
+        content_length (int or None): the declared body size, checked before reading.
+        max_request_bytes (int): the largest body accepted; an archive may use all of it.
+        max_files_per_field (int): how often a file field may be repeated.
+
+    Returns:
+        tuple: (dict of form field values, dict of field name -> saved upload with its
+        `path`, `sha256`, `size`, `format`, `width` and `height`). With
+        `max_files_per_field` above 1, each field maps to a list of saved uploads in the
+        order they were sent.
+
+    Raises:
+        UploadError: if a limit is exceeded, a file is not of its field's type, or the
+        body is not valid multipart data.
+    """
+    if content_length is not None and content_length > max_request_bytes:
+        raise UploadError(f"The upload is larger than {max_request_bytes // (1024 * 1024)} MB.", 413)
+
+    if not boundary:
+        raise UploadError("The upload is not multipart/form-data.")
+    decoder = MultipartDecoder(boundary, max_form_memory_size=UPLOAD_MAX_FIELD_BYTES)
+    fields, uploads = {}, {}
+    part = writer = value = None
+    received = 0
+    try:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise UploadError(f"The upload is larger than {max_request_bytes // (1024 * 1024)} MB.", 413)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    part, value = event, []
+                elif isinstance(event, File):
+                    part = event
+                    writer = value = None
+                    # A file input left empty is sent as a part without a filename
+                    if event.filename and event.name in text_fields:
+                        value = []
+                    elif event.filename and (event.name in file_fields or event.name in archive_fields):
+                        if len(uploads.get(event.name, [])) >= max_files_per_field:
+                            raise UploadError(f"More than {max_files_per_field} {event.name} file(s) were sent.")
+                        writer_class = _ArchiveWriter if event.name in archive_fields else _FileWriter
+                        max_bytes = max_request_bytes if event.name in archive_fields else UPLOAD_MAX_FILE_BYTES
+                        writer = writer_class(event.name, destination, max_bytes)
+                elif isinstance(event, Data):
+                    if value is not None:
+                        value.append(event.data)
+                        # The decoder only checks the size of each piece of a field
+                        if sum(map(len, value)) > UPLOAD_MAX_FIELD_BYTES:
+                            raise RequestEntityTooLarge()
+                        if not event.more_data:
+                            fields[part.name] = b''.join(value).decode('utf-8', 'replace')
+                    elif writer is not None:
+                        writer.write(event.data)
+                        if not event.more_data:
+                            uploads.setdefault(part.name, []).append(writer.finish())
+                            writer = None
+                event = decoder.next_event()
+            if isinstance(event, Epilogue) or not chunk:
+                break
+    except UploadError:
+        _discard(writer, uploads)
+        raise
+    except RequestEntityTooLarge:
+        _discard(writer, uploads)
+        raise UploadError(f"A form field is larger than {UPLOAD_MAX_FIELD_BYTES // 1024} KB.", 413)
+    except ValueError as e:
+        # Malformed multipart data
+        _discard(writer, uploads)
+        raise UploadError(f"The upload could not be read: {e}")
+    except Exception:
+        _discard(writer, uploads)
+        raise
+    if writer is not None or not isinstance(event, Epilogue):
+        _discard(writer, uploads)
+        raise UploadError("The upload ended before it was complete.")
+    try:
+        _commit(uploads)
+    except Exception:
+        _discard(None, uploads)
+        raise
+    sizes = ', '.join(f"{name}={upload['size']}" for name, saved in uploads.items() for upload in saved)
+    logging.debug(f"Streamed an upload of {received} bytes: {sizes}")
+    if max_files_per_field == 1:
+        uploads = {name: saved[0] for name, saved in uploads.items()}
+    return fields, uploads
+
+
+def _commit(uploads):
+    """Moves each checked upload to its content-addressed path once the whole request is accepted."""
+    for upload in (upload for saved in uploads.values() for upload in saved):
+        path = upload['path']
+        if os.path.exists(path):
+            # The same image was uploaded before; keep the existing file, now in use again
+            os.remove(upload['temp_path'])
+            os.utime(path)
+        else:
+            os.replace(upload['temp_path'], path)
+        del upload['temp_path']
+        remember_content_hash(path, upload['sha256'])
+
+
+def _discard(writer, uploads):
+    # Only this request's temporary files are removed: a content-addressed file may be
+    # shared with other requests that uploaded the same image
+    if writer is not None:
+        writer.discard()
+    for upload in (upload for saved in uploads.values() for upload in saved):
+        if 'temp_path' in upload:
+            try:
+                os.remove(upload['temp_path'])
+            except FileNotFoundError:
+                pass